@@ -0,0 +1,200 @@
+"""
+离线回测：用历史和值序列重放大小/单双倍投策略（与引擎相同的规则），基于 NumPy 向量化计算。
+
+规则（与 strategies.ProgressionStrategy 一致）：
+- 每轮按上一期结果下注：大小跟随上一期大小（>=14 为大），单双跟随上一期单双
+- 胜：连胜 +1，连胜达到 max_win_streak 时重置为初始金额，否则金额翻倍
+- 负：连胜清零，金额重置为初始金额
+因此第 t 轮的下注金额 = initial_bet * 2 ** (截至上一轮的连胜长度 % max_win_streak)，
+且盈亏与 initial_bet 成正比，参数扫描只需对每个 max_win_streak 计算一次。
+
+用法示例：
+  python backtest.py                                   # 使用 ~/history.db 中的全部开奖
+  python backtest.py --strategy odd_even --initial 2 --max-streak 4
+  python backtest.py --sweep --initial 1-20 --max-streak 1-50 --odds 1.98
+  python backtest.py --random 150000 --sweep            # 随机生成一年量级的开奖做基准测试
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from strategies import STRATEGIES, ProgressionStrategy
+
+# 仅倍投类策略（规则与下方向量化实现一致）支持回测
+STRATEGY_NAMES = tuple(name for name, s in STRATEGIES.items() if isinstance(s, ProgressionStrategy))
+
+
+def load_sums(db_path: Path, since_ts: Optional[float] = None, until_ts: Optional[float] = None) -> np.ndarray:
+    """从历史库读取按期号排序的和值序列。"""
+    from history_store import HistoryStore
+    return np.asarray(HistoryStore(db_path).sums(since_ts, until_ts), dtype=np.int16)
+
+
+def random_sums(n: int, seed: Optional[int] = None) -> np.ndarray:
+    """随机生成 n 期和值（三个 0-9 数字之和）。"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 10, size=(n, 3)).sum(axis=1).astype(np.int16)
+
+
+def round_wins(sums: np.ndarray, strategy: str) -> np.ndarray:
+    """第 i 个元素表示以 sums[i] 为参考、对 sums[i+1] 下注是否获胜（长度 n-1）。"""
+    if strategy not in STRATEGY_NAMES:
+        raise ValueError(f"未知策略: {strategy}")
+    side = STRATEGIES[strategy].side_of(np.asarray(sums))
+    return side[1:] == side[:-1]
+
+
+def win_runs(wins: np.ndarray) -> np.ndarray:
+    """每轮结束时的连续获胜长度（负则为 0）。"""
+    idx = np.arange(len(wins))
+    last_loss = np.maximum.accumulate(np.where(wins, -1, idx))
+    return idx - last_loss
+
+
+def stake_multipliers(wins: np.ndarray, max_win_streaks: np.ndarray) -> np.ndarray:
+    """
+    每轮下注金额相对 initial_bet 的倍数，形状 (len(max_win_streaks), n)。
+    第一轮连胜为 0；之后为上一轮结束时的连胜长度对 max_win_streak 取模。
+    """
+    m = np.asarray(max_win_streaks, dtype=np.int64).reshape(-1, 1)
+    runs_before = np.concatenate(([0], win_runs(wins)[:-1])).reshape(1, -1)
+    return np.exp2(runs_before % m)
+
+
+def _curve_stats(profit: np.ndarray, stakes: np.ndarray) -> Dict[str, np.ndarray]:
+    """按行计算权益曲线统计：最终盈亏、最大回撤、最大单注、最低权益。"""
+    equity = np.cumsum(profit, axis=-1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=-1), 0)
+    drawdown = peak - equity
+    return {
+        "equity": equity,
+        "final": equity[..., -1],
+        "max_drawdown": drawdown.max(axis=-1),
+        "max_bet": stakes.max(axis=-1),
+        "min_equity": np.minimum(equity.min(axis=-1), 0),
+    }
+
+
+def backtest(sums: np.ndarray, strategy: str, initial_bet: float = 1, max_win_streak: int = 3,
+             odds: float = 2.0) -> Dict:
+    """
+    单组参数回测。odds 为含本金的赔率（2.0 表示赢一注得一注）。
+    返回 equity（每轮结束后的累计盈亏曲线）及汇总统计。
+    """
+    if len(sums) < 2:
+        raise ValueError("至少需要两期开奖数据")
+    wins = round_wins(sums, strategy)
+    stakes = initial_bet * stake_multipliers(wins, [max_win_streak])[0]
+    profit = np.where(wins, stakes * (odds - 1), -stakes)
+    stats = _curve_stats(profit, stakes)
+    return {
+        "strategy": strategy,
+        "initial_bet": initial_bet,
+        "max_win_streak": max_win_streak,
+        "rounds": int(len(wins)),
+        "win_rate": float(wins.mean()),
+        "equity": stats["equity"],
+        "final": float(stats["final"]),
+        "max_drawdown": float(stats["max_drawdown"]),
+        "max_bet": float(stats["max_bet"]),
+        "min_equity": float(stats["min_equity"]),
+        "turnover": float(stakes.sum()),
+    }
+
+
+def sweep(sums: np.ndarray, strategy: str, initial_bets: Iterable[float], max_win_streaks: Iterable[int],
+          odds: float = 2.0) -> List[Dict]:
+    """
+    参数扫描：对所有 (initial_bet, max_win_streak) 组合返回汇总统计（不含权益曲线）。
+    每个 max_win_streak 只计算一次 initial_bet=1 的曲线，其余按比例缩放。
+    """
+    wins = round_wins(sums, strategy)
+    initial_bets = np.asarray(list(initial_bets), dtype=np.float64)
+    streaks = np.unique(np.asarray(list(max_win_streaks), dtype=np.int64))
+    results = []
+    # 分块处理，避免 (参数数 × 轮数) 的矩阵过大
+    chunk = max(1, int(2e7 // max(1, len(wins))))
+    for start in range(0, len(streaks), chunk):
+        m = streaks[start:start + chunk]
+        stakes = stake_multipliers(wins, m)
+        profit = np.where(wins, stakes * (odds - 1), -stakes)
+        stats = _curve_stats(profit, stakes)
+        turnover = stakes.sum(axis=-1)
+        for row, streak in enumerate(m):
+            for bet in initial_bets:
+                results.append({
+                    "strategy": strategy,
+                    "initial_bet": float(bet),
+                    "max_win_streak": int(streak),
+                    "final": float(bet * stats["final"][row]),
+                    "max_drawdown": float(bet * stats["max_drawdown"][row]),
+                    "max_bet": float(bet * stats["max_bet"][row]),
+                    "min_equity": float(bet * stats["min_equity"][row]),
+                    "turnover": float(bet * turnover[row]),
+                })
+    return results
+
+
+def _parse_values(text: str, cast=float) -> List:
+    """解析 '1,2,5' 或 '1-10' 形式的参数列表。"""
+    values = []
+    for part in text.split(","):
+        part = part.strip()
+        if "-" in part[1:]:
+            lo, hi = part.split("-", 1)
+            values.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            values.append(cast(part))
+    return [cast(v) for v in values]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Canada28 策略离线回测")
+    parser.add_argument("--db", default=str(Path.home() / "history.db"), help="历史库路径 (默认 ~/history.db)")
+    parser.add_argument("--since", type=float, help="开奖时间下限（Unix 时间戳）")
+    parser.add_argument("--until", type=float, help="开奖时间上限（Unix 时间戳）")
+    parser.add_argument("--random", type=int, help="不读历史库，随机生成 N 期开奖")
+    parser.add_argument("--strategy", choices=STRATEGY_NAMES + ("all",), default="all")
+    parser.add_argument("--initial", default="1", help="初始金额，支持 '1,2,5' 或 '1-10'")
+    parser.add_argument("--max-streak", default="3", help="最大连胜，支持 '3,4' 或 '1-10'")
+    parser.add_argument("--odds", type=float, default=2.0, help="含本金赔率 (默认 2.0)")
+    parser.add_argument("--sweep", action="store_true", help="参数扫描，输出按最终盈亏排序的前若干组")
+    parser.add_argument("--top", type=int, default=10, help="参数扫描时输出的组数")
+    args = parser.parse_args()
+
+    if args.random:
+        sums = random_sums(args.random)
+    else:
+        sums = load_sums(Path(args.db), args.since, args.until)
+    if len(sums) < 2:
+        print("历史数据不足（至少需要两期开奖）。")
+        return
+    strategies = STRATEGY_NAMES if args.strategy == "all" else (args.strategy,)
+    initial_bets = _parse_values(args.initial, float)
+    max_streaks = _parse_values(args.max_streak, int)
+    print(f"回测数据: {len(sums)} 期")
+
+    started = time.perf_counter()
+    if args.sweep:
+        for strategy in strategies:
+            results = sweep(sums, strategy, initial_bets, max_streaks, args.odds)
+            results.sort(key=lambda r: (r["final"], -r["max_drawdown"]), reverse=True)
+            print(f"\n策略 [{strategy}] 共 {len(results)} 组参数，前 {args.top} 组:")
+            for r in results[:args.top]:
+                print(json.dumps(r, ensure_ascii=False))
+    else:
+        for strategy in strategies:
+            for bet in initial_bets:
+                for streak in max_streaks:
+                    r = backtest(sums, strategy, bet, streak, args.odds)
+                    r.pop("equity")
+                    print(json.dumps(r, ensure_ascii=False))
+    print(f"\n耗时 {time.perf_counter() - started:.3f} 秒")
+
+
+if __name__ == "__main__":
+    main()
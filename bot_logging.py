@@ -0,0 +1,162 @@
+"""
+结构化日志：JSON-lines 格式、非阻塞写入、按大小与时间轮转、按子系统设置级别。
+
+- 各模块使用 get_logger("engine") 等子系统日志器（实际名称为 canada28.engine）
+- 调用线程只把记录放入内存队列（QueueHandler），由后台 QueueListener 线程格式化并写文件，下注路径不会阻塞在磁盘 I/O 上
+- 日志文件 <log_dir>/canada28.jsonl，超过 max_bytes 或距上次轮转超过 rotate_hours 小时即轮转，保留 backup_count 份
+- 控制台（run.sh 重定向到 web.log）只输出 console_level 及以上的可读文本，避免 web.log 无限增长
+- 通过 extra={...} 传入的字段会作为 JSON 的顶层字段输出；ContextLogger 为一组记录附加固定字段
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+ROOT_LOGGER = "canada28"
+
+DEFAULT_LOGGING = {
+    "level": "INFO",
+    "console_level": "WARNING",
+    "max_bytes": 10 * 1024 * 1024,
+    "backup_count": 10,
+    "rotate_hours": 24,
+    # 子系统级别，例如 {"feed": "WARNING", "sender": "DEBUG"}
+    "levels": {},
+}
+
+# LogRecord 自带的属性，其余属性视为 extra 字段
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_file_handler: Optional[logging.Handler] = None
+_console_handler: Optional[logging.Handler] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+
+class ContextLogger(logging.LoggerAdapter):
+    """为每条记录附加固定字段（例如 instance），并保留调用方传入的 extra。"""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **(kwargs.get("extra") or {})}
+        return msg, kwargs
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON：ts、level、logger、msg 以及 extra 字段。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizeTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """超过 maxBytes 或距上次轮转超过 interval 秒时轮转。"""
+
+    def __init__(self, filename, interval: float, maxBytes: int = 0, backupCount: int = 0, encoding="utf-8"):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)
+        self.interval = interval
+        try:
+            opened = os.stat(filename).st_mtime if os.path.getsize(filename) else time.time()
+        except OSError:
+            opened = time.time()
+        self.rollover_at = opened + interval
+
+    def shouldRollover(self, record) -> int:
+        if self.interval > 0 and time.time() >= self.rollover_at:
+            return 1
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """保留 extra 字段与异常文本，交给监听线程再格式化为 JSON。"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _level(name, default=logging.INFO) -> int:
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else default
+
+
+def setup_logging(log_dir: Path, cfg: Optional[dict] = None) -> logging.Logger:
+    """
+    初始化（或按新配置调整）日志。可重复调用：首次创建队列与监听线程，之后只更新级别。
+    cfg 为 config.json 中的 logging 段，缺省字段取 DEFAULT_LOGGING。
+    """
+    global _listener, _file_handler, _console_handler, _queue_handler
+    cfg = {**DEFAULT_LOGGING, **(cfg or {})}
+    root = logging.getLogger(ROOT_LOGGER)
+
+    if _listener is None:
+        log_dir = Path(log_dir)
+        log_dir.mkdir(parents=True, exist_ok=True)
+        _file_handler = SizeTimeRotatingFileHandler(
+            str(log_dir / "canada28.jsonl"),
+            interval=float(cfg["rotate_hours"]) * 3600,
+            maxBytes=int(cfg["max_bytes"]),
+            backupCount=int(cfg["backup_count"]),
+        )
+        _file_handler.setFormatter(JsonFormatter())
+        _console_handler = logging.StreamHandler(sys.stdout)
+        _console_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+        log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, _file_handler, _console_handler,
+                                                   respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        _queue_handler = _QueueHandler(log_queue)
+        root.addHandler(_queue_handler)
+        root.propagate = False
+
+    _console_handler.setLevel(_level(cfg["console_level"], logging.WARNING))
+    root.setLevel(_level(cfg["level"]))
+    for subsystem, level in (cfg.get("levels") or {}).items():
+        get_logger(subsystem).setLevel(_level(level))
+    return root
+
+
+def shutdown_logging():
+    """停止监听线程并写完队列中剩余的记录。"""
+    global _listener, _queue_handler
+    listener, _listener = _listener, None
+    if _queue_handler is not None:
+        logging.getLogger(ROOT_LOGGER).removeHandler(_queue_handler)
+        _queue_handler = None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
@@ -1,27 +1,51 @@
+import asyncio
+import copy
 import os
 import json
 import sys
-import subprocess
-import requests
 import time
-import random
+import re
 import threading
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from result_feed import (AdaptivePollScheduler, HedgedResultSource, HttpResultSource, ResultFeed, UnixSocketBroker,
+                         make_push_backend)
+from history_store import HistoryStore
+from state_journal import StateJournal
+from strategies import STRATEGIES, Decision
+from telemetry import EventHub, MetricsRegistry
+from bot_logging import DEFAULT_LOGGING, ContextLogger, get_logger, setup_logging
+from tg_sender import SenderPool, SendResult
+from timing import ClockSync, DrawClock, PreciseTimer
 
 # --- 全局/路径配置 ---
 HOME_DIR = Path.home()
 CONFIG_FILE = HOME_DIR / 'config.json'
 STATE_FILE = HOME_DIR / 'state.json'
+HISTORY_DB_FILE = HOME_DIR / 'history.db'
+LOG_DIR = HOME_DIR / 'logs'
+ROOMS_DIR = HOME_DIR / 'rooms'  # 多实例（房间）目录：rooms/<实例ID>/{config.json,state.json,history.db}
+DEFAULT_INSTANCE = "default"    # 默认实例直接使用主目录下的文件
 SIGNER_DIR = HOME_DIR / '.signer'
+SESSION_DIR = HOME_DIR  # tg-signer 默认在当前目录（run.sh 会切换到主目录）保存 <alias>.session
 
 # --- 业务常量 ---
 API_URL = 'http://27.106.127.108:9990/ce/apis.php'
-POLLING_INTERVAL_SECONDS = 2   # 轮询新结果的间隔
+POLLING_INTERVAL_SECONDS = 2   # 无法预计开奖时间时的轮询间隔
+FAST_POLLING_INTERVAL_SECONDS = 0.3  # 预计开奖时刻附近的密集轮询间隔
+MAX_POLLING_INTERVAL_SECONDS = 5     # 开奖延迟时轮询间隔的退避上限
+DETECTION_HISTORY_SIZE = 50    # state.json 中保留的检测延迟样本数
 RETRY_INTERVAL_SECONDS = 30    # API请求失败后的重试间隔
 AWARD_INTERVAL_SECONDS = 210   # 官方开奖间隔 (3.5分钟)
 POLL_AHEAD_SECONDS = 10        # 提前多少秒开始轮询
 BET_DELAY_SECONDS = 30         # 开奖后等待多少秒再下注，确保盘口开放
+BET_CUTOFF_SECONDS = 30        # 下期开奖前多少秒封盘，之后不再发送下注
+API_TZ = timezone(timedelta(hours=8))  # API 返回时间为 UTC+8
+
+log = get_logger("engine")
+config_log = get_logger("config")
 
 # 轻量版默认配置（首次启动或缺失字段时写入/补齐）
 DEFAULT_CONFIG = {
@@ -34,6 +58,31 @@ DEFAULT_CONFIG = {
     },
     # 账户池：[{ alias, display_name, chat_id, enabled }]
     "accounts": [],
+    # 发送层：use_client=True 时每个账户常驻一个已连接客户端，否则每注调用 tg-signer 子进程；
+    # rate_limit 为令牌桶限速（每个账户 / 每个 chat_id 按每分钟条数，全局按每秒条数，burst 为允许的突发条数）
+    "sender": {
+        "use_client": True,
+        "rate_limit": {
+            "account_per_minute": 30,
+            "account_burst": 3,
+            "chat_per_minute": 20,
+            "chat_burst": 5,
+            "global_per_second": 25,
+            "global_burst": 25
+        }
+    },
+    # 开奖结果源：endpoints 为多个 API 地址（为空时使用 API_URL，多个时对冲请求并交叉校验）；
+    # push_type 为 sse / websocket / unix / local，push_url 为空时仅轮询 API（unix 时为另一进程的 broker_socket 路径）；
+    # broker_socket 非空时把检测到的新期号经该 Unix socket 分发给本机其他进程
+    "result_feed": {
+        "endpoints": [],
+        "push_type": "sse",
+        "push_url": "",
+        "broker_socket": ""
+    },
+    # 日志：JSON-lines 写入 ~/logs/canada28.jsonl，按大小/时间轮转；levels 为各子系统级别
+    # （engine / config / sender / feed / history / state / signer / jobs / web）
+    "logging": copy.deepcopy(DEFAULT_LOGGING),
     # 策略与旧版结构保持兼容
     "strategies": {
         "big_small": {
@@ -67,6 +116,20 @@ def ensure_default_config(cfg: dict) -> dict:
     cfg["web"]["auth"].setdefault("password", DEFAULT_CONFIG["web"]["auth"]["password"])
     # accounts
     cfg.setdefault("accounts", [])
+    # sender
+    cfg.setdefault("sender", {})
+    cfg["sender"].setdefault("use_client", DEFAULT_CONFIG["sender"]["use_client"])
+    cfg["sender"].setdefault("rate_limit", {})
+    for k, v in DEFAULT_CONFIG["sender"]["rate_limit"].items():
+        cfg["sender"]["rate_limit"].setdefault(k, v)
+    # result_feed
+    cfg.setdefault("result_feed", {})
+    for k, v in DEFAULT_CONFIG["result_feed"].items():
+        cfg["result_feed"].setdefault(k, v)
+    # logging
+    cfg.setdefault("logging", {})
+    for k, v in DEFAULT_CONFIG["logging"].items():
+        cfg["logging"].setdefault(k, copy.deepcopy(v))
     # strategies
     cfg.setdefault("strategies", {})
     for k, v in DEFAULT_CONFIG["strategies"].items():
@@ -79,145 +142,326 @@ def ensure_default_config(cfg: dict) -> dict:
     return cfg
 
 
+class ConfigCache:
+    """
+    config.json 的内存快照。
+    - 按文件 (mtime, size, inode) 判断快照是否失效，未变化时不读盘（每次仅一次 stat）
+    - 补齐默认字段或保存时，只有内容确实变化才写回磁盘
+    - stats() 中的 loads / hits / writes / skipped_writes 用于衡量配置读写放大
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot: Optional[dict] = None
+        self._stamp = None
+        self.loads = 0
+        self.hits = 0
+        self.writes = 0
+        self.skipped_writes = 0
+
+    def _file_stamp(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _write(self, cfg: dict):
+        atomic_write_json(self.path, cfg)
+        self.writes += 1
+        self._stamp = self._file_stamp()
+
+    def _reload(self, stamp):
+        if stamp is None:
+            cfg = ensure_default_config({})
+            self._write(cfg)
+            config_log.info(f"已创建默认配置: {self.path}")
+            self._snapshot = cfg
+            return
+        self.loads += 1
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            config_log.warning(f"读取配置失败({e})，写入并使用默认配置。")
+            raw = None
+        cfg = ensure_default_config(copy.deepcopy(raw) if isinstance(raw, dict) else {})
+        self._stamp = stamp
+        # 仅在补齐了字段（或原文件无效）时写回
+        if cfg != raw:
+            try:
+                self._write(cfg)
+            except OSError as e:
+                config_log.warning(f"无法写回配置文件: {e}")
+        self._snapshot = cfg
+
+    def snapshot(self) -> dict:
+        """当前配置（共享对象，调用方不得修改）。"""
+        with self._lock:
+            stamp = self._file_stamp()
+            if self._snapshot is None or stamp != self._stamp:
+                self._reload(stamp)
+            else:
+                self.hits += 1
+            return self._snapshot
+
+    def get(self) -> dict:
+        """当前配置的副本，可自由修改后通过 save() 保存。"""
+        return copy.deepcopy(self.snapshot())
+
+    def save(self, cfg: dict) -> bool:
+        """补齐默认字段后保存；内容与快照相同则跳过写盘。返回是否写入。"""
+        cfg = ensure_default_config(copy.deepcopy(cfg or {}))
+        with self._lock:
+            if self._snapshot is not None and cfg == self._snapshot and self._file_stamp() == self._stamp:
+                self.skipped_writes += 1
+                return False
+            self._write(cfg)
+            self._snapshot = cfg
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loads": self.loads,
+                "hits": self.hits,
+                "writes": self.writes,
+                "skipped_writes": self.skipped_writes,
+            }
+
+
 def load_config() -> dict:
-    """加载配置，如果不存在则创建默认配置；若缺字段则补齐。"""
-    if not CONFIG_FILE.is_file():
-        cfg = ensure_default_config({})
-        atomic_write_json(CONFIG_FILE, cfg)
-        print(f"已创建默认配置: {CONFIG_FILE}")
-        return cfg
+    """加载配置（读取内存快照，文件变化时才重新读取），如果不存在则创建默认配置；若缺字段则补齐。"""
+    return CONFIG.get()
 
-    try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            cfg = json.load(f)
-    except (json.JSONDecodeError, OSError) as e:
-        print(f"警告: 读取配置失败({e})，写入并使用默认配置。")
-        cfg = {}
-    cfg = ensure_default_config(cfg)
-    # 将补齐的字段写回
-    try:
-        atomic_write_json(CONFIG_FILE, cfg)
-    except OSError as e:
-        print(f"警告: 无法写回配置文件: {e}")
-    return cfg
 
+# 推送给面板的状态字段（不含开奖时钟历史等大字段）
+STATE_EVENT_KEYS = ('strategies', 'last_period_issue', 'last_period_sum', 'last_award_time_str',
+                    'last_detection', 'detection_latency_ms', 'draw_clock_summary')
+
+# 每轮结算后写入状态日志的字段（其余字段只在压缩快照时写入；draw_clock 每轮只记录新增的一期观测）
+ROUND_STATE_KEYS = STATE_EVENT_KEYS + ('pending_bets',)
+
+
+def publish_state(state: Optional[dict], instance: str = DEFAULT_INSTANCE):
+    """把当前状态快照广播给面板，面板无需再读 state.json。"""
+    snapshot = None if state is None else copy.deepcopy({k: state.get(k) for k in STATE_EVENT_KEYS})
+    EVENTS.publish("state", instance=instance, state=snapshot)
 
-def save_state(state: dict):
-    """保存运行时 state.json"""
-    try:
-        atomic_write_json(STATE_FILE, state)
-    except OSError as e:
-        print(f"警告: 保存状态失败: {e}")
 
+def configure_result_endpoints(endpoints):
+    """按配置切换结果地址列表；地址未变化时保留已有连接池与耗时统计。"""
+    urls = [str(u).strip() for u in (endpoints or []) if str(u).strip()] or [API_URL]
+    if urls != RESULT_FEED.source.urls:
+        old = RESULT_FEED.source
+        RESULT_FEED.source = HedgedResultSource([HttpResultSource(u, on_fetch=METRICS.observe_fetch, clock=CLOCK)
+                                                 for u in urls])
+        old.close()
+        log.info(f"结果地址: {', '.join(urls)}")
 
-def get_latest_result():
-    """从API获取最新的开奖结果。"""
+
+def report_send_result(result: SendResult, logger=None):
+    logger = logger or log
+    fields = {"alias": result.alias, "bet": result.text, "status": result.status, "via": result.via,
+              "latency_ms": round(result.latency * 1000, 1),
+              "skew_ms": None if result.skew is None else round(result.skew * 1000, 2)}
+    if result.status == "late":
+        logger.warning(f"下注迟到: {result.text} 在截止时间后才发出 (via={result.via}, 总耗时 {result.latency * 1000:.0f}ms)",
+                       extra=fields)
+    elif result.ok:
+        skew = "" if result.skew is None else f", 开盘偏差 {result.skew * 1000:+.1f}ms"
+        logger.info(f"下注发送成功: {result.text} (via={result.via}, 排队 {result.queued * 1000:.0f}ms, 总耗时 {result.latency * 1000:.0f}ms{skew})",
+                    extra=fields)
+    else:
+        logger.error(f"下注发送失败[{result.status or 'failed'}]: {result.text} (via={result.via or '-'}, 耗时 {result.latency * 1000:.0f}ms): {result.error}",
+                     extra=dict(fields, code=result.code, error=result.error))
+
+
+def next_issue(issue):
+    """本轮下注对应的期号（上一期期号 + 1），期号非数字时返回 None。"""
     try:
-        response = requests.get(API_URL, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if 'issue' in data and 'sum' in data and 'time' in data:
-            return data
-        else:
-            print(f"警告: API返回的数据格式不正确，缺少 'issue', 'sum' 或 'time'。返回: {response.text}")
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"错误: 请求API失败: {e}")
-        return None
-    except json.JSONDecodeError:
-        print(f"错误: 解析API返回的JSON失败。")
+        return int(issue) + 1
+    except (TypeError, ValueError):
         return None
 
 
-def send_bet_command(alias: str, chat_id: str, message: str) -> bool:
+def parse_award_time(time_str: str) -> datetime:
+    """解析 API 返回的 'MM-DD HH:MM:SS'（UTC+8，不含年份）为带时区的时间。"""
+    return datetime.strptime(f"{datetime.now().year}-{time_str}", "%Y-%m-%d %H:%M:%S").replace(tzinfo=API_TZ)
+
+
+def bet_cutoff_ts(estimate, opens_ts: float) -> float:
     """
-    使用 tg-signer 发送下注命令。
-    - 指定账户别名 alias（-a）
-    - 按注独立，逐条发送
-    - 兼容负 chat_id 时添加 '--'
+    本轮封盘时刻（下期开奖前 BET_CUTOFF_SECONDS 秒，Unix 时间戳）。
+    按开奖时钟预测区间的下界计算，开奖提前时也不会在封盘后下注。
     """
-    command = ['tg-signer']
-    if alias:
-        command.extend(['-a', str(alias)])
-    command.append('send-text')
-
-    if int(chat_id) < 0:
-        command.append('--')
+    if not estimate:
+        return opens_ts + AWARD_INTERVAL_SECONDS - BET_DELAY_SECONDS - BET_CUTOFF_SECONDS
+    return estimate['lo_ts'] - BET_CUTOFF_SECONDS
 
-    command.extend([str(chat_id), message])
 
-    try:
-        print(f"执行命令: {' '.join(command)}")
-        subprocess.run(command, capture_output=True, text=True, check=True, encoding='utf-8')
-        print("命令执行成功")
-        return True
-    except FileNotFoundError:
-        print("\n错误: 未找到 'tg-signer' 命令，请先安装并确保在 PATH 中。")
-        return False
-    except subprocess.CalledProcessError as e:
-        print(f"\n错误: tg-signer 执行失败。code={e.returncode}")
-        print(f"stdout: {e.stdout}")
-        print(f"stderr: {e.stderr}")
-        return False
-
-
-def load_state(config: dict) -> dict:
-    """加载状态，如果文件不存在或无效，则创建新状态。"""
-    if STATE_FILE.is_file():
+def load_state(config: dict, path: Optional[Path] = None, journal: Optional[StateJournal] = None) -> dict:
+    """
+    加载状态，如果文件不存在或无效，则创建新状态。
+    传入 journal 时从快照 + 状态日志恢复，新建的状态立即写入基线快照，之后只追加日志。
+    """
+    path = path or STATE_FILE
+    if journal is not None:
+        try:
+            state = journal.load()
+        except OSError as e:
+            log.warning(f"恢复状态失败: {e}，将创建新状态。")
+            state = None
+        if state is not None and 'strategies' in state:
+            return state
+        if state is not None:
+            log.warning(f"状态文件结构不正确，重建。")
+    elif path.is_file():
         try:
-            with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            with open(path, 'r', encoding='utf-8') as f:
                 state = json.load(f)
             if 'strategies' in state:
                 return state
             else:
-                print(f"警告: 状态文件结构不正确，重建。")
+                log.warning(f"状态文件结构不正确，重建。")
         except (json.JSONDecodeError, IOError) as e:
-            print(f"警告: 读取状态失败: {e}，将创建新状态。")
+            log.warning(f"读取状态失败: {e}，将创建新状态。")
 
     # 构建初始策略状态（仅为启用策略创建条目）
     initial_strategies_state = {}
     for name, strategy_config in config['strategies'].items():
-        if strategy_config.get('enabled'):
-            initial_strategies_state[name] = {
-                'current_bet': strategy_config['initial_bet'],
-                'win_streak': 0
-            }
+        if strategy_config.get('enabled') and name in STRATEGIES:
+            initial_strategies_state[name] = STRATEGIES[name].initial_state(strategy_config)
 
-    return {
+    state = {
         'strategies': initial_strategies_state,
         'last_period_sum': None,
         'last_period_issue': None,
         'last_award_time_str': None,
     }
+    if journal is not None:
+        try:
+            journal.compact(state)
+        except OSError as e:
+            log.warning(f"写入状态快照失败: {e}")
+    return state
 
 
-def pick_random_account(config: dict):
+def decide_round(config: dict, state: dict) -> List[Decision]:
+    """
+    为所有启用的策略生成下一轮下注。在结算后立即调用，等待盘口开放期间下注文本已经就绪；
+    结果同时写入 state['pending_bets']。
     """
-    从配置的账户池中随机选择一个“启用且已绑定chat_id”的账户。
+    decisions = []
+    for name, strategy_config in config['strategies'].items():
+        if not strategy_config.get('enabled'):
+            continue
+        strategy = STRATEGIES.get(name)
+        if strategy is None:
+            log.warning(f"未知策略 [{name}]，已忽略。")
+            continue
+        strategy_state = strategy.deserialize(state['strategies'].get(name), strategy_config)
+        state['strategies'][name] = strategy.serialize(strategy_state)
+        decisions.append(strategy.decide(state['last_period_sum'], strategy_state, strategy_config))
+    state['pending_bets'] = {
+        'after_issue': state['last_period_issue'],
+        'bets': [d.to_dict() for d in decisions],
+    }
+    return decisions
+
+
+def pick_account(config: dict, assigned: Optional[Dict[str, int]] = None, exclude: tuple = ()):
+    """
+    从配置的账户池中为一注选择“启用且已绑定chat_id”的账户：由发送层的账户调度器按成功率与发送延迟加权选择，
+    跳过限流/隔离中的账户；assigned 为本轮已分配给各别名的注数（同账户串行发送，尽量分散），
+    exclude 为不可选的别名（换账户重发时排除已失败的账户）。
     返回 (alias, chat_id, display_name) 或 None
     """
-    candidates = []
+    candidates = {}
     for acc in config.get('accounts', []):
         if acc.get('enabled') and acc.get('chat_id'):
-            candidates.append(acc)
+            candidates.setdefault(acc.get('alias') or "", acc)
     if not candidates:
         return None
-    acc = random.choice(candidates)
+    alias = SENDER_POOL.scheduler.choose(list(candidates), assigned, exclude)
+    if alias is None:
+        return None
+    acc = candidates[alias]
     return acc.get('alias'), str(acc.get('chat_id')), acc.get('display_name')
 
 
+class EngineMetrics:
+    """下注流水线的计数器与直方图，由 Web 面板的 /metrics 以 Prometheus 文本格式输出。"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.fetch_seconds = r.histogram("canada28_api_fetch_seconds", "结果 API 单次请求耗时", ("endpoint",))
+        self.fetch_errors = r.counter("canada28_api_fetch_errors_total", "结果 API 请求失败次数", ("endpoint",))
+        self.detection_lag = r.histogram("canada28_detection_lag_seconds", "开奖时刻到检测到结果的延迟", ("instance", "via"),
+                                         buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60))
+        self.send_seconds = r.histogram("canada28_bet_send_seconds", "单注从计划发出到发送完成的耗时", ("alias",))
+        self.bets = r.counter("canada28_bets_total", "下注结果计数", ("alias", "status"))
+        self.send_failures = r.counter("canada28_send_failures_total", "发送失败次数（按失败原因代码）", ("alias", "code"))
+        self.open_skew = r.histogram("canada28_bet_open_skew_seconds", "盘口开放到实际开始发送的偏差", ("alias",),
+                                     buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+        self.loop_seconds = r.histogram("canada28_loop_iteration_seconds", "主循环单轮耗时（含等待开奖）", ("instance",),
+                                        buckets=(1, 5, 10, 30, 60, 120, 180, 210, 240, 300, 600))
+        self.rounds = r.counter("canada28_rounds_total", "已完成的轮数", ("instance",))
+        self.running = r.gauge("canada28_engine_running", "引擎是否在运行", ("instance",))
+        self.rate_wait = r.histogram("canada28_rate_limit_wait_seconds", "发送前等待限速令牌的耗时", ("alias",),
+                                     buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30))
+        self.reroutes = r.counter("canada28_bet_reroutes_total", "确定未发出的注单换账户重发次数（按失败原因代码）", ("code",))
+        self.wake_jitter = r.histogram("canada28_timer_wake_jitter_seconds", "定时唤醒时刻与目标时刻的偏差",
+                                       buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+
+    def observe_fetch(self, url: str, seconds: float, ok: bool):
+        self.fetch_seconds.observe(seconds, endpoint=url)
+        if not ok:
+            self.fetch_errors.inc(endpoint=url)
+
+    def observe_send(self, result: SendResult):
+        self.bets.inc(alias=result.alias, status=result.status or ("sent" if result.ok else "failed"))
+        if result.status not in ("dropped", "timeout"):
+            self.send_seconds.observe(result.latency, alias=result.alias)
+            self.rate_wait.observe(result.rate_wait, alias=result.alias)
+        if result.skew is not None:
+            self.open_skew.observe(max(0.0, result.skew), alias=result.alias)
+        if not result.ok:
+            self.send_failures.inc(alias=result.alias, code=result.code or "unknown")
+
+
 class BotEngine:
     """
-    轻量引擎：在后台线程运行，与 Web 面板交互：
-    - start(): 启动线程
-    - stop(): 优雅停止
+    引擎：主循环是运行在共享事件循环上的一个 asyncio 任务（多个实例与整轮下注在同一循环上交错执行），
+    与 Web 面板交互：
+    - start(): 在实例管理器的事件循环上创建任务（可在任意线程调用）
+    - stop(): 取消任务并等待其退出；astop() 为事件循环内使用的协程版本
     - is_running: 运行状态
+    每个实例（房间）有独立的配置、状态、账户池与历史库，结果源与发送层由所有实例共享。
     """
-    def __init__(self):
-        self._thread = None
-        self._stop_event = threading.Event()
+    def __init__(self, instance_id: str = DEFAULT_INSTANCE, home: Path = HOME_DIR,
+                 config_store: Optional[ConfigCache] = None, history: Optional[HistoryStore] = None):
+        self.instance_id = instance_id
+        self.home = Path(home)
+        self.state_file = self.home / 'state.json'
+        self.journal = StateJournal(self.state_file)
+        self.config_store = config_store or ConfigCache(self.home / 'config.json')
+        self.history = history or HistoryStore(self.home / 'history.db')
+        self.log = ContextLogger(log, {"instance": instance_id})
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
         self._lock = threading.Lock()
         self._running = False
+        self._feed_acquired = False
+        self._state: Optional[dict] = None
+        self.draw_clock = DrawClock(AWARD_INTERVAL_SECONDS)
+        self.metrics = METRICS
+
+    def _publish(self, kind: str, **data):
+        EVENTS.publish(kind, instance=self.instance_id, **data)
 
     @property
     def is_running(self) -> bool:
@@ -227,239 +471,535 @@ class BotEngine:
     def start(self):
         with self._lock:
             if self._running:
-                print("引擎已在运行")
-                return
-            print("准备启动引擎...")
-            self._stop_event.clear()
-            self._running = True  # 在启动线程前就设置状态，防止并发
-            self._thread = threading.Thread(target=self._run_wrapper, name="Canada28BotEngine", daemon=True)
-            self._thread.start()
-            print(f"引擎线程已启动 (ID: {self._thread.ident})")
-
-    def stop(self):
-        with self._lock:
-            if not self._running:
-                print("引擎未在运行")
+                self.log.info("引擎已在运行")
                 return
-            print("正在请求引擎停止...")
-            self._stop_event.set()
-        # 等待线程退出
-        if self._thread:
-            self._thread.join(timeout=5)
+            self.log.info("准备启动引擎...")
+            self._stopped.clear()
+            self._running = True  # 在创建任务前就设置状态，防止并发
+            self._loop = MANAGER.ensure_loop()
+            self._loop.call_soon_threadsafe(self._spawn)
+
+    def _spawn(self):
+        name = "Canada28BotEngine" if self.instance_id == DEFAULT_INSTANCE else f"Canada28BotEngine-{self.instance_id}"
+        self._task = self._loop.create_task(self._run(), name=name)
+        self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, _task: asyncio.Task):
+        # 任务真正结束（包括启动前就被取消）时才更新状态
         with self._lock:
             self._running = False
-            self._thread = None
-        print("引擎已停止")
-
-    def _sleep_with_stop(self, seconds: float):
-        """可中断睡眠，便于快速停止"""
-        end = time.time() + max(0, seconds)
-        while not self._stop_event.is_set() and time.time() < end:
-            time.sleep(min(0.5, end - time.time()))
-
-    def _run_wrapper(self):
-        thread_id = threading.get_ident()
-        print(f"引擎运行循环开始 (线程 ID: {thread_id})")
+            self._task = None
+        self._stopped.set()
+
+    def _cancel_task(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def cancel(self) -> bool:
+        """请求停止：在事件循环中取消主循环任务。未运行时返回 False。"""
+        with self._lock:
+            loop = self._loop if self._running else None
+        if loop is None:
+            self.log.info("引擎未在运行")
+            return False
+        self.log.info("正在请求引擎停止...")
+        # 与 _spawn 同样经 call_soon_threadsafe 排队，启动后立即停止也能取消到任务
+        loop.call_soon_threadsafe(self._cancel_task)
+        return True
+
+    def _report_stopped(self, stopped: bool, timeout: float):
+        if stopped:
+            self.log.info("引擎已停止")
+        else:
+            self.log.warning(f"引擎未能在 {timeout} 秒内停止，仍在退出中")
+
+    def stop(self, timeout: float = 5):
+        """取消并等待引擎退出（不要在事件循环线程中调用，改用 astop()）。"""
+        if self.cancel():
+            self._report_stopped(self._stopped.wait(timeout), timeout)
+
+    async def astop(self, timeout: float = 5):
+        if self.cancel():
+            stopped = await asyncio.get_running_loop().run_in_executor(None, self._stopped.wait, timeout)
+            self._report_stopped(stopped, timeout)
+
+    async def _run(self):
+        task = asyncio.current_task()
+        self.log.info(f"引擎运行循环开始 (任务: {task.get_name()})")
+        self._publish("engine", running=True)
+        self.metrics.running.set(1, instance=self.instance_id)
         try:
-            self._run_loop()
+            await self._run_loop()
+        except asyncio.CancelledError:
+            self.log.info("引擎任务已取消")
         except Exception as e:
-            print(f"引擎异常退出 (线程 ID: {thread_id}): {e}")
+            self.log.exception(f"引擎异常退出: {e}")
+            self._publish("error", message=f"引擎异常退出: {e}")
         finally:
-            with self._lock:
-                self._running = False
-            print(f"引擎运行循环结束 (线程 ID: {thread_id})")
+            if self._feed_acquired:
+                self._feed_acquired = False
+                MANAGER.release_feed()
+            await asyncio.shield(asyncio.get_running_loop().run_in_executor(None, self._shutdown_storage))
+            self._publish("engine", running=False)
+            self.metrics.running.set(0, instance=self.instance_id)
+            self.log.info(f"引擎运行循环结束 (任务: {task.get_name()})")
 
-    def _run_loop(self):
-        print("\n--- 机器人开始运行 (Web面板可停止) ---")
+    def _estimate_next_draw(self, state: dict):
+        """用开奖时钟预测下一期，并把预测误差等统计写入 state 供面板展示。"""
+        try:
+            last_award_ts = parse_award_time(state['last_award_time_str']).timestamp()
+        except (TypeError, ValueError):
+            return None
+        estimate = self.draw_clock.estimate(state['last_period_issue'], last_award_ts)
+        state['draw_clock'] = self.draw_clock.to_dict()
+        state['draw_clock_summary'] = self.draw_clock.summary()
+        return estimate
+
+    def _settle_round(self, config: dict, state: dict, decisions: List[Decision], new_result: dict, placed: set):
+        """
+        按本轮各策略的下注判定输赢，更新策略状态并记录结算。
+        placed 为本期确实发出注单的策略；未发出的注单策略照常推进，结算标记为未下注，不计入盈亏。
+        """
+        for decision in decisions:
+            strategy = STRATEGIES[decision.strategy]
+            strategy_config = config['strategies'][decision.strategy]
+            strategy_state = strategy.deserialize(state['strategies'].get(decision.strategy), strategy_config)
+            won = strategy.settle(decision, new_result['sum'], strategy_state, strategy_config)
+            state['strategies'][decision.strategy] = strategy.serialize(strategy_state)
+            was_placed = decision.strategy in placed
+            self.history.record_settlement(new_result['issue'], decision.strategy, decision.amount, won,
+                                           placed=was_placed)
+            self._publish("settlement", issue=new_result['issue'], strategy=decision.strategy, text=decision.text,
+                          amount=decision.amount, won=won, placed=was_placed)
+            self.log.info(f"策略 [{strategy.label or strategy.name}]: {'胜利' if won else '失败'}"
+                          f"{'' if was_placed else '（本注未发出，不计盈亏）'}",
+                          extra={"issue": new_result['issue'], "strategy": decision.strategy,
+                                 "amount": decision.amount, "won": won, "placed": was_placed})
+
+    def _shutdown_storage(self):
+        """退出时写完历史库队列，并把状态压缩为快照（下次启动无需重放日志）。"""
+        self.history.flush()
+        state, self._state = self._state, None
+        try:
+            if state is not None:
+                self.journal.compact(state)
+            self.journal.close()
+        except OSError as e:
+            self.log.warning(f"保存状态失败: {e}")
+
+    def _commit(self, state: dict, keys, bets=None, draw=None):
+        try:
+            if bets:
+                self.journal.record_bets(state, bets[0], bets[1])
+            if draw:
+                self.journal.record_draw(state, draw, durable=not keys)  # 随后续的键一起 fsync
+            if keys:
+                self.journal.update(state, keys)
+            self.journal.maybe_compact(state)
+        except OSError as e:
+            self.log.warning(f"保存状态失败: {e}")
+
+    async def _save_state(self, state: dict, keys=ROUND_STATE_KEYS, draw: Optional[dict] = None):
+        # 只追加发生变化的键与新增的开奖观测（含 fsync），放到线程池中执行，不阻塞事件循环上的其他实例
+        await asyncio.get_running_loop().run_in_executor(None, self._commit, state, keys, None, draw)
+
+    async def _save_bets(self, state: dict, issue, bets: List[dict]):
+        # 整轮发送结果合并为一次 fsync；重启后据此跳过本期已发出的注单
+        await asyncio.get_running_loop().run_in_executor(None, self._commit, state, (), (issue, bets))
+
+    @staticmethod
+    def _placed(state: dict, issue) -> set:
+        """本期已经成功发出注单的策略（含重启前发出的）。"""
+        sent = state.get('sent_bets')
+        if not sent or str(sent.get('issue')) != str(issue):
+            return set()
+        return {b.get('strategy') for b in sent.get('bets', []) if b.get('ok')}
 
-        config = load_config()
-        state = load_state(config)
+    def _already_sent(self, state: dict, issue, decisions: List[Decision]) -> List[Decision]:
+        """过滤掉重启前本期已经成功发出的注单（按策略区分）。"""
+        done = self._placed(state, issue)
+        if not done:
+            return decisions
+        for decision in decisions:
+            if decision.strategy in done:
+                self.log.warning(f"第 {issue} 期 {decision.text} 已在重启前发出，本次不再重复发送。",
+                                 extra={"issue": issue, "strategy": decision.strategy})
+        return [d for d in decisions if d.strategy not in done]
+
+    async def _send_round(self, config: dict, state: dict, bet_issue, bets: List[tuple], bet_meta: List[tuple],
+                          opens_ts: float, cutoff_ts: float, assigned: Dict[str, int]):
+        """
+        由发送层在盘口开放时刻整轮并发发出并等待结果；确定没有发出的失败注单（限流、子进程失败等）
+        在封盘前立即换一个本注尚未用过的账户重发，直到成功或没有可用账户。
+        """
+        tried = [{alias or ""} for alias, _, _ in bets]
+        fire_at = opens_ts
+        while bets:
+            armed = SENDER_POOL.arm(bets, fire_at=fire_at, cutoff=cutoff_ts)
+            delay_duration = armed.seconds_until_fire()
+            if delay_duration > 0:
+                self.log.info(f"上一期结果已出，下注已就绪，{delay_duration:.1f} 秒后盘口开放时发出...")
+            try:
+                results = await armed.collect_async()
+            except asyncio.CancelledError:
+                armed.cancel()  # 停止时撤回尚未发出的注单
+                raise
+            await self._save_bets(state, bet_issue, [
+                {"strategy": strategy_name, "text": result.text, "alias": result.alias,
+                 "status": result.status, "ok": result.ok}
+                for result, (strategy_name, _) in zip(results, bet_meta)])
+            for result, (strategy_name, amount) in zip(results, bet_meta):
+                # 指标与账户健康度由发送层记录：截止时撤回的注单在 collect 时记录，仍在发送中的注单完成时记录
+                report_send_result(result, self.log)
+                latency_ms = round(result.latency * 1000, 1)
+                skew_ms = None if result.skew is None else round(result.skew * 1000, 2)
+                self.history.record_bet(bet_issue, strategy_name, result.text, amount, result.alias, result.status,
+                                        latency_ms, skew_ms=skew_ms)
+                self._publish("bet_sent", issue=bet_issue, strategy=strategy_name, text=result.text,
+                              amount=amount, alias=result.alias, ok=result.ok, status=result.status,
+                              via=result.via, latency_ms=latency_ms, skew_ms=skew_ms, error=result.error)
+
+            retry_bets, retry_meta, retry_tried = [], [], []
+            if TIMER.now() < cutoff_ts:
+                for result, meta, used in zip(results, bet_meta, tried):
+                    if not result.retryable:
+                        continue
+                    picked = pick_account(config, assigned, exclude=tuple(used))
+                    if not picked:
+                        self.log.warning(f"{result.text} 发送失败 ({result.code})，没有其他可用账户重发。")
+                        continue
+                    alias, chat_id, display_name = picked
+                    assigned[alias or ""] = assigned.get(alias or "", 0) + 1
+                    self.log.warning(f"{result.text} 经账户[{result.alias}] 发送失败 ({result.code})，"
+                                     f"改由账户[{display_name or alias}] 重发",
+                                     extra={"issue": bet_issue, "alias": alias, "code": result.code})
+                    self.metrics.reroutes.inc(code=result.code)
+                    retry_bets.append((alias, chat_id, result.text))
+                    retry_meta.append(meta)
+                    retry_tried.append(used | {alias or ""})
+            bets, bet_meta, tried = retry_bets, retry_meta, retry_tried
+            fire_at = TIMER.now()
+
+    async def _run_loop(self):
+        self.log.info("--- 机器人开始运行 (Web面板可停止) ---")
+
+        # 日志、发送层与结果源的设置取自主配置，由所有实例共享
+        setup_logging(LOG_DIR, CONFIG.snapshot()['logging'])
+        MANAGER.acquire_feed()
+        self._feed_acquired = True
+        config = self.config_store.get()
+        state = self._state = await asyncio.get_running_loop().run_in_executor(
+            None, load_state, config, self.state_file, self.journal)
+        self.draw_clock = DrawClock(AWARD_INTERVAL_SECONDS)
+        self.draw_clock.load(state.get('draw_clock'))
+
+        # 提前为可用账户建立常驻连接，避免首注付出握手耗时
+        for acc in config.get('accounts', []):
+            if acc.get('enabled') and acc.get('chat_id') and acc.get('alias'):
+                SENDER_POOL.warm(acc['alias'])
 
         # 1) 初始化：若无历史期号，则先获取一次初始结果
         if not state.get('last_period_issue'):
-            print("未找到历史状态，正在获取初始开奖结果...")
-            while not self._stop_event.is_set():
-                initial_result = get_latest_result()
+            self.log.info("未找到历史状态，正在获取初始开奖结果...")
+            while True:
+                initial_result = await RESULT_FEED.poll_async()
                 if initial_result:
                     state['last_period_issue'] = initial_result['issue']
                     state['last_period_sum'] = initial_result['sum']
                     state['last_award_time_str'] = initial_result['time']
-                    print(f"获取到初始结果: 期号={state['last_period_issue']}, 和值={state['last_period_sum']}, 时间={state['last_award_time_str']}")
-                    save_state(state)
+                    self.log.info(f"获取到初始结果: 期号={state['last_period_issue']}, 和值={state['last_period_sum']}, 时间={state['last_award_time_str']}")
+                    draw = None
+                    try:
+                        award_ts = parse_award_time(initial_result['time']).timestamp()
+                        draw = self.draw_clock.observe(initial_result['issue'], award_ts)
+                    except ValueError:
+                        award_ts = None
+                    self.history.record_draw(initial_result['issue'], initial_result['sum'], award_ts, TIMER.now(), "initial")
+                    await self._save_state(state, ('last_period_issue', 'last_period_sum', 'last_award_time_str'),
+                                           draw)
                     break
                 else:
-                    print(f"获取初始结果失败，{RETRY_INTERVAL_SECONDS} 秒后重试...")
-                    self._sleep_with_stop(RETRY_INTERVAL_SECONDS)
-            if self._stop_event.is_set():
-                return
+                    self.log.warning(f"获取初始结果失败，{RETRY_INTERVAL_SECONDS} 秒后重试...")
+                    await asyncio.sleep(RETRY_INTERVAL_SECONDS)
         else:
-            print("成功从 state.json 加载历史状态。")
+            self.log.info("成功从 state.json 加载历史状态。")
+
+        estimate = self._estimate_next_draw(state)
+        decisions = decide_round(config, state)
+        publish_state(state, self.instance_id)
 
-        # 主循环
-        while not self._stop_event.is_set():
-            print("\n" + "=" * 50)
+        # 主循环（停止即取消任务，在当前 await 处抛出 CancelledError）
+        while True:
+            iteration_started = time.perf_counter()
             # 打印策略状态
             for name, strategy_state in state['strategies'].items():
-                print(f"策略 [{name}]: 连胜 {strategy_state['win_streak']} 场 | 下次下注金额 {strategy_state['current_bet']}")
+                self.log.info(f"策略 [{name}]: 连胜 {strategy_state['win_streak']} 场 | 下次下注金额 {strategy_state['current_bet']}")
 
-            # 2) 等待盘口开放
-            try:
-                API_TZ = timezone(timedelta(hours=8))
-                last_award_time_aware = datetime.strptime(f"{datetime.now().year}-{state['last_award_time_str']}", "%Y-%m-%d %H:%M:%S").replace(tzinfo=API_TZ)
-                betting_opens_time_aware = last_award_time_aware + timedelta(seconds=BET_DELAY_SECONDS)
-                now_aware = datetime.now(API_TZ)
-                if now_aware < betting_opens_time_aware:
-                    delay_duration = (betting_opens_time_aware - now_aware).total_seconds()
-                    if delay_duration > 0:
-                        print(f"上一期结果已出，等待 {delay_duration:.1f} 秒以确保盘口开放...")
-                        self._sleep_with_stop(delay_duration)
-                        if self._stop_event.is_set():
-                            break
-            except (ValueError, KeyError) as e:
-                print(f"警告: 计算下注延迟时出错 ({e})。跳过延迟。")
-
-            # 3) 基于上一期结果组装下注文本（大小/单双）
-            bet_texts = []
-            last_sum = state['last_period_sum']
-
-            # 大小
-            if config['strategies']['big_small']['enabled']:
-                bet_type = "大" if (last_sum is not None and last_sum >= 14) else "小"
-                bet_amount = state['strategies']['big_small']['current_bet']
-                bet_texts.append(f"{bet_type}{bet_amount}")
-
-            # 单双
-            if config['strategies']['odd_even']['enabled']:
-                if last_sum is None:
-                    # 没有可参考和值，默认下“单1”
-                    bet_type = "单"
-                else:
-                    bet_type = "双" if (last_sum % 2 == 0) else "单"
-                bet_amount = state['strategies']['odd_even']['current_bet']
-                bet_texts.append(f"{bet_type}{bet_amount}")
-
-            if not bet_texts:
-                print("没有启用的下注策略。请在 Web 面板中启用策略后再启动。")
+            # 2) 下注文本已在上一轮结算后由策略插件生成
+            if not decisions:
+                self.log.info("没有启用的下注策略。请在 Web 面板中启用策略后再启动。")
                 break
 
-            # 4) 按注独立随机账号逐条发送（每条下注文本独立随机选择一个账号）
-            for txt in bet_texts:
-                # 优先从账户池随机
-                picked = pick_random_account(config)
+            # 3) 等待盘口开放期间准备好整轮下注：每条下注文本独立随机选择一个账号，提前连接客户端并排队
+            bet_issue = next_issue(state['last_period_issue'])
+            try:
+                opens_ts = parse_award_time(state['last_award_time_str']).timestamp() + BET_DELAY_SECONDS
+            except (ValueError, KeyError, TypeError) as e:
+                self.log.warning(f"计算下注延迟时出错 ({e})。跳过延迟。")
+                opens_ts = TIMER.now()
+            bets, bet_meta, planned, assigned = [], [], [], {}
+            for decision in self._already_sent(state, bet_issue, decisions):
+                # 按账户健康度与延迟加权选择
+                picked = pick_account(config, assigned)
                 if picked:
                     alias, chat_id, display_name = picked
-                    print(f"将使用账户[{display_name or alias}] 发送下注: {txt} -> chat_id={chat_id}")
-                    ok = send_bet_command(alias=alias, chat_id=chat_id, message=txt)
+                    assigned[alias or ""] = assigned.get(alias or "", 0) + 1
+                    self.log.info(f"将使用账户[{display_name or alias}] 发送下注: {decision.text} -> chat_id={chat_id}")
+                    bets.append((alias, chat_id, decision.text))
+                    bet_meta.append((decision.strategy, decision.amount))
+                    planned.append(dict(decision.to_dict(), alias=alias))
                 else:
-                    print("错误: 账户池为空或所有可用账户均未绑定 chat_id，跳过本注。")
-                    ok = False
-
-                if not ok:
-                    print(f"下注发送失败: {txt}。")
-                    # 失败后不再自动重试，等待下一轮
+                    self.log.error("账户池为空、所有可用账户均未绑定 chat_id 或均在限流冷却中，跳过本注。")
+                    self.history.record_bet(bet_issue, decision.strategy, decision.text, decision.amount, None, "no_account")
+                    planned.append(dict(decision.to_dict(), alias=None))
+                    self._publish("error", message=f"没有可用账户（未绑定 chat_id 或均在限流冷却中），跳过下注 {decision.text}")
 
+            # 4) 盘口开放瞬间由发送层定时器整轮并发发出（按账户/聊天/全局限速），确定未发出的失败注单封盘前换账户重发，
+            #    封盘前仍未发出的注单丢弃并报告
+            self._publish("round_started", issue=bet_issue, opens_ts=opens_ts, bets=planned)
+            if bets:
+                cutoff_ts = bet_cutoff_ts(estimate, opens_ts)
+                if cutoff_ts <= max(opens_ts, TIMER.now()):
+                    self.log.warning(f"本轮已封盘 ({TIMER.now() - cutoff_ts:.1f} 秒前)，放弃 {len(bets)} 注。")
+                    for (alias, _, txt), (strategy_name, amount) in zip(bets, bet_meta):
+                        self.history.record_bet(bet_issue, strategy_name, txt, amount, alias, "closed")
+                        self.metrics.bets.inc(alias=alias, status="closed")
+                    self._publish("error", message=f"第 {bet_issue} 期已封盘，放弃 {len(bets)} 注")
+                else:
+                    await self._send_round(config, state, bet_issue, bets, bet_meta, opens_ts, cutoff_ts, assigned)
 
-                if self._stop_event.is_set():
-                    break
-
-            if self._stop_event.is_set():
-                break
-
-            # 5) 等待下一期开奖的时间点
-            try:
-                API_TZ = timezone(timedelta(hours=8))
-                aware_last_award_time = datetime.strptime(f"{datetime.now().year}-{state['last_award_time_str']}", "%Y-%m-%d %H:%M:%S").replace(tzinfo=API_TZ)
-                aware_next_award_time = aware_last_award_time + timedelta(seconds=AWARD_INTERVAL_SECONDS)
-                now_utc = datetime.now(timezone.utc)
-                next_award_time_utc = aware_next_award_time.astimezone(timezone.utc)
-                sleep_until_utc = next_award_time_utc - timedelta(seconds=POLL_AHEAD_SECONDS)
-                if now_utc < sleep_until_utc:
-                    sleep_duration = (sleep_until_utc - now_utc).total_seconds()
-                    display_next_award = next_award_time_utc.astimezone(API_TZ)
-                    display_sleep_until = sleep_until_utc.astimezone(API_TZ)
-                    print(f"下注阶段结束。预计下期开奖 (UTC+8): {display_next_award.strftime('%H:%M:%S')}")
-                    print(f"将休眠 {sleep_duration:.1f} 秒，到 {display_sleep_until.strftime('%H:%M:%S')} (UTC+8) 再开始轮询开奖结果...")
-                    self._sleep_with_stop(sleep_duration)
+            # 5) 按开奖时钟预测下一期开奖时间点（学习真实开奖间隔与 API 发布延迟）
+            if estimate:
+                expected_at = estimate['expected_publish_ts']
+                # 置信区间越宽，越早开始密集轮询
+                ahead = POLL_AHEAD_SECONDS
+                if estimate['samples'] >= self.draw_clock.min_samples:
+                    ahead = max(2.0, expected_at - (estimate['lo_ts'] + estimate['publish_lag_lo']) + 1.0)
+                next_award = datetime.fromtimestamp(estimate['next_award_ts'], API_TZ)
+                poll_from = datetime.fromtimestamp(expected_at - ahead, API_TZ)
+                self.log.info(f"下注阶段结束。预计下期开奖 (UTC+8): {next_award.strftime('%H:%M:%S')} "
+                      f"(区间 {estimate['lo_ts'] - estimate['next_award_ts']:+.1f}s/{estimate['hi_ts'] - estimate['next_award_ts']:+.1f}s, "
+                      f"间隔 {estimate['interval']:.1f}s, 发布延迟 {estimate['publish_lag']:.1f}s)")
+                if TIMER.now() < expected_at - ahead:
+                    self.log.info(f"将在 {poll_from.strftime('%H:%M:%S')} (UTC+8) 开始密集轮询开奖结果（推送到达时立即处理）...")
                 else:
-                    print("警告: 计算出的下次轮询时间已过或过近，立即开始轮询。")
-            except ValueError:
-                print(f"警告: 无法解析时间 '{state['last_award_time_str']}'。回退到固定时间等待。")
-                self._sleep_with_stop(max(0, AWARD_INTERVAL_SECONDS - POLL_AHEAD_SECONDS if AWARD_INTERVAL_SECONDS > POLL_AHEAD_SECONDS else 60))
+                    self.log.warning("计算出的下次轮询时间已过或过近，立即开始轮询。")
+            else:
+                self.log.warning(f"无法解析时间 '{state['last_award_time_str']}'。回退到固定时间等待。")
+                expected_at = TIMER.now() + AWARD_INTERVAL_SECONDS
+                ahead = POLL_AHEAD_SECONDS
 
-            if self._stop_event.is_set():
-                break
+            # 6) 等待新一期：推送到达立即返回，否则按预计开奖时间自适应轮询
+            last_report = [0.0]
 
-            # 6) 轮询直到获取到新一期
-            print("开始轮询新一期结果...")
-            new_result = None
-            while not self._stop_event.is_set():
-                result = get_latest_result()
-                if result and result['issue'] != state['last_period_issue']:
-                    new_result = result
-                    print(f"新一期结果: 期号={new_result['issue']}, 和值={new_result['sum']}, 时间={new_result.get('time')}")
-                    break
-                else:
+            def on_poll(result):
+                # 密集轮询时每 5 秒最多输出一次
+                if time.time() - last_report[0] >= 5:
+                    last_report[0] = time.time()
                     current_issue = state['last_period_issue'] if not result else result['issue']
-                    print(f"结果未更新 (当前期号 {current_issue})，{POLLING_INTERVAL_SECONDS} 秒后再次查询...")
-                    self._sleep_with_stop(POLLING_INTERVAL_SECONDS)
+                    self.log.info(f"结果未更新 (当前期号 {current_issue})，继续轮询 (累计请求 {RESULT_FEED.polls} 次)...")
 
-            if self._stop_event.is_set():
-                break
+            new_result, detection = await RESULT_FEED.wait_for_new_issue(state['last_period_issue'], expected_at,
+                                                                         on_poll=on_poll, ahead=ahead)
+
+            draw = None
+            try:
+                award_ts = parse_award_time(new_result['time']).timestamp()
+                latency_ms = round((detection['detected_at'] - award_ts) * 1000)
+                draw = self.draw_clock.observe(new_result['issue'], award_ts, detection['detected_at'])
+            except (TypeError, ValueError):
+                award_ts = latency_ms = None
+            self.history.record_draw(new_result['issue'], new_result['sum'], award_ts, detection['detected_at'], detection['via'])
+            if latency_ms is not None:
+                self.metrics.detection_lag.observe(latency_ms / 1000, instance=self.instance_id, via=detection['via'])
+            self.log.info(f"新一期结果: 期号={new_result['issue']}, 和值={new_result['sum']}, 时间={new_result.get('time')} (来源 {detection['via']}, 开奖后 {latency_ms}ms 检测到)",
+                     extra={"issue": new_result['issue'], "sum": new_result['sum'], "via": detection['via'],
+                            "detection_ms": latency_ms})
+            state['last_detection'] = {'issue': new_result['issue'], 'via': detection['via'], 'latency_ms': latency_ms}
+            self._publish("result_detected", issue=new_result['issue'], sum=new_result['sum'],
+                           time=new_result.get('time'), via=detection['via'], latency_ms=latency_ms)
+            if latency_ms is not None:
+                history = state.setdefault('detection_latency_ms', [])
+                history.append(latency_ms)
+                del history[:-DETECTION_HISTORY_SIZE]
 
             # 7) 判定输赢并更新策略状态
-            new_sum = new_result['sum']
-
-            # 大小
-            if config['strategies']['big_small']['enabled']:
-                strategy_state = state['strategies'].setdefault('big_small', {
-                    'current_bet': config['strategies']['big_small']['initial_bet'],
-                    'win_streak': 0
-                })
-                last_bet_was_big = ("大" if (last_sum is not None and last_sum >= 14) else "小") == "大"
-                new_result_was_big = new_sum >= 14
-                if last_bet_was_big == new_result_was_big:
-                    print("策略 [大小]: 胜利")
-                    strategy_state['win_streak'] += 1
-                    if strategy_state['win_streak'] >= config['strategies']['big_small']['max_win_streak']:
-                        strategy_state['win_streak'] = 0
-                        strategy_state['current_bet'] = config['strategies']['big_small']['initial_bet']
-                    else:
-                        strategy_state['current_bet'] *= 2
-                else:
-                    print("策略 [大小]: 失败")
-                    strategy_state['win_streak'] = 0
-                    strategy_state['current_bet'] = config['strategies']['big_small']['initial_bet']
-
-            # 单双
-            if config['strategies']['odd_even']['enabled']:
-                strategy_state = state['strategies'].setdefault('odd_even', {
-                    'current_bet': config['strategies']['odd_even']['initial_bet'],
-                    'win_streak': 0
-                })
-                last_bet_was_even = ("双" if (last_sum is not None and last_sum % 2 == 0) else "单") == "双"
-                new_result_was_even = new_sum % 2 == 0
-                if last_bet_was_even == new_result_was_even:
-                    print("策略 [单双]: 胜利")
-                    strategy_state['win_streak'] += 1
-                    if strategy_state['win_streak'] >= config['strategies']['odd_even']['max_win_streak']:
-                        strategy_state['win_streak'] = 0
-                        strategy_state['current_bet'] = config['strategies']['odd_even']['initial_bet']
-                    else:
-                        strategy_state['current_bet'] *= 2
-                else:
-                    print("策略 [单双]: 失败")
-                    strategy_state['win_streak'] = 0
-                    strategy_state['current_bet'] = config['strategies']['odd_even']['initial_bet']
+            self._settle_round(config, state, decisions, new_result, self._placed(state, bet_issue))
 
             # 8) 更新期号与时间
             state['last_period_issue'] = new_result['issue']
             state['last_period_sum'] = new_result['sum']
             state['last_award_time_str'] = new_result.get('time', state['last_award_time_str'])
-            save_state(state)
+            estimate = self._estimate_next_draw(state)
+            # 立即生成下一轮下注，等待盘口开放时无需再计算
+            decisions = decide_round(config, state)
+            await self._save_state(state, draw=draw)
+            publish_state(state, self.instance_id)
+            self.metrics.rounds.inc(instance=self.instance_id)
+            self.metrics.loop_seconds.observe(time.perf_counter() - iteration_started, instance=self.instance_id)
+
+
+class EngineManager:
+    """
+    在一个进程内托管多个相互隔离的引擎实例（房间），Web API 按实例 ID 访问：
+    - default 实例使用主目录下的 config.json / state.json / history.db（与单实例版本兼容）
+    - 其他实例位于 ROOMS_DIR/<实例ID>/，各自拥有配置、状态、账户池与历史库
+    - 所有实例共享同一个结果源（RESULT_FEED，单次轮询结果分发给所有实例）与发送层（SENDER_POOL），
+      其地址/推送/发送方式取自主配置；第一个实例启动时按主配置设置结果源与跨进程分发，最后一个实例停止时关闭
+    - 所有实例的主循环是同一个事件循环上的任务：Web 面板在 lifespan 中 attach() 自己的事件循环，
+      未 attach 时（例如脚本直接调用 start()）ensure_loop() 启动一个后台事件循环线程
+    """
 
+    ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+
+    def __init__(self, rooms_dir: Path):
+        self.rooms_dir = Path(rooms_dir)
+        self._lock = threading.RLock()
+        self._engines: Dict[str, BotEngine] = {}
+        self._feed_users = 0
+        self.broker: Optional[UnixSocketBroker] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """使用调用方（例如 Web 应用）的事件循环运行引擎。"""
+        with self._lock:
+            self._loop = loop
+
+    def ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
 
-# 提供一个全局引擎单例，便于 Web 面板复用
-ENGINE = BotEngine()
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="Canada28Engines", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def add(self, engine: BotEngine) -> BotEngine:
+        with self._lock:
+            self._engines[engine.instance_id] = engine
+        return engine
+
+    def get(self, instance_id: str) -> BotEngine:
+        """按实例 ID 获取引擎，不存在时抛出 KeyError。"""
+        with self._lock:
+            return self._engines[instance_id]
+
+    def engines(self) -> List[BotEngine]:
+        with self._lock:
+            return list(self._engines.values())
+
+    def discover(self):
+        """加载 ROOMS_DIR 下已有的实例。"""
+        if not self.rooms_dir.is_dir():
+            return
+        for d in sorted(self.rooms_dir.iterdir()):
+            if d.is_dir() and self.ID_PATTERN.match(d.name) and (d / 'config.json').is_file():
+                with self._lock:
+                    if d.name not in self._engines:
+                        self.add(BotEngine(d.name, d))
+
+    def create(self, instance_id: str) -> BotEngine:
+        """新建实例目录并写入默认配置；ID 不合法或已存在时抛出 ValueError。"""
+        if not self.ID_PATTERN.match(instance_id or ""):
+            raise ValueError("实例 ID 只能包含字母、数字、下划线和短横线（最多 32 个字符）")
+        with self._lock:
+            if instance_id in self._engines:
+                raise ValueError(f"实例 [{instance_id}] 已存在")
+            home = self.rooms_dir / instance_id
+            home.mkdir(parents=True, exist_ok=True)
+            engine = BotEngine(instance_id, home)
+            engine.config_store.snapshot()  # 写入默认配置
+            return self.add(engine)
+
+    def acquire_feed(self):
+        """引擎启动时调用：第一个使用者按主配置设置共享的结果源与发送层。"""
+        with self._lock:
+            self._feed_users += 1
+            if self._feed_users > 1:
+                return
+            config = CONFIG.snapshot()
+            SENDER_POOL.use_client = bool(config['sender'].get('use_client', True))
+            SENDER_POOL.configure_limits(config['sender'].get('rate_limit') or {})
+            configure_result_endpoints(config['result_feed'].get('endpoints'))
+            # 配置了推送源时，新期号到达即可唤醒轮询等待
+            try:
+                RESULT_FEED.set_push(make_push_backend(config['result_feed']))
+            except (ValueError, RuntimeError) as e:
+                log.warning(f"推送源配置无效({e})，仅使用轮询。")
+                RESULT_FEED.set_push(None)
+            broker_socket = config['result_feed'].get('broker_socket')
+            if broker_socket:
+                broker = UnixSocketBroker(broker_socket)
+                try:
+                    broker.start()
+                except (OSError, RuntimeError) as e:
+                    log.warning(f"结果分发启动失败({e})，其他进程需自行轮询。")
+                else:
+                    self.broker = broker
+                    RESULT_FEED.subscribe(broker.publish)
+
+    def release_feed(self):
+        with self._lock:
+            self._feed_users = max(0, self._feed_users - 1)
+            if self._feed_users == 0:
+                RESULT_FEED.set_push(None)
+                broker, self.broker = self.broker, None
+                if broker is not None:
+                    RESULT_FEED.unsubscribe(broker.publish)
+                    broker.stop()
+
+    def summary(self) -> List[dict]:
+        return [{"id": e.instance_id, "running": e.is_running} for e in self.engines()]
+
+    def stop_all(self):
+        for engine in self.engines():
+            if engine.is_running:
+                engine.stop()
+
+    async def shutdown(self):
+        """在事件循环中取消所有实例并等待退出（Web 应用关闭时调用）。"""
+        await asyncio.gather(*(engine.astop() for engine in self.engines() if engine.is_running))
+
+
+# 全局配置快照、事件广播、指标、服务器时钟、定时器、结果源、发送层、历史库、默认引擎与实例管理器，便于 Web 面板复用
+CONFIG = ConfigCache(CONFIG_FILE)
+EVENTS = EventHub()
+METRICS = EngineMetrics()
+CLOCK = ClockSync()
+TIMER = PreciseTimer(offset=CLOCK.offset, on_wake=METRICS.wake_jitter.observe)
+RESULT_FEED = ResultFeed(
+    HedgedResultSource([HttpResultSource(API_URL, on_fetch=METRICS.observe_fetch, clock=CLOCK)]),
+    scheduler=AdaptivePollScheduler(
+        fast_interval=FAST_POLLING_INTERVAL_SECONDS,
+        max_interval=MAX_POLLING_INTERVAL_SECONDS,
+        ahead=POLL_AHEAD_SECONDS,
+        fallback_interval=POLLING_INTERVAL_SECONDS,
+    ),
+    clock=TIMER.now,
+)
+SENDER_POOL = SenderPool(SESSION_DIR, on_result=METRICS.observe_send, timer=TIMER)
+HISTORY = HistoryStore(HISTORY_DB_FILE)
+ENGINE = BotEngine(DEFAULT_INSTANCE, HOME_DIR, CONFIG, HISTORY)
+MANAGER = EngineManager(ROOMS_DIR)
+MANAGER.add(ENGINE)
+MANAGER.discover()
 
 
 def main():
@@ -469,6 +1009,7 @@ def main():
     - 直接前台运行引擎（Ctrl+C 退出）。
     """
     cfg = load_config()
+    setup_logging(LOG_DIR, cfg['logging'])
     print("\n配置加载成功:")
     for name, strategy_config in cfg['strategies'].items():
         status = "已启用" if strategy_config.get('enabled') else "已禁用"
@@ -476,14 +1017,23 @@ def main():
     if cfg.get("accounts"):
         print(f"  - 账户池数量: {len(cfg['accounts'])}")
 
-    try:
+    async def run():
+        MANAGER.attach(asyncio.get_running_loop())
         ENGINE.start()
-        while ENGINE.is_running:
-            time.sleep(1)
+        try:
+            while ENGINE.is_running:
+                await asyncio.sleep(1)
+        finally:
+            # Ctrl+C 时 asyncio.run 会取消本协程，这里取消并等待引擎任务
+            await MANAGER.shutdown()
+
+    try:
+        asyncio.run(run())
     except KeyboardInterrupt:
         print("\n检测到 Ctrl+C，正在停止...")
     finally:
-        ENGINE.stop()
+        SENDER_POOL.close()
+        HISTORY.flush()
         print("程序已退出。")
 
 
@@ -0,0 +1,265 @@
+"""
+开奖/下注历史库：SQLite（WAL 模式）追加写入，按期号与时间建索引。
+- record_draw / record_bet / record_settlement: 仅放入内存队列，由后台线程批量写入，不阻塞下注循环；期号不是数字的记录跳过
+- draws() / bets() / stats(): 按期号或时间范围查询与汇总（每次查询使用独立的只读连接）
+"""
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from bot_logging import get_logger
+
+log = get_logger("history")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS draws (
+    issue       INTEGER PRIMARY KEY,
+    sum         INTEGER NOT NULL,
+    award_ts    REAL,
+    detected_ts REAL,
+    via         TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_draws_award_ts ON draws(award_ts);
+
+CREATE TABLE IF NOT EXISTS bets (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    issue      INTEGER,
+    strategy   TEXT,
+    text       TEXT NOT NULL,
+    amount     INTEGER,
+    alias      TEXT,
+    status     TEXT,
+    latency_ms REAL,
+    skew_ms    REAL,
+    ts         REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bets_issue ON bets(issue);
+CREATE INDEX IF NOT EXISTS idx_bets_ts ON bets(ts);
+
+CREATE TABLE IF NOT EXISTS settlements (
+    issue    INTEGER NOT NULL,
+    strategy TEXT NOT NULL,
+    amount   INTEGER,
+    won      INTEGER NOT NULL,
+    ts       REAL NOT NULL,
+    placed   INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (issue, strategy)
+);
+CREATE INDEX IF NOT EXISTS idx_settlements_ts ON settlements(ts);
+"""
+
+# 旧库升级：(表, 列, 类型)
+_MIGRATIONS = [
+    ("bets", "skew_ms", "REAL"),
+    ("settlements", "placed", "INTEGER NOT NULL DEFAULT 1"),
+]
+
+_INSERT = {
+    "draw": "INSERT OR REPLACE INTO draws (issue, sum, award_ts, detected_ts, via) VALUES (?, ?, ?, ?, ?)",
+    "bet": "INSERT INTO bets (issue, strategy, text, amount, alias, status, latency_ms, skew_ms, ts) "
+           "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    "settlement": "INSERT OR REPLACE INTO settlements (issue, strategy, amount, won, ts, placed) VALUES (?, ?, ?, ?, ?, ?)",
+}
+
+
+def issue_key(issue) -> Optional[int]:
+    """期号统一按整数存储，便于范围查询。"""
+    try:
+        return int(issue)
+    except (TypeError, ValueError):
+        return None
+
+
+class HistoryStore:
+    """
+    追加写入的历史库。写入在后台线程中按批提交（每 flush_interval 秒或积累 batch_size 条），
+    进程异常退出最多丢失最近一批记录。
+    """
+
+    def __init__(self, path: Path, flush_interval: float = 0.5, batch_size: int = 200):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.dropped = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_schema(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            conn = self._connect()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                for table, column, kind in _MIGRATIONS:
+                    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._writer, name="HistoryWriter", daemon=True)
+                self._thread.start()
+
+    def _put(self, kind: str, row: tuple):
+        self._ensure_writer()
+        self._queue.put((kind, row))
+
+    @staticmethod
+    def _issue(issue, kind: str) -> Optional[int]:
+        key = issue_key(issue)
+        if key is None:
+            log.warning(f"期号 {issue!r} 不是数字，不写入{kind}记录。")
+        return key
+
+    # --- 写入（非阻塞） ---
+    def record_draw(self, issue, total: int, award_ts: Optional[float] = None,
+                    detected_ts: Optional[float] = None, via: Optional[str] = None):
+        key = self._issue(issue, "开奖")
+        if key is not None:
+            self._put("draw", (key, total, award_ts, detected_ts, via))
+
+    def record_bet(self, issue, strategy: Optional[str], text: str, amount: Optional[int], alias: Optional[str],
+                   status: str, latency_ms: Optional[float] = None, ts: Optional[float] = None,
+                   skew_ms: Optional[float] = None):
+        key = self._issue(issue, "下注")
+        if key is not None:
+            self._put("bet", (key, strategy, text, amount, alias, status, latency_ms, skew_ms, ts or time.time()))
+
+    def record_settlement(self, issue, strategy: str, amount: int, won: bool, ts: Optional[float] = None,
+                          placed: bool = True):
+        """placed=False 表示本注未实际发出（无账户、已封盘、发送失败），策略仍按虚拟结果推进，但不计入盈亏。"""
+        key = self._issue(issue, "结算")
+        if key is not None:
+            self._put("settlement", (key, strategy, amount, int(bool(won)), ts or time.time(), int(bool(placed))))
+
+    def flush(self, timeout: float = 5) -> bool:
+        """等待队列中已有的记录写入磁盘。"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def _writer(self):
+        self._ensure_schema()
+        conn = self._connect()
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and item[0] != "flush":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+            waiters = []
+            try:
+                with conn:
+                    for kind, row in batch:
+                        if kind == "flush":
+                            waiters.append(row)
+                        else:
+                            conn.execute(_INSERT[kind], row)
+            except sqlite3.Error as e:
+                self.dropped += len(batch) - len(waiters)
+                log.warning(f"写入历史库失败({e})，丢弃 {len(batch) - len(waiters)} 条记录。")
+            for done in waiters:
+                done.set()
+
+    # --- 查询 ---
+    @staticmethod
+    def _range(column: str, low, high, clauses: List[str], params: List[Any]):
+        if low is not None:
+            clauses.append(f"{column} >= ?")
+            params.append(low)
+        if high is not None:
+            clauses.append(f"{column} <= ?")
+            params.append(high)
+
+    def _query(self, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        self._ensure_schema()
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def draws(self, since_ts: Optional[float] = None, until_ts: Optional[float] = None,
+              from_issue=None, to_issue=None, limit: int = 500) -> List[Dict[str, Any]]:
+        """按时间或期号范围查询开奖记录（按期号倒序）。"""
+        clauses, params = [], []
+        self._range("award_ts", since_ts, until_ts, clauses, params)
+        self._range("issue", issue_key(from_issue), issue_key(to_issue), clauses, params)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT * FROM draws {where} ORDER BY issue DESC LIMIT ?", params + [limit])
+
+    def bets(self, since_ts: Optional[float] = None, until_ts: Optional[float] = None,
+             issue=None, limit: int = 500) -> List[Dict[str, Any]]:
+        """按时间范围或期号查询下注记录（按时间倒序）。"""
+        clauses, params = [], []
+        self._range("ts", since_ts, until_ts, clauses, params)
+        if issue is not None:
+            clauses.append("issue = ?")
+            params.append(issue_key(issue))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT * FROM bets {where} ORDER BY ts DESC LIMIT ?", params + [limit])
+
+    def sums(self, since_ts: Optional[float] = None, until_ts: Optional[float] = None) -> List[int]:
+        """时间范围内按期号正序的和值序列（用于回测等离线分析）。"""
+        clauses, params = [], []
+        self._range("award_ts", since_ts, until_ts, clauses, params)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return [r["sum"] for r in self._query(f"SELECT sum FROM draws {where} ORDER BY issue", params)]
+
+    def stats(self, since_ts: Optional[float] = None, until_ts: Optional[float] = None) -> Dict[str, Any]:
+        """时间范围内的汇总：开奖大小/单双分布、下注状态计数、各策略胜负与盈亏（按 1:1 赔率估算，只计实际发出的注单）。"""
+        clauses, params = [], []
+        self._range("award_ts", since_ts, until_ts, clauses, params)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        draws = self._query(
+            f"SELECT COUNT(*) AS count, SUM(sum >= 14) AS big, SUM(sum % 2 = 1) AS odd, AVG(sum) AS avg_sum, "
+            f"MIN(issue) AS first_issue, MAX(issue) AS last_issue FROM draws {where}", params)[0]
+
+        clauses, params = [], []
+        self._range("ts", since_ts, until_ts, clauses, params)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        bet_status = {r["status"]: r["count"] for r in self._query(
+            f"SELECT status, COUNT(*) AS count FROM bets {where} GROUP BY status", params)}
+        latency = self._query(f"SELECT AVG(latency_ms) AS avg_latency_ms, AVG(skew_ms) AS avg_skew_ms, "
+                              f"MAX(skew_ms) AS max_skew_ms FROM bets {where}", params)[0]
+        strategies = {r["strategy"]: r for r in self._query(
+            f"SELECT strategy, SUM(placed) AS rounds, SUM(won AND placed) AS wins, "
+            f"SUM(CASE WHEN NOT placed THEN 0 WHEN won THEN amount ELSE -amount END) AS net, "
+            f"MAX(CASE WHEN placed THEN amount END) AS max_amount, SUM(NOT placed) AS unplaced "
+            f"FROM settlements {where} GROUP BY strategy", params)}
+        for r in strategies.values():
+            r.pop("strategy", None)
+        return {
+            "draws": draws,
+            "bets": {"by_status": bet_status, **latency},
+            "strategies": strategies,
+        }
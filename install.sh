@@ -14,7 +14,7 @@ REPO_BASE_URL="https://raw.githubusercontent.com/paopaoandlingyia/install/main"
 # 将文件直接安装到用户主目录
 INSTALL_DIR="$HOME"
 # 新增 web/app.py 以提供 Web 面板
-FILES_TO_DOWNLOAD=("run.sh" "canada28_bot.py" "web/app.py")
+FILES_TO_DOWNLOAD=("run.sh" "canada28_bot.py" "backtest.py" "bot_logging.py" "history_store.py" "jobs.py" "result_feed.py" "signer_directory.py" "strategies.py" "state_journal.py" "telemetry.py" "tg_sender.py" "timing.py" "web/app.py")
 
 # --- 颜色定义 ---
 C_RESET='\033[0m'
@@ -125,13 +125,13 @@ else
 fi
 
 # 5. 安装Python库
-print_info "正在使用 pip 安装必要的 Python 库 (tg-signer, requests, fastapi, uvicorn)..."
+print_info "正在使用 pip 安装必要的 Python 库 (tg-signer, requests, numpy, fastapi, uvicorn)..."
 if [ -z "$PYTHON_CMD" ]; then
     print_error "未能确定要使用的 Python 命令，无法安装库。脚本无法继续。"
     exit 1
 fi
 
-if ! "$PYTHON_CMD" -m pip install -U tg-signer requests fastapi "uvicorn[standard]"; then
+if ! "$PYTHON_CMD" -m pip install -U tg-signer requests numpy fastapi "uvicorn[standard]"; then
     print_error "使用 pip 安装库失败。请检查pip配置和网络连接。"
     exit 1
 fi
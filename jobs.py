@@ -0,0 +1,197 @@
+"""
+后台任务：耗时操作（停止引擎、批量刷新对话等）以带 ID 的任务执行，Web 请求立即返回任务 ID，之后按 ID 查询状态。
+
+- 同步函数在独立的有界线程池中执行，不占用 Web 框架的默认线程池，/api/state 等快速接口不受影响
+- 协程在调用方的事件循环中作为任务运行，不占用线程
+- 同一 key 的任务进行中时再次提交直接返回已有任务（例如重复点击“停止”）
+- 排队与运行中的任务超过 max_pending 时拒绝提交（JobQueueFull）
+- 保留最近 history 个已结束任务供查询
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bot_logging import get_logger
+
+log = get_logger("jobs")
+
+ACTIVE = ("pending", "running")
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    """单个后台任务；progress 为可选的回调，查询时返回当前进度。"""
+
+    def __init__(self, job_id: str, kind: str, key: Optional[str] = None,
+                 progress: Optional[Callable[[], Any]] = None):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.progress = progress
+        self.status = "pending"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.handle = None  # concurrent Future 或 asyncio.Task，用于取消
+
+    @property
+    def done(self) -> bool:
+        return self.status not in ACTIVE
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+        if self.progress is not None and not self.done:
+            try:
+                data["progress"] = self.progress()
+            except Exception as e:
+                data["progress"] = {"error": str(e)}
+        return data
+
+
+class JobManager:
+    """任务登记与执行：submit() 用于同步函数，submit_async() 用于协程。"""
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 32, history: int = 200):
+        self.max_pending = max_pending
+        self.history = history
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Job")
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.submitted = 0
+        self.rejected = 0
+
+    def _new(self, kind: str, key: Optional[str], progress) -> Tuple[Job, bool]:
+        """创建任务；同 key 的任务仍在进行时返回 (已有任务, False)。"""
+        with self._lock:
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and not job.done:
+                        return job, False
+            if sum(1 for j in self._jobs.values() if not j.done) >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(f"后台任务过多（{self.max_pending}），请稍后再试")
+            job = Job(f"{kind}-{next(self._ids)}", kind, key, progress)
+            self._jobs[job.id] = job
+            self.submitted += 1
+            self._trim()
+            return job, True
+
+    def _trim(self):
+        finished = [j.id for j in self._jobs.values() if j.done]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _start(job: Job) -> bool:
+        if job.status != "pending":
+            return False
+        job.status, job.started_at = "running", time.time()
+        return True
+
+    @staticmethod
+    def _finish(job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        job.status, job.result, job.error, job.finished_at = status, result, error, time.time()
+        if status == "failed":
+            log.warning(f"后台任务 {job.id} 失败: {error}", extra={"job": job.id, "kind": job.kind})
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, key: Optional[str] = None,
+               progress: Optional[Callable[[], Any]] = None, **kwargs) -> Job:
+        """在任务线程池中执行同步函数。"""
+        job, created = self._new(kind, key, progress)
+        if not created:
+            return job
+
+        def run():
+            if not self._start(job):
+                return
+            try:
+                self._finish(job, "succeeded", fn(*args, **kwargs))
+            except Exception as e:
+                self._finish(job, "failed", error=f"{type(e).__name__}: {e}")
+
+        job.handle = self.executor.submit(run)
+        return job
+
+    def submit_async(self, kind: str, coro_fn: Callable[[], Awaitable[Any]], key: Optional[str] = None,
+                     progress: Optional[Callable[[], Any]] = None,
+                     loop: Optional[asyncio.AbstractEventLoop] = None) -> Job:
+        """在事件循环中运行协程任务（默认当前运行的事件循环，可在其他线程中指定 loop）。"""
+        job, created = self._new(kind, key, progress)
+        if not created:
+            return job
+
+        async def run():
+            self._start(job)
+            try:
+                self._finish(job, "succeeded", await coro_fn())
+            except asyncio.CancelledError:
+                self._finish(job, "cancelled")
+                raise
+            except Exception as e:
+                self._finish(job, "failed", error=f"{type(e).__name__}: {e}")
+
+        if loop is None:
+            job.handle = asyncio.get_running_loop().create_task(run(), name=job.id)
+        else:
+            job.handle = asyncio.run_coroutine_threadsafe(run(), loop)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs[job_id]
+
+    def list(self, kind: Optional[str] = None, active_only: bool = False) -> List[Job]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j for j in reversed(jobs) if (kind is None or j.kind == kind) and (not active_only or not j.done)]
+
+    def cancel(self, job_id: str) -> bool:
+        """取消尚未开始的同步任务或任意协程任务；已在线程中运行的同步任务无法中断。"""
+        job = self.get(job_id)
+        handle = job.handle
+        if job.done or handle is None:
+            return False
+        if isinstance(handle, Future) and job.status == "pending":
+            if handle.cancel():
+                self._finish(job, "cancelled")
+                return True
+            return False
+        if isinstance(handle, asyncio.Task):
+            handle.get_loop().call_soon_threadsafe(handle.cancel)
+            return True
+        if isinstance(handle, Future):
+            return handle.cancel()
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"submitted": self.submitted, "rejected": self.rejected, "by_status": counts}
+
+    def shutdown(self, wait: bool = True):
+        for job in self.list(active_only=True):
+            if isinstance(job.handle, asyncio.Task):
+                job.handle.cancel()
+        self.executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,893 @@
+"""
+开奖结果获取层：
+- ResultSource: 拉取式结果源（HttpResultSource 通过常驻连接池请求 API，支持条件请求；
+  HedgedResultSource 在多个 API 地址间发送对冲请求并交叉校验结果）
+- PushBackend: 推送式结果源（SSE / WebSocket / Unix socket / 进程内 LocalPushBackend），新期号到达即唤醒等待方
+- AdaptivePollScheduler: 按预计开奖时刻调整轮询间隔（开奖前后密集轮询，远离时退避）
+- ResultFeed: 组合以上两者，协程 wait_for_new_issue() 返回新一期结果及其检测时间与来源；
+  同一进程内的多个引擎共享一次轮询，新期号同时唤醒所有等待方，并回调 subscribe() 注册的订阅者
+- UnixSocketBroker: 把 ResultFeed 检测到的新期号转发给本机其他进程（对方以 push_type=unix 订阅），
+  多个进程只需一个进程请求 API
+"""
+import asyncio
+import email.utils
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bot_logging import get_logger
+from timing import ClockSync
+
+try:
+    import websocket  # websocket-client，可选
+except ImportError:
+    websocket = None
+
+log = get_logger("feed")
+
+
+def is_valid_result(data) -> bool:
+    return isinstance(data, dict) and 'issue' in data and 'sum' in data and 'time' in data
+
+
+def is_newer_issue(issue, than) -> bool:
+    """issue 是否比 than 新；期号不是数字时只要不同即视为更新。"""
+    if than is None:
+        return True
+    try:
+        return int(issue) > int(than)
+    except (TypeError, ValueError):
+        return issue != than
+
+
+def issue_order(issue) -> tuple:
+    """期号排序键：按数值比较；非数字期号排在所有数字期号之前，不会在投票中胜出。"""
+    try:
+        return 1, int(issue)
+    except (TypeError, ValueError):
+        return 0, str(issue)
+
+
+class ResultSource:
+    """拉取式结果源：fetch() 返回 {'issue', 'sum', 'time', ...} 或 None。"""
+
+    name = "source"
+
+    def fetch(self) -> Optional[dict]:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+    def close(self):
+        """释放连接等资源（被替换的结果源在切换后关闭）。"""
+
+
+class LatencyWindow:
+    """最近 size 个耗时样本（秒）的滚动窗口。"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def summary_ms(self) -> dict:
+        def ms(v):
+            return None if v is None else round(v * 1000, 1)
+        return {"samples": len(self), "p50_ms": ms(self.percentile(0.5)), "p95_ms": ms(self.percentile(0.95))}
+
+
+class HttpResultSource(ResultSource):
+    """
+    通过常驻 requests.Session 请求 API：
+    - 复用 keep-alive 连接，避免每次轮询重新建立 TCP 连接
+    - 连接/读取超时分开设置
+    - 服务端返回 ETag / Last-Modified 时发送条件请求，304 时直接复用上次结果
+    - 传入 clock（ClockSync）时，用每个响应的 Date 头与收发时刻校准服务器时钟偏差
+    - stats(): 请求数、304 数、错误数、新建/复用连接数与耗时分位
+    """
+
+    name = "http"
+
+    def __init__(self, url: str, connect_timeout: float = 3.05, read_timeout: float = 5, pool_maxsize: int = 4,
+                 on_fetch: Optional[Callable[[str, float, bool], None]] = None, clock: Optional[ClockSync] = None):
+        self.url = url
+        self.on_fetch = on_fetch  # 每次请求结束后回调 (url, 耗时秒, 是否成功)，用于指标
+        self.clock = clock
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._adapter = adapter
+        self._lock = threading.Lock()
+        self._validators = {}
+        self._last_data: Optional[dict] = None
+        self.latency = LatencyWindow()
+        self.requests = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def _conditional_headers(self) -> dict:
+        with self._lock:
+            headers = {}
+            if self._last_data is not None:
+                if "etag" in self._validators:
+                    headers["If-None-Match"] = self._validators["etag"]
+                if "last_modified" in self._validators:
+                    headers["If-Modified-Since"] = self._validators["last_modified"]
+            return headers
+
+    def fetch(self) -> Optional[dict]:
+        """从API获取最新的开奖结果。"""
+        started = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+        try:
+            sent_at = time.time()
+            response = self.session.get(self.url, timeout=self.timeout, headers=self._conditional_headers())
+            self.latency.add(time.perf_counter() - started)
+            self._calibrate(sent_at, time.time(), response.headers.get("Date"))
+            if response.status_code == 304:
+                with self._lock:
+                    self.not_modified += 1
+                    data = self._last_data
+                self._report(started, True)
+                return data
+            response.raise_for_status()
+            data = response.json()
+            if is_valid_result(data):
+                self._report(started, True)
+                with self._lock:
+                    self._last_data = data
+                    self._validators = {}
+                    if response.headers.get("ETag"):
+                        self._validators["etag"] = response.headers["ETag"]
+                    if response.headers.get("Last-Modified"):
+                        self._validators["last_modified"] = response.headers["Last-Modified"]
+                return data
+            else:
+                log.warning(f"API返回的数据格式不正确，缺少 'issue', 'sum' 或 'time'。返回: {response.text}")
+        except requests.exceptions.RequestException as e:
+            log.error(f"请求API失败: {e}")
+        except json.JSONDecodeError:
+            log.error(f"解析API返回的JSON失败。")
+        with self._lock:
+            self.errors += 1
+        self._report(started, False)
+        return None
+
+    def _calibrate(self, sent_at: float, received_at: float, date_header: Optional[str]):
+        if self.clock is None or not date_header:
+            return
+        try:
+            server_ts = email.utils.parsedate_to_datetime(date_header).timestamp()
+        except (TypeError, ValueError):
+            return
+        self.clock.observe(sent_at, received_at, server_ts)
+
+    def _report(self, started: float, ok: bool):
+        if self.on_fetch is not None:
+            self.on_fetch(self.url, time.perf_counter() - started, ok)
+
+    def close(self):
+        self.session.close()
+
+    def stats(self) -> dict:
+        try:
+            # urllib3 连接池记录了新建连接数与经其发出的请求数，差值即复用次数
+            pools = self._adapter.poolmanager.pools
+            opened = served = 0
+            for key in pools.keys():
+                pool = pools[key]
+                opened += pool.num_connections
+                served += pool.num_requests
+        except Exception:
+            opened, served = None, None
+        with self._lock:
+            result = {
+                "url": self.url,
+                "requests": self.requests,
+                "not_modified": self.not_modified,
+                "errors": self.errors,
+                "connections_opened": opened,
+                "connections_reused": None if opened is None else max(0, served - opened),
+            }
+        result.update(self.latency.summary_ms())
+        return result
+
+
+class HedgedResultSource(ResultSource):
+    """
+    多地址对冲请求：
+    - 按各地址的历史 p95 耗时排序（尚无样本的地址优先尝试一次，以便积累耗时数据）
+    - 先请求最快的地址，若在其 p95 耗时内未返回则再向下一个地址发请求，取最先返回的有效结果
+    - 交叉校验：同一期号在不同地址的和值不一致时放弃本次结果；下次查询同时请求所有地址，
+      多数一致后才采用
+    """
+
+    name = "hedged"
+
+    def __init__(self, sources: List[HttpResultSource], min_hedge_delay: float = 0.05,
+                 default_hedge_delay: float = 0.5, min_samples: int = 5):
+        if not sources:
+            raise ValueError("至少需要一个结果地址")
+        self.sources = list(sources)
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.sources), thread_name_prefix="result-fetch")
+        self._lock = threading.Lock()
+        self._last_seen: Dict[str, tuple] = {}  # url -> (issue, sum)
+        self._outliers: Dict[str, object] = {}   # url -> 多数表决中被否决的期号，该期内不再参与校验
+        self._verify = False  # 出现不一致后，下次查询需全部地址一致
+        self._closed = False
+        self.hedges = 0
+        self.conflicts = 0
+        self.wins: Dict[str, int] = {}
+
+    @property
+    def urls(self) -> List[str]:
+        return [src.url for src in self.sources]
+
+    def ranked(self) -> List[HttpResultSource]:
+        def key(src):
+            p95 = src.latency.percentile(0.95)
+            return 0.0 if p95 is None else p95
+        return sorted(self.sources, key=key)
+
+    def hedge_delay(self, src: HttpResultSource) -> float:
+        if len(src.latency) < self.min_samples:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, src.latency.percentile(0.95))
+
+    def _remember(self, src: HttpResultSource, result: Optional[dict]):
+        if result:
+            with self._lock:
+                self._last_seen[src.url] = (result['issue'], result['sum'])
+
+    def _conflicts_with(self, src: HttpResultSource, result: dict) -> Optional[str]:
+        with self._lock:
+            for url, (issue, total) in self._last_seen.items():
+                if self._outliers.get(url) == issue:
+                    continue
+                if url != src.url and issue == result['issue'] and total != result['sum']:
+                    return url
+        return None
+
+    def _submit(self, src: HttpResultSource) -> Optional[Future]:
+        try:
+            return self._executor.submit(src.fetch)
+        except RuntimeError:  # 已关闭（切换地址时仍在进行的查询）
+            return None
+
+    def fetch(self) -> Optional[dict]:
+        if self._closed:
+            return None
+        order = self.ranked()
+        if len(order) == 1:
+            result = order[0].fetch()
+            self._remember(order[0], result)
+            return result
+        if self._verify:
+            return self._fetch_all(order)
+
+        pending: Dict = {}
+
+        def fire(src):
+            future = self._submit(src)
+            if future is None:
+                return
+            # 即使对冲请求晚于胜出者返回，也记录其结果用于后续交叉校验
+            future.add_done_callback(lambda f, src=src: self._remember(src, f.result()))
+            pending[future] = src
+
+        fire(order[0])
+        next_idx = 1
+        while pending:
+            delay = self.hedge_delay(pending[next(iter(pending))]) if next_idx < len(order) else None
+            done, _ = wait(list(pending), timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # 当前请求超过 p95 仍未返回：对下一个地址发出对冲请求
+                with self._lock:
+                    self.hedges += 1
+                fire(order[next_idx])
+                next_idx += 1
+                continue
+            for future in done:
+                src = pending.pop(future)
+                result = future.result()
+                if not result:
+                    continue
+                conflict_url = self._conflicts_with(src, result)
+                if conflict_url:
+                    with self._lock:
+                        self.conflicts += 1
+                        self._verify = True
+                    log.warning(f"期号 {result['issue']} 的和值在 {src.url} 与 {conflict_url} 不一致，放弃本次结果。")
+                    return None
+                with self._lock:
+                    self.wins[src.url] = self.wins.get(src.url, 0) + 1
+                return result
+            if not pending and next_idx < len(order):
+                # 已发出的请求均失败，立即尝试下一个地址
+                fire(order[next_idx])
+                next_idx += 1
+        return None
+
+    def _fetch_all(self, order: List[HttpResultSource]) -> Optional[dict]:
+        """同时请求所有地址，最新期号的和值在返回的地址中过半一致时才返回。"""
+        futures = [(src, self._submit(src)) for src in order]
+        results = []
+        for src, future in futures:
+            if future is None:
+                continue
+            result = future.result()
+            self._remember(src, result)
+            if result:
+                results.append((src, result))
+        if not results:
+            return None
+        latest = max((r['issue'] for _, r in results), key=issue_order)
+        votes: Dict = {}
+        for _, r in results:
+            if r['issue'] == latest:
+                votes.setdefault(r['sum'], []).append(r)
+        best_sum, best = max(votes.items(), key=lambda kv: len(kv[1]))
+        if len(votes) > 1 and len(best) * 2 <= sum(len(v) for v in votes.values()):
+            with self._lock:
+                self.conflicts += 1
+            log.warning(f"期号 {latest} 的和值在各地址间仍不一致 {sorted(votes)}，放弃本次结果。")
+            return None
+        with self._lock:
+            self._verify = False
+            for src, r in results:
+                if r['issue'] == latest and r['sum'] != best_sum:
+                    self._outliers[src.url] = latest
+        return best[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            summary = {"hedges": self.hedges, "conflicts": self.conflicts}
+            wins = dict(self.wins)
+        summary["endpoints"] = [dict(src.stats(), wins=wins.get(src.url, 0)) for src in self.ranked()]
+        return summary
+
+    def close(self):
+        """停止对冲线程池并关闭各地址的连接；正在进行的请求照常完成。"""
+        self._closed = True
+        self._executor.shutdown(wait=False)
+        for src in self.sources:
+            src.close()
+
+
+class PushBackend:
+    """推送式结果源：start(on_result) 后在收到新结果时回调 on_result(result)。"""
+
+    name = "push"
+
+    def __init__(self):
+        self._on_result: Optional[Callable[[dict], None]] = None
+
+    @property
+    def connected(self) -> bool:
+        return False
+
+    def start(self, on_result: Callable[[dict], None]):
+        self._on_result = on_result
+
+    def stop(self):
+        self._on_result = None
+
+    def _emit(self, data):
+        if self._on_result and is_valid_result(data):
+            self._on_result(data)
+
+
+class LocalPushBackend(PushBackend):
+    """进程内替身：由其他组件（或测试）调用 publish() 推送结果。"""
+
+    name = "local"
+
+    @property
+    def connected(self) -> bool:
+        return self._on_result is not None
+
+    def publish(self, result: dict):
+        self._emit(result)
+
+
+class _StreamPushBackend(PushBackend):
+    """在后台线程中保持长连接，断线后指数退避重连。"""
+
+    def __init__(self, url: str, max_backoff: float = 30):
+        super().__init__()
+        self.url = url
+        self.max_backoff = max_backoff
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._connected = False
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def start(self, on_result: Callable[[dict], None]):
+        super().start(on_result)
+        # 每次启动使用新的停止事件，避免旧线程在重启后继续运行
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop_event,),
+                                        name=f"ResultPush-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._close()
+        super().stop()
+
+    def _run(self, stop_event: threading.Event):
+        backoff = 1.0
+        while not stop_event.is_set():
+            try:
+                self._stream(stop_event)
+                backoff = 1.0
+            except Exception as e:
+                if not stop_event.is_set():
+                    log.warning(f"推送源[{self.name}] 连接中断: {e}，{backoff:.0f} 秒后重连...")
+            finally:
+                self._connected = False
+            stop_event.wait(backoff)
+            backoff = min(self.max_backoff, backoff * 2)
+
+    def _stream(self, stop_event: threading.Event):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class SSEPushBackend(_StreamPushBackend):
+    """Server-Sent Events：每个事件的 data 为一条结果 JSON。"""
+
+    name = "sse"
+
+    def __init__(self, url: str, max_backoff: float = 30):
+        super().__init__(url, max_backoff)
+        self._response = None
+
+    def _stream(self, stop_event: threading.Event):
+        with requests.get(self.url, stream=True, timeout=(5, None),
+                          headers={"Accept": "text/event-stream"}) as response:
+            response.raise_for_status()
+            self._response = response
+            self._connected = True
+            data_lines = []
+            for line in response.iter_lines(decode_unicode=True):
+                if stop_event.is_set():
+                    break
+                if line:
+                    if line.startswith("data:"):
+                        data_lines.append(line[5:].strip())
+                    continue
+                # 空行表示一个事件结束
+                if data_lines:
+                    try:
+                        self._emit(json.loads("\n".join(data_lines)))
+                    except json.JSONDecodeError:
+                        log.warning(f"推送源[sse] 无法解析事件: {data_lines}")
+                    data_lines = []
+
+    def _close(self):
+        response, self._response = self._response, None
+        if response is not None:
+            response.close()
+
+
+class WebSocketPushBackend(_StreamPushBackend):
+    """WebSocket：每条文本消息为一条结果 JSON（需要安装 websocket-client）。"""
+
+    name = "websocket"
+
+    def __init__(self, url: str, max_backoff: float = 30):
+        if websocket is None:
+            raise RuntimeError("WebSocket 推送需要安装 websocket-client")
+        super().__init__(url, max_backoff)
+        self._ws = None
+
+    def _stream(self, stop_event: threading.Event):
+        self._ws = websocket.create_connection(self.url, timeout=30)
+        self._connected = True
+        try:
+            while not stop_event.is_set():
+                try:
+                    message = self._ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    continue
+                if not message:
+                    break
+                try:
+                    self._emit(json.loads(message))
+                except json.JSONDecodeError:
+                    log.warning(f"推送源[websocket] 无法解析消息: {message!r}")
+        finally:
+            self._close()
+
+    def _close(self):
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+
+class UnixSocketPushBackend(_StreamPushBackend):
+    """订阅本机 UnixSocketBroker：每行一条结果 JSON，push_url 为 socket 路径。"""
+
+    name = "unix"
+
+    def __init__(self, path: str, max_backoff: float = 30):
+        super().__init__(path, max_backoff)
+        self._sock: Optional[socket.socket] = None
+
+    def _stream(self, stop_event: threading.Event):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.url)
+        self._sock = sock
+        self._connected = True
+        try:
+            for line in sock.makefile("r", encoding="utf-8"):
+                if stop_event.is_set():
+                    break
+                try:
+                    self._emit(json.loads(line))
+                except json.JSONDecodeError:
+                    log.warning(f"推送源[unix] 无法解析消息: {line!r}")
+        finally:
+            self._close()
+
+    def _close(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+def make_push_backend(cfg: dict) -> Optional[PushBackend]:
+    """按配置 result_feed.push_type / push_url 创建推送源；未配置时返回 None（仅轮询）。"""
+    push_type = (cfg.get("push_type") or "").lower()
+    url = cfg.get("push_url") or ""
+    if push_type == "local":
+        return LocalPushBackend()
+    if not url:
+        return None
+    if push_type in ("", "sse"):
+        return SSEPushBackend(url)
+    if push_type == "websocket":
+        return WebSocketPushBackend(url)
+    if push_type == "unix":
+        return UnixSocketPushBackend(url)
+    raise ValueError(f"未知的推送类型: {push_type}")
+
+
+class AdaptivePollScheduler:
+    """
+    按预计开奖时刻计算下一次轮询的等待时间：
+    - 距离预计时刻 ahead 秒以外：不轮询，直接等到窗口开始（期间仍可被推送唤醒）
+    - 窗口内（预计时刻前 ahead 秒 ~ 后 window 秒）：按 fast_interval 密集轮询
+    - 超过窗口仍未开奖：按 backoff 倍数逐步放宽，最长 max_interval
+    - 推送源在线时轮询仅作兜底，间隔不小于 push_interval
+    """
+
+    def __init__(self, fast_interval: float = 0.3, max_interval: float = 5.0, ahead: float = 10.0,
+                 window: float = 20.0, backoff: float = 1.5, push_interval: float = 2.0,
+                 fallback_interval: float = 2.0):
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.ahead = ahead
+        self.window = window
+        self.backoff = backoff
+        self.push_interval = push_interval
+        self.fallback_interval = fallback_interval
+
+    def next_delay(self, now: float, expected_at: Optional[float], push_connected: bool = False,
+                   ahead: Optional[float] = None) -> float:
+        ahead = self.ahead if ahead is None else ahead
+        if expected_at is None:
+            delay = self.fallback_interval
+        elif now < expected_at - ahead:
+            return expected_at - ahead - now
+        elif now <= expected_at + self.window:
+            delay = self.fast_interval
+        else:
+            overdue = now - expected_at - self.window
+            delay = min(self.max_interval, self.fast_interval * self.backoff ** (1 + overdue / self.max_interval))
+        if push_connected:
+            delay = max(delay, self.push_interval)
+        return delay
+
+
+class ResultFeed:
+    """
+    组合拉取与推送，供同一进程内的所有引擎共享：
+    - await wait_for_new_issue(last_issue, expected_at): 直到出现新期号才返回 (结果, 检测信息)；停止引擎即取消该协程
+    - poll(): 单飞请求——已有线程在请求时等待其结果，距上次请求不足 min_poll_gap 秒时直接复用，
+      N 个引擎同时等待时 API 请求量与单个引擎相同；poll_async() 在有界线程池中执行 poll()，不阻塞事件循环
+    - 任一途径（轮询或推送）得到新期号时记录一次检测，并同时唤醒所有等待的协程
+    - subscribe(callback): 新期号到达时在检测线程中回调（例如 UnixSocketBroker 转发给其他进程）
+    - clock() 为检测时间与轮询调度使用的当前时间（默认本机时钟，可换成按服务器时钟偏差修正的时间）
+    """
+
+    def __init__(self, source: ResultSource, push: Optional[PushBackend] = None,
+                 scheduler: Optional[AdaptivePollScheduler] = None, min_poll_gap: Optional[float] = None,
+                 clock: Callable[[], float] = time.time):
+        self.source = source
+        self.clock = clock
+        self.scheduler = scheduler or AdaptivePollScheduler()
+        self.min_poll_gap = self.scheduler.fast_interval if min_poll_gap is None else min_poll_gap
+        self.push: Optional[PushBackend] = None
+        self._cond = threading.Condition()
+        self._latest: Optional[dict] = None       # 已检测到的最新一期
+        self._detection: Optional[dict] = None    # 与 _latest 对应的检测信息 {issue, via, detected_at}
+        self._polling = False
+        self._last_poll: Optional[dict] = None
+        self._last_poll_at = float("-inf")        # time.monotonic()
+        self._subscribers: List[Callable[[dict], None]] = []
+        self._waiters: List[tuple] = []  # (事件循环, asyncio.Event)
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="result-poll")
+        self.polls = 0
+        self.shared_polls = 0
+        self.set_push(push)
+
+    def set_push(self, push: Optional[PushBackend]):
+        """替换推送源（None 表示仅轮询）。"""
+        if self.push is not None:
+            self.push.stop()
+        self.push = push
+        if push is not None:
+            push.start(self._on_push)
+
+    def subscribe(self, callback: Callable[[dict], None]) -> Callable[[dict], None]:
+        with self._cond:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Callable[[dict], None]):
+        with self._cond:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _on_push(self, result: dict):
+        self._observe(result, "push", self.clock())
+
+    def _observe(self, result: dict, via: str, detected_at: float) -> bool:
+        """记录新期号并唤醒所有等待方；旧期号或重复结果返回 False。"""
+        with self._cond:
+            if self._latest is not None and not is_newer_issue(result['issue'], self._latest['issue']):
+                return False
+            self._latest = result
+            self._detection = {"issue": result['issue'], "via": via, "detected_at": detected_at}
+            subscribers = list(self._subscribers)
+            waiters = list(self._waiters)
+            self._cond.notify_all()
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # 事件循环已关闭
+                pass
+        for callback in subscribers:
+            try:
+                callback(result)
+            except Exception as e:
+                log.warning(f"结果订阅者回调失败: {e}")
+        return True
+
+    def poll(self) -> Optional[dict]:
+        with self._cond:
+            if self._polling:
+                # 其他线程正在请求：等待其结果（期间推送到达也会被唤醒）
+                latest = self._latest
+                while self._polling and self._latest is latest:
+                    self._cond.wait()
+                self.shared_polls += 1
+                return self._latest if self._polling else self._last_poll
+            if time.monotonic() - self._last_poll_at < self.min_poll_gap:
+                self.shared_polls += 1
+                return self._last_poll
+            self._polling = True
+        result = None
+        try:
+            result = self.source.fetch()
+        finally:
+            with self._cond:
+                self._polling = False
+                self._last_poll = result
+                self._last_poll_at = time.monotonic()
+                self.polls += 1
+                self._cond.notify_all()
+        if result:
+            self._observe(result, "poll", self.clock())
+        return result
+
+    async def poll_async(self) -> Optional[dict]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.poll)
+
+    def _fresh(self, last_issue) -> Optional[Tuple[dict, dict]]:
+        """调用方持有 _cond。已检测到比 last_issue 新的一期时返回 (该结果, 检测信息副本)。"""
+        if self._latest is not None and is_newer_issue(self._latest['issue'], last_issue):
+            return self._latest, dict(self._detection)
+        return None
+
+    async def wait_for_new_issue(self, last_issue, expected_at: Optional[float],
+                                 on_poll: Optional[Callable[[Optional[dict]], None]] = None,
+                                 ahead: Optional[float] = None) -> Tuple[dict, dict]:
+        """
+        expected_at 为预计结果可查询到的时刻（Unix 时间戳），ahead 为提前开始密集轮询的秒数
+        （默认使用调度器配置）。等待期间推送或其他引擎的轮询得到新期号时立即返回。
+        on_poll 在每次轮询后以轮询结果回调（用于输出日志）。
+        返回 (结果, 检测信息 {issue, via, detected_at})，两者取自同一次检测，不受其他引擎随后的检测影响。
+        """
+        ahead = self.scheduler.ahead if ahead is None else ahead
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._waiters.append(waiter)
+        try:
+            while True:
+                waiter[1].clear()
+                with self._cond:
+                    result = self._fresh(last_issue)
+                if result is not None:
+                    return result
+                now = self.clock()
+                if expected_at is None or now >= expected_at - ahead:
+                    polled = await self.poll_async()
+                    with self._cond:
+                        result = self._fresh(last_issue)
+                    if result is not None:
+                        return result
+                    if on_poll:
+                        on_poll(polled)
+                push_connected = self.push is not None and self.push.connected
+                delay = self.scheduler.next_delay(self.clock(), expected_at, push_connected, ahead)
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._waiters.remove(waiter)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "polls": self.polls,
+                "shared_polls": self.shared_polls,
+                "subscribers": len(self._subscribers),
+                "waiters": len(self._waiters),
+                "latest_issue": None if self._latest is None else self._latest['issue'],
+                "push": None if self.push is None else {"type": self.push.name, "connected": self.push.connected},
+            }
+
+
+class UnixSocketBroker:
+    """
+    本机跨进程分发：监听 Unix socket，把订阅的 ResultFeed 检测到的每个新期号以一行 JSON 写给所有连接的进程；
+    新连接先收到当前最新一期。写入不阻塞检测线程：客户端缓冲区写满时断开该客户端（其会自动重连）。
+    """
+
+    def __init__(self, path: str, backlog: int = 16):
+        self.path = str(path)
+        self.backlog = backlog
+        self._lock = threading.Lock()
+        self._server: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._clients: List[socket.socket] = []
+        self._latest: Optional[bytes] = None
+        self.published = 0
+        self.dropped_clients = 0
+
+    def start(self):
+        if self._server is not None:
+            return
+        if os.path.exists(self.path):
+            # 已有进程在提供服务时不抢占；残留的 socket 文件直接删除
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                raise RuntimeError(f"{self.path} 已有其他进程在提供结果分发")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.path)
+            finally:
+                probe.close()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(self.backlog)
+        self._server = server
+        self._thread = threading.Thread(target=self._accept, args=(server,), name="ResultBroker", daemon=True)
+        self._thread.start()
+        log.info(f"结果分发已启动: {self.path}")
+
+    def stop(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        server.close()
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _accept(self, server: socket.socket):
+        while True:
+            try:
+                client, _ = server.accept()
+            except OSError:
+                return  # stop() 关闭了监听 socket
+            client.setblocking(False)
+            with self._lock:
+                self._clients.append(client)
+                latest = self._latest
+            if latest is not None:
+                self._send(client, latest)
+
+    def _send(self, client: socket.socket, payload: bytes) -> bool:
+        try:
+            sent = client.send(payload)
+            if sent == len(payload):
+                return True
+        except OSError:
+            pass
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+                self.dropped_clients += 1
+        client.close()
+        return False
+
+    def publish(self, result: dict):
+        """ResultFeed 订阅回调：把新期号写给所有客户端。"""
+        payload = (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._latest = payload
+            self.published += 1
+            clients = list(self._clients)
+        for client in clients:
+            self._send(client, payload)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"path": self.path, "clients": len(self._clients), "published": self.published,
+                    "dropped_clients": self.dropped_clients}
@@ -6,7 +6,7 @@
 #   ./run.sh start    - 在后台启动 Web 面板
 #   ./run.sh stop     - 停止在后台运行的 Web 面板
 #   ./run.sh status   - 查看 Web 面板的运行状态
-#   ./run.sh log      - 实时查看 Web 面板日志
+#   ./run.sh log      - 实时查看 Web 面板与引擎日志
 #   ./run.sh restart  - 重启 Web 面板
 #
 
@@ -26,6 +26,8 @@ fi
 cd "$HOME"
 
 LOG_FILE="$HOME/web.log"
+# 引擎结构化日志（JSON-lines，按大小/时间轮转）
+ENGINE_LOG_FILE="$HOME/logs/canada28.jsonl"
 # 用于 pgrep/pkill 的唯一进程标识
 PROCESS_PATTERN="uvicorn web.app:app"
 
@@ -121,7 +123,8 @@ case "${1:-}" in
             echo -e "${C_YELLOW}日志文件 $LOG_FILE 不存在。Web 面板可能还未运行过。${C_RESET}"
             exit 1
         fi
-        tail -f "$LOG_FILE"
+        # -F 在日志轮转后自动跟随新文件
+        tail -F "$LOG_FILE" "$ENGINE_LOG_FILE"
         ;;
 
     restart)
@@ -0,0 +1,289 @@
+"""
+tg-signer 本机账户目录与对话索引（~/.signer/users/<user_id>/{me.json,latest_chats.json}）。
+
+- SignerDirectory.users(): 已登录账户列表，缓存在内存中；只在 users 目录 mtime 变化或定期复核时检查，
+  且只重新解析 me.json mtime 变化了的账户
+- ChatIndex.refresh_all(): 并发为多个账户执行 `tg-signer -a <alias> login -n 20`（有并发上限与单账户超时），
+  由 Web 面板作为后台任务运行；max_age 内刷新过的账户默认跳过
+- 索引按 user_id 缓存对话（id → 标题），只在 latest_chats.json 的 mtime 变化时重新解析
+- search(): 按标题或 ID 在全部账户（或指定账户）的对话中查找，供面板绑定 chat_id
+"""
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bot_logging import get_logger
+
+log = get_logger("signer")
+
+
+def parse_signer_user(user_dir: Path) -> Dict[str, Any]:
+    """由 users/<user_id>/me.json 生成账户条目（缺失或无法解析时以 user_id 作为显示名）。"""
+    item: Dict[str, Any] = {"user_id": user_dir.name, "display_name": user_dir.name, "username": None,
+                            "first_name": None, "last_name": None}
+    me = user_dir / "me.json"
+    try:
+        if me.is_file():
+            j = json.loads(me.read_text(encoding="utf-8"))
+            first_name = j.get("first_name") or ""
+            last_name = j.get("last_name") or ""
+            username = j.get("username") or ""
+            display = (f"{first_name} {last_name}").strip() or username or user_dir.name
+            item.update({
+                "username": username,
+                "first_name": first_name,
+                "last_name": last_name,
+                "display_name": display
+            })
+    except Exception:
+        pass
+    return item
+
+
+class SignerDirectory:
+    """
+    本机 tg-signer 账户目录的内存缓存。
+    - 每次查询最多每 min_interval 秒 stat 一次 users 目录：目录 mtime 变化（账户增删）时重新列目录
+    - 每 revalidate 秒复核一次各账户 me.json 的 mtime（原地改写 me.json 不会改变目录 mtime），只重新解析变化的账户
+    - 其余查询直接返回缓存，不访问文件系统
+    """
+
+    def __init__(self, signer_dir: Path, min_interval: float = 1.0, revalidate: float = 30.0):
+        self.users_dir = Path(signer_dir) / "users"
+        self.min_interval = min_interval
+        self.revalidate = revalidate
+        self._lock = threading.Lock()
+        self._users: Dict[str, dict] = {}   # user_id -> {"mtime": me.json mtime, "item": 条目}
+        self._dir_mtime: Optional[float] = None
+        self._checked_at = 0.0      # monotonic
+        self._validated_at = 0.0    # monotonic
+        self.scans = 0
+        self.parsed = 0
+
+    @staticmethod
+    def _me_mtime(user_dir: Path) -> Optional[float]:
+        try:
+            return (user_dir / "me.json").stat().st_mtime
+        except OSError:
+            return None
+
+    def _update(self, user_id: str):
+        user_dir = self.users_dir / user_id
+        mtime = self._me_mtime(user_dir)
+        cached = self._users.get(user_id)
+        if cached is None or cached["mtime"] != mtime:
+            self._users[user_id] = {"mtime": mtime, "item": parse_signer_user(user_dir)}
+            self.parsed += 1
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.min_interval:
+            return
+        self._checked_at = now
+        try:
+            dir_mtime = self.users_dir.stat().st_mtime
+        except OSError:
+            self._users.clear()
+            self._dir_mtime = None
+            return
+        if force or dir_mtime != self._dir_mtime:
+            self.scans += 1
+            present = {d.name for d in self.users_dir.iterdir() if d.is_dir()}
+            for user_id in set(self._users) - present:
+                del self._users[user_id]
+            for user_id in present:
+                self._update(user_id)
+            self._dir_mtime = dir_mtime
+            self._validated_at = now
+        elif now - self._validated_at >= self.revalidate:
+            for user_id in list(self._users):
+                self._update(user_id)
+            self._validated_at = now
+
+    def users(self, force: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh(force)
+            return [dict(self._users[uid]["item"]) for uid in sorted(self._users)]
+
+    def user_ids(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return sorted(self._users)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._users), "scans": self.scans, "parsed": self.parsed}
+
+
+def format_chats(chats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    norm = []
+    for c in chats or []:
+        title = c.get("title")
+        if not title:
+            fn = c.get("first_name", "") or ""
+            ln = c.get("last_name", "") or ""
+            title = (f"{fn} {ln}").strip() or f"未知对话(ID:{c.get('id')})"
+        norm.append({
+            "id": c.get("id"),
+            "title": title
+        })
+    return norm
+
+
+async def run_tg_signer_login(alias: str, timeout: float = 30) -> Tuple[bool, Optional[str]]:
+    """执行 tg-signer login 刷新最近对话（asyncio 子进程，不占用线程）。返回 (是否成功, 错误信息)。"""
+    command = ['tg-signer', '-a', alias, 'login', '-n', '20']
+    log.info(f"执行命令: {' '.join(command)}")
+    try:
+        process = await asyncio.create_subprocess_exec(*command, stdin=asyncio.subprocess.PIPE,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+    except FileNotFoundError:
+        return False, "'tg-signer' 命令未找到。"
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(b"\n"), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        return False, "执行 tg-signer login 超时，请检查网络或手动执行。"
+    if process.returncode != 0:
+        log.error("执行 tg-signer login 失败。",
+                  extra={"alias": alias, "code": process.returncode,
+                         "stdout": stdout.decode("utf-8", "replace"), "stderr": stderr.decode("utf-8", "replace")})
+        return False, f"tg-signer login exit code {process.returncode}"
+    log.debug(f"命令输出: {stdout.decode('utf-8', 'replace')}")
+    return True, None
+
+
+class ChatIndex:
+    """
+    按 user_id 缓存的对话索引。
+    - release(alias): 调用 tg-signer 前释放该别名的常驻客户端（会话文件被占用时 tg-signer 无法登录），在线程池中调用
+    - 刷新状态按别名记录：pending / running / ok / failed / skipped
+    """
+
+    def __init__(self, signer_dir: Path, release: Optional[Callable[[str], None]] = None, concurrency: int = 4,
+                 timeout: float = 30, max_age: float = 600, directory: Optional[SignerDirectory] = None):
+        self.users_dir = Path(signer_dir) / "users"
+        self.directory = directory or SignerDirectory(signer_dir)
+        self.release = release
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_age = max_age  # 秒；距上次成功刷新不足 max_age 的账户在非强制刷新时跳过
+        self._lock = threading.Lock()
+        self._chats: Dict[str, dict] = {}    # user_id -> {"mtime", "chats"}
+        self._status: Dict[str, dict] = {}   # alias -> 刷新状态
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    # --- 索引 ---
+    def _load(self, user_id: str) -> List[Dict[str, Any]]:
+        """读取某账户的对话；latest_chats.json 未变化时直接返回缓存。"""
+        path = self.users_dir / user_id / "latest_chats.json"
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            with self._lock:
+                self._chats.pop(user_id, None)
+            return []
+        with self._lock:
+            cached = self._chats.get(user_id)
+            if cached is not None and cached["mtime"] == mtime:
+                return cached["chats"]
+        try:
+            chats = format_chats(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError) as e:
+            log.warning(f"解析 {path} 失败: {e}")
+            return cached["chats"] if cached else []
+        with self._lock:
+            self._chats[user_id] = {"mtime": mtime, "chats": chats}
+        return chats
+
+    def chats(self, user_id: str) -> List[Dict[str, Any]]:
+        return self._load(user_id)
+
+    def search(self, query: str = "", user_id: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        """按标题（不区分大小写）或 chat_id 子串查找对话，结果带 user_id。"""
+        query = (query or "").strip().lower()
+        result = []
+        for uid in ([user_id] if user_id else self.directory.user_ids()):
+            for chat in self._load(uid):
+                if query and query not in str(chat["title"]).lower() and query not in str(chat["id"]):
+                    continue
+                result.append(dict(chat, user_id=uid))
+                if len(result) >= limit:
+                    return result
+        return result
+
+    # --- 刷新 ---
+    def _set_status(self, alias: str, **fields):
+        with self._lock:
+            self._status.setdefault(alias, {}).update(fields)
+
+    def _fresh(self, alias: str) -> bool:
+        with self._lock:
+            status = self._status.get(alias) or {}
+        refreshed = status.get("refreshed_at")  # 仅在成功时更新
+        return refreshed is not None and time.time() - refreshed < self.max_age
+
+    async def refresh_one(self, alias: str, user_id: Optional[str] = None, force: bool = True) -> bool:
+        """刷新单个账户的最近对话；返回是否成功（跳过也视为成功）。"""
+        if not force and self._fresh(alias):
+            self._set_status(alias, user_id=user_id, status="skipped")
+            return True
+        self._set_status(alias, user_id=user_id, status="running", error=None, started_at=time.time())
+        if self.release is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.release, alias)
+        ok, error = await run_tg_signer_login(alias, self.timeout)
+        now = time.time()
+        if ok:
+            self._set_status(alias, status="ok", refreshed_at=now, finished_at=now,
+                             chats=len(self._load(user_id)) if user_id else None)
+        else:
+            self._set_status(alias, status="failed", error=error, finished_at=now)
+        return ok
+
+    async def refresh_all(self, targets: List[Tuple[str, Optional[str]]], force: bool = False) -> Dict[str, int]:
+        """刷新一批账户（同一别名只刷新一次），返回各状态的账户数。"""
+        targets = list({alias: user_id for alias, user_id in targets if alias}.items())
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(alias: str, user_id: Optional[str]):
+            async with semaphore:
+                try:
+                    await self.refresh_one(alias, user_id, force)
+                except asyncio.CancelledError:
+                    self._set_status(alias, status="failed", error="已取消", finished_at=time.time())
+                    raise
+                except Exception as e:
+                    log.exception(f"刷新账户[{alias}] 对话失败: {e}")
+                    self._set_status(alias, status="failed", error=str(e), finished_at=time.time())
+
+        self._started_at, self._finished_at = time.time(), None
+        for alias, user_id in targets:
+            self._set_status(alias, user_id=user_id, status="pending", error=None)
+        try:
+            await asyncio.gather(*(one(alias, user_id) for alias, user_id in targets))
+        finally:
+            self._finished_at = time.time()
+        return self.status()["counts"]
+
+    def status(self) -> dict:
+        with self._lock:
+            accounts = {alias: dict(s) for alias, s in self._status.items()}
+        counts: Dict[str, int] = {}
+        for s in accounts.values():
+            counts[s.get("status")] = counts.get(s.get("status"), 0) + 1
+        return {
+            "running": self._started_at is not None and self._finished_at is None,
+            "started_at": self._started_at,
+            "finished_at": self._finished_at,
+            "counts": counts,
+            "accounts": accounts,
+        }
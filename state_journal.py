@@ -0,0 +1,269 @@
+"""
+引擎状态的预写日志（WAL）：每次状态变化只追加一行 JSON，定期压缩为 state.json 快照。
+
+- 日志 <state>.journal 每行一条记录 {"seq", "ts", "op", ...}：
+  - set: 记录若干顶层键的新值（结算、期号推进等），恢复时按顺序覆盖
+  - bet: 某期某条下注的发送结果，恢复时汇总到 state['sent_bets']，重启后可知本期哪些注单已经发出
+  - draw: 开奖时钟新增的一期观测 (issue, award_ts, detected_ts, error)，恢复时追加到 state['draw_clock']；
+    完整的 draw_clock 只随快照写入
+- 一次 append 写入的多条记录只 fsync 一次（整轮下注结果合并提交）；durable=False 的记录随下一次 fsync 落盘
+- 记录数超过 compact_every 时把内存状态写成快照（临时文件 + fsync + rename + 目录 fsync），快照中的
+  journal_seq 标明已包含到哪条记录，随后清空日志；在两步之间崩溃也不会重复应用记录
+- load(): 读取快照并重放其后的日志，末尾写了一半的记录（断电）会被截掉
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from bot_logging import get_logger
+
+log = get_logger("state")
+
+SEQ_KEY = "journal_seq"
+
+
+def apply_entry(state: dict, entry: dict):
+    """把一条日志记录应用到状态上（恢复与写入时使用同一规则）。"""
+    op = entry.get("op")
+    if op == "set":
+        state.update(entry.get("data") or {})
+    elif op == "bet":
+        sent = state.get("sent_bets")
+        if not sent or sent.get("issue") != entry.get("issue"):
+            sent = state["sent_bets"] = {"issue": entry.get("issue"), "bets": []}
+        sent["bets"].append({k: entry.get(k) for k in ("strategy", "text", "alias", "status", "ok")})
+    elif op == "draw":
+        clock = state.get("draw_clock")
+        if not isinstance(clock, dict):
+            clock = state["draw_clock"] = {"history": [], "errors": []}
+        history = clock.setdefault("history", [])
+        errors = clock.setdefault("errors", [])
+        if history and history[-1][0] == entry.get("issue"):
+            return  # 内存中的 draw_clock 已包含该期（与 DrawClock.observe 相同的去重规则）
+        history.append([entry.get("issue"), entry.get("award_ts"), entry.get("detected_ts")])
+        if entry.get("error") is not None:
+            errors.append(entry["error"])
+        size = clock.get("size")
+        if size:
+            del history[:-size]
+            del errors[:-size]
+
+
+def _fsync_dir(path: Path):
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class StateJournal:
+    """单个引擎实例的状态日志；方法可在线程池中调用，内部加锁。"""
+
+    def __init__(self, snapshot_path: Path, journal_path: Optional[Path] = None, compact_every: int = 256):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path) if journal_path else self.snapshot_path.with_suffix(".journal")
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._file = None
+        self._seq = 0
+        self._entries = 0      # 快照之后的记录数
+        self._unsynced = False
+        self.fsyncs = 0
+        self.appended = 0
+        self.compactions = 0
+        self.recovered = 0
+        self.torn = 0
+
+    # --- 恢复 ---
+    def _read_snapshot(self) -> Optional[dict]:
+        if not self.snapshot_path.is_file():
+            return None
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            log.warning(f"读取状态快照失败: {e}，仅使用日志恢复。")
+            return None
+
+    def _read_journal(self):
+        """返回 (有效记录列表, 有效部分的字节数, 是否存在残缺的尾部)。"""
+        entries, valid = [], 0
+        try:
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return entries, 0, False
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+            valid += len(line)
+        return entries, valid, valid < len(data)
+
+    def _recover(self, repair: bool) -> Optional[dict]:
+        state = self._read_snapshot()
+        entries, valid, torn = self._read_journal()
+        if state is None and not entries:
+            return None
+        state = state if state is not None else {}
+        base_seq = state.pop(SEQ_KEY, 0) or 0
+        seq, replayed = base_seq, 0
+        for entry in entries:
+            if entry.get("seq", 0) <= seq:
+                continue  # 已包含在快照中（压缩后、清空日志前崩溃）
+            apply_entry(state, entry)
+            seq = entry["seq"]
+            replayed += 1
+        if repair:
+            if torn:
+                self.torn += 1
+                log.warning(f"状态日志末尾有残缺记录，已截断 ({self.journal_path})")
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(valid)
+                    os.fsync(f.fileno())
+            self._seq = seq
+            self._entries = len(entries)
+            self.recovered = replayed
+        return state
+
+    def load(self) -> Optional[dict]:
+        """恢复状态（快照 + 日志重放）并准备继续追加；没有任何持久化状态时返回 None。"""
+        with self._lock:
+            self._close()
+            state = self._recover(repair=True)
+            if self.recovered:
+                log.info(f"从状态日志恢复 {self.recovered} 条记录 (seq={self._seq})")
+            return state
+
+    def read(self) -> Optional[dict]:
+        """只读恢复（例如 Web 面板在引擎未运行时查看状态），不修改文件。"""
+        with self._lock:
+            return self._recover(repair=False)
+
+    # --- 写入 ---
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.journal_path, "ab")
+        return self._file
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, state: dict, entries: Iterable[dict], durable: bool = True):
+        """把记录应用到内存状态并追加到日志；durable=True 时整批只 fsync 一次后返回。"""
+        now = time.time()
+        lines = []
+        with self._lock:
+            for entry in entries:
+                self._seq += 1
+                entry = {"seq": self._seq, "ts": now, **entry}
+                apply_entry(state, entry)
+                lines.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+            if not lines:
+                return
+            f = self._open()
+            f.write("".join(lines).encode("utf-8"))
+            f.flush()
+            self._entries += len(lines)
+            self.appended += len(lines)
+            if durable:
+                os.fsync(f.fileno())
+                self.fsyncs += 1
+                self._unsynced = False
+            else:
+                self._unsynced = True
+
+    def update(self, state: dict, keys: Iterable[str], durable: bool = True):
+        """记录 state 中若干顶层键的当前值。"""
+        self.append(state, [{"op": "set", "data": {k: state.get(k) for k in keys}}], durable)
+
+    def record_bets(self, state: dict, issue, bets: List[Dict[str, Any]], durable: bool = True):
+        """记录一期下注的发送结果（每项含 strategy/text/alias/status/ok），整轮一次 fsync。"""
+        self.append(state, [dict(b, op="bet", issue=issue) for b in bets], durable)
+
+    def record_draw(self, state: dict, draw: Dict[str, Any], durable: bool = True):
+        """记录开奖时钟新增的一期观测（DrawClock.observe() 的返回值）。"""
+        self.append(state, [dict(draw, op="draw")], durable)
+
+    def sync(self):
+        with self._lock:
+            if self._file is not None and self._unsynced:
+                os.fsync(self._file.fileno())
+                self.fsyncs += 1
+                self._unsynced = False
+
+    # --- 压缩 ---
+    @property
+    def due(self) -> bool:
+        return self._entries >= self.compact_every
+
+    def compact(self, state: dict):
+        """把完整状态写成快照并清空日志。"""
+        with self._lock:
+            snapshot = dict(state)
+            snapshot[SEQ_KEY] = self._seq
+            tmp = self.snapshot_path.with_suffix(self.snapshot_path.suffix + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            tmp.replace(self.snapshot_path)
+            _fsync_dir(self.snapshot_path.parent)
+            f = self._open()
+            f.truncate(0)
+            os.fsync(f.fileno())
+            self._entries = 0
+            self._unsynced = False
+            self.compactions += 1
+
+    def maybe_compact(self, state: dict) -> bool:
+        if not self.due:
+            return False
+        self.compact(state)
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and self._unsynced:
+                os.fsync(self._file.fileno())
+                self.fsyncs += 1
+                self._unsynced = False
+            self._close()
+
+    def clear(self):
+        """删除快照与日志（Web 面板“清空状态”）。"""
+        with self._lock:
+            self._close()
+            for path in (self.snapshot_path, self.journal_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self._seq = self._entries = 0
+            self._unsynced = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "seq": self._seq,
+                "entries_since_snapshot": self._entries,
+                "appended": self.appended,
+                "fsyncs": self.fsyncs,
+                "compactions": self.compactions,
+                "recovered": self.recovered,
+                "torn": self.torn,
+            }
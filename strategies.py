@@ -0,0 +1,113 @@
+"""
+下注策略插件：引擎只通过统一接口驱动策略，新增玩法无需修改主循环。
+
+- Strategy.decide(last_sum, st, cfg) -> Decision: 根据上一期和值与策略状态生成本轮下注
+- Strategy.settle(decision, new_sum, st, cfg) -> bool: 开奖后判定输赢并更新策略状态
+- Strategy.serialize(st) / deserialize(data, cfg): 策略状态与 state.json 之间的转换
+- register_strategy(): 注册新策略，STRATEGIES 中的名称与 config.json 的 strategies 键对应
+"""
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class Decision:
+    strategy: str
+    side: str      # 下注方向文本，例如 大 / 单
+    amount: int
+    text: str      # 实际发送的下注文本，例如 大2
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Decision":
+        return cls(strategy=data['strategy'], side=data['side'], amount=data['amount'], text=data['text'])
+
+
+class Strategy:
+    name = ""
+    label = ""
+
+    def initial_state(self, cfg: dict) -> dict:
+        raise NotImplementedError
+
+    def decide(self, last_sum: Optional[int], st: dict, cfg: dict) -> Decision:
+        raise NotImplementedError
+
+    def settle(self, decision: Decision, new_sum: int, st: dict, cfg: dict) -> bool:
+        raise NotImplementedError
+
+    def serialize(self, st: dict) -> dict:
+        return dict(st)
+
+    def deserialize(self, data: Optional[dict], cfg: dict) -> dict:
+        st = self.initial_state(cfg)
+        st.update(data or {})
+        return st
+
+
+class ProgressionStrategy(Strategy):
+    """
+    跟随上一期结果下注的倍投策略：
+    - side_of(sum) 返回 True/False，分别对应 sides[1] / sides[0]；同样适用于 NumPy 数组（供回测使用）
+    - 胜：连胜 +1，达到 max_win_streak 时重置为初始金额，否则翻倍；负：重置为初始金额
+    """
+    sides = ("", "")
+    default_side = False  # 没有可参考和值时的下注方向
+
+    def side_of(self, total):
+        raise NotImplementedError
+
+    def initial_state(self, cfg: dict) -> dict:
+        return {'current_bet': cfg['initial_bet'], 'win_streak': 0}
+
+    def decide(self, last_sum: Optional[int], st: dict, cfg: dict) -> Decision:
+        side = self.default_side if last_sum is None else bool(self.side_of(last_sum))
+        side_text = self.sides[side]
+        amount = st['current_bet']
+        return Decision(strategy=self.name, side=side_text, amount=amount, text=f"{side_text}{amount}")
+
+    def settle(self, decision: Decision, new_sum: int, st: dict, cfg: dict) -> bool:
+        won = self.sides[bool(self.side_of(new_sum))] == decision.side
+        if won:
+            st['win_streak'] += 1
+            if st['win_streak'] >= cfg['max_win_streak']:
+                st['win_streak'] = 0
+                st['current_bet'] = cfg['initial_bet']
+            else:
+                st['current_bet'] *= 2
+        else:
+            st['win_streak'] = 0
+            st['current_bet'] = cfg['initial_bet']
+        return won
+
+
+class BigSmallStrategy(ProgressionStrategy):
+    name = "big_small"
+    label = "大小"
+    sides = ("小", "大")
+
+    def side_of(self, total):
+        return total >= 14
+
+
+class OddEvenStrategy(ProgressionStrategy):
+    name = "odd_even"
+    label = "单双"
+    sides = ("单", "双")
+
+    def side_of(self, total):
+        return total % 2 == 0
+
+
+STRATEGIES: Dict[str, Strategy] = {}
+
+
+def register_strategy(strategy: Strategy) -> Strategy:
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+register_strategy(BigSmallStrategy())
+register_strategy(OddEvenStrategy())
@@ -0,0 +1,241 @@
+"""
+引擎运行时遥测：事件广播与指标。
+- EventHub.publish(): 引擎线程发布内存事件（开始一轮、下注发出、检测到结果、结算、错误、状态快照），不阻塞、不写文件
+- EventHub.subscribe(): Web 面板按连接订阅（SSE），每个订阅有独立的有界队列，慢客户端只丢自己的旧事件
+- 保留最近若干条事件与每种事件（按实例区分）的最新一条，新连接或断线重连（Last-Event-ID）时可补发
+- MetricsRegistry: 计数器 / 直方图 / 仪表，render() 输出 Prometheus 文本格式（不依赖 prometheus_client）
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class Subscription:
+    """单个订阅者（绑定一个 asyncio 事件循环），发布线程通过 call_soon_threadsafe 投递事件。"""
+
+    def __init__(self, hub: "EventHub", loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.hub = hub
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _deliver(self, event: dict):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # 事件循环已关闭
+            self.close()
+
+    def _put(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """等待下一条事件，超时返回 None。"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.hub._unsubscribe(self)
+
+
+class EventHub:
+    """
+    进程内事件广播。事件格式: {"id": 序号, "type": 类型, "ts": Unix 时间戳, ...数据}。
+    publish() 可在任意线程调用；订阅者在各自的事件循环中消费。
+    """
+
+    def __init__(self, history: int = 200, queue_size: int = 500):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._recent = deque(maxlen=history)
+        self._latest: Dict[tuple, dict] = {}  # (类型, 实例) -> 最新事件
+        self._subscribers: List[Subscription] = []
+        self.published = 0
+
+    def publish(self, kind: str, **data) -> dict:
+        with self._lock:
+            self._seq += 1
+            event = {"id": self._seq, "type": kind, "ts": time.time(), **data}
+            self._recent.append(event)
+            self._latest[(kind, data.get("instance"))] = event
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub._deliver(event)
+        return event
+
+    def subscribe(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        """在事件循环中调用；返回的订阅需在断开时 close()。"""
+        sub = Subscription(self, loop or asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.append(sub)
+        return sub
+
+    def _unsubscribe(self, sub: Subscription):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def recent(self, since: int = 0) -> List[dict]:
+        """序号大于 since 的最近事件（用于断线重连补发）。"""
+        with self._lock:
+            return [e for e in self._recent if e["id"] > since]
+
+    def latest(self, kind: str, instance: Optional[str] = None) -> Optional[dict]:
+        """某类事件的最新一条；事件带 instance 字段时按实例分别保存。"""
+        with self._lock:
+            return self._latest.get((kind, instance))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "published": self.published,
+                "subscribers": len(self._subscribers),
+                "dropped": sum(s.dropped for s in self._subscribers),
+            }
+
+
+# --- 指标 ---
+
+# 默认直方图分桶（秒），覆盖毫秒级发送到数秒的接口耗时
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[tuple, list] = {}  # key -> [各桶计数..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, row in items:
+            for bound, count in zip(self.buckets, row):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, (('le', _format_value(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, (('le', '+Inf'),))} {row[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(row[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {row[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表；同名指标重复注册时返回已有实例。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
@@ -0,0 +1,717 @@
+"""
+Telegram 发送层：为每个账户别名常驻一个已连接的客户端，避免每注都启动一次 tg-signer 进程。
+
+- SenderPool.submit()/send(): 按别名排队发送（每个别名一个队列，同一账户内串行）
+- 每次发送返回 SendResult，包含排队耗时与端到端耗时
+- arm(): 盘口开放前预先排队并连接客户端，到开放时刻由 PreciseTimer 准时发出，记录每注的开放-发出偏差；
+  一轮内的多条下注并发发送（总并发有上限），超过本轮截止时间的注单丢弃或标记为迟到
+- 客户端不可用（未安装 tg-signer 库 / 会话无法连接）时回退到 tg-signer 子进程（asyncio 子进程，不占用线程）
+- AccountScheduler: 按别名跟踪成功率、发送延迟与冷却/隔离状态，按权重为每注选择最快的健康账户
+- SendLimiter: 按别名、按 chat_id 与全局三层令牌桶限速，真正发送前等待令牌；Telegram 返回限流时暂停该别名
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bot_logging import get_logger
+from timing import PreciseTimer
+
+try:
+    # tg-signer 内部基于 pyrogram，复用它的会话与 API 配置
+    from tg_signer.core import get_client
+except ImportError:  # 未安装时仅使用子进程方式
+    get_client = None
+
+log = get_logger("sender")
+
+
+@dataclass
+class SendResult:
+    ok: bool
+    alias: str
+    chat_id: str
+    text: str
+    via: str = ""              # client / subprocess
+    status: str = ""           # sent / failed / dropped（截止前未发出） / late（截止后才完成） / timeout（截止时仍未确认）
+    latency: float = 0.0       # 提交到发送完成的总耗时（秒）
+    queued: float = 0.0        # 在别名队列中等待的耗时（秒）
+    error: Optional[str] = None
+    skew: Optional[float] = None  # 定时发送时，计划发出时刻到实际开始发送的偏差（秒）
+    code: Optional[str] = None    # 失败原因代码：exit_<退出码> / not_found / 客户端异常类名 / dropped / rate_limited / timeout
+    rate_wait: float = 0.0        # 等待限速令牌的耗时（秒）
+
+    @property
+    def retryable(self) -> bool:
+        """消息确定没有发出（可以换账户重发而不会重复下注）。"""
+        if self.ok or not self.code:
+            return False
+        return self.code in DEFINITE_FAILURES or flood_wait_seconds(self) is not None
+
+
+# 可确定消息未发出的失败代码：发送前即失败（未找到 tg-signer、限速未发、截止丢弃）或 Telegram 拒绝发送。
+# 其余客户端异常与 tg-signer 非零退出码（可能在发出后的清理/输出阶段失败）均可能已送达，不换账户重发
+DEFINITE_FAILURES = frozenset({
+    "not_found", "rate_limited", "dropped", "FloodWait", "SlowmodeWait", "PeerFlood", "ChatWriteForbidden",
+    "UserBannedInChannel", "PeerIdInvalid", "ChannelPrivate", "AuthKeyUnregistered", "UserDeactivated",
+    "SessionRevoked", "SessionExpired",
+})
+
+_FLOOD_SECONDS = re.compile(r"(\d+)\s*(?:seconds?|s\b)", re.IGNORECASE)
+
+
+def flood_wait_seconds(result: SendResult, default: float = 60) -> Optional[float]:
+    """Telegram 限流（FloodWait / SlowmodeWait / PeerFlood）时返回需要等待的秒数，否则返回 None。"""
+    text = f"{result.code or ''} {result.error or ''}".upper()
+    if "FLOOD" not in text and "SLOWMODE" not in text and "TOO MANY REQUESTS" not in text:
+        return None
+    match = _FLOOD_SECONDS.search(result.error or "")
+    return float(match.group(1)) if match else default
+
+
+@dataclass
+class _SendJob:
+    alias: str
+    chat_id: str
+    text: str
+    future: Future
+    submitted_at: float = field(default_factory=time.perf_counter)
+    deadline: Optional[float] = None  # perf_counter 时间，超过则不再发送
+    fire_at: Optional[float] = None   # perf_counter 时间，定时发送时到点才发出
+    fire_ts: Optional[float] = None   # 同一时刻在参考时间轴上的值，临近发出时据此重新换算 fire_at
+
+    @property
+    def started_at(self) -> float:
+        """计时起点：定时发送从计划发出时刻算起，否则从提交时刻算起。"""
+        return self.submitted_at if self.fire_at is None else max(self.submitted_at, self.fire_at)
+
+
+async def run_tg_signer_send(alias: str, chat_id: str, message: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    使用 tg-signer 子进程发送一条文本（回退路径）。
+    - 指定账户别名 alias（-a）
+    - 兼容负 chat_id 时添加 '--'
+    返回 (是否成功, 错误信息, 失败原因代码)
+    """
+    command = ['tg-signer']
+    if alias:
+        command.extend(['-a', str(alias)])
+    command.append('send-text')
+
+    if str(chat_id).startswith('-'):
+        command.append('--')
+
+    command.extend([str(chat_id), message])
+
+    log.debug(f"执行命令: {' '.join(command)}")
+    try:
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+    except FileNotFoundError:
+        log.error("未找到 'tg-signer' 命令，请先安装并确保在 PATH 中。")
+        return False, "tg-signer not found", "not_found"
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        # 发送层关闭时不留下孤儿进程
+        if process.returncode is None:
+            process.kill()
+        raise
+    if process.returncode != 0:
+        log.error(f"tg-signer 执行失败。code={process.returncode}",
+                  extra={"alias": alias, "code": process.returncode,
+                         "stdout": stdout.decode('utf-8', 'replace'), "stderr": stderr.decode('utf-8', 'replace')})
+        return False, f"tg-signer exit code {process.returncode}", f"exit_{process.returncode}"
+    return True, None, None
+
+
+class _AliasWorker:
+    """单个账户别名的常驻客户端与发送队列，只在发送层的事件循环中使用。"""
+
+    def __init__(self, pool: "SenderPool", alias: str):
+        self.pool = pool
+        self.alias = alias
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.client = None
+        self.client_failed = False  # 连接失败后本别名改走子进程，直到 release()
+        self.task = asyncio.ensure_future(self._run())
+
+    async def connect(self) -> bool:
+        """确保客户端已连接；无法连接时返回 False。"""
+        if self.client is not None:
+            return True
+        if self.client_failed or not self.pool.use_client or get_client is None:
+            return False
+        try:
+            client = get_client(self.alias, workdir=str(self.pool.session_dir))
+            await client.start()
+            self.client = client
+            log.info(f"账户[{self.alias}] 客户端已连接")
+            return True
+        except Exception as e:
+            self.client_failed = True
+            log.warning(f"账户[{self.alias}] 客户端连接失败({e})，改用 tg-signer 子进程发送。")
+            return False
+
+    async def disconnect(self):
+        client, self.client = self.client, None
+        if client is not None:
+            try:
+                await client.stop()
+            except Exception as e:
+                log.warning(f"断开账户[{self.alias}] 客户端时出错: {e}")
+
+    async def _run(self):
+        while True:
+            job: _SendJob = await self.queue.get()
+            if job.fire_at is not None and not job.future.cancelled():
+                # 等待期间先完成连接，到点后直接发送；注单被取消时立即唤醒
+                await self.connect()
+                cancelled = asyncio.Event()
+                loop = asyncio.get_running_loop()
+                job.future.add_done_callback(lambda _f: loop.call_soon_threadsafe(cancelled.set))
+                timer = self.pool.timer
+                fire_ts = job.fire_ts if job.fire_ts is not None else timer.from_local(job.fire_at)
+                target = await timer.sleep_until(fire_ts, wake=cancelled)
+                if target is not None:
+                    job.fire_at = target
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    result = await self._send(job)
+                except Exception as e:
+                    # 单条注单出错不能让别名队列停止处理
+                    log.exception(f"账户[{self.alias}] 发送出错: {e}")
+                    result = SendResult(ok=False, alias=job.alias, chat_id=job.chat_id, text=job.text,
+                                        status="failed", code=type(e).__name__, error=f"{type(e).__name__}: {e}",
+                                        latency=time.perf_counter() - job.started_at)
+                job.future.set_result(result)
+            self.queue.task_done()
+
+    async def _send(self, job: _SendJob) -> SendResult:
+        # 先等待限速令牌（不占用并发名额），拿不到令牌即截止的注单不发送
+        waited = await self.pool.limiter.acquire(job.alias, job.chat_id, job.deadline)
+        if waited is None:
+            result = SendResult(ok=False, alias=job.alias, chat_id=job.chat_id, text=job.text, status="dropped",
+                                code="rate_limited", error="限速等待会超过本轮下注截止时间，未发送",
+                                queued=time.perf_counter() - job.started_at)
+        else:
+            async with self.pool._semaphore:
+                result = await self._send_now(job)
+            result.rate_wait = waited
+        if result.status != "dropped":
+            result.status = "sent" if result.ok else "failed"
+            if result.ok and job.deadline is not None and time.perf_counter() > job.deadline:
+                result.status = "late"
+        result.latency = time.perf_counter() - job.started_at
+        self.pool._record(result)
+        return result
+
+    async def _send_now(self, job: _SendJob) -> SendResult:
+        started = time.perf_counter()
+        result = SendResult(ok=False, alias=job.alias, chat_id=job.chat_id, text=job.text,
+                            queued=started - job.started_at)
+        if job.fire_at is not None:
+            result.skew = started - job.fire_at
+        if job.deadline is not None and started > job.deadline:
+            result.status = result.code = "dropped"
+            result.error = "已超过本轮下注截止时间，未发送"
+            return result
+        if await self.connect():
+            result.via = "client"
+            try:
+                await self.client.send_message(int(job.chat_id), job.text)
+                result.ok = True
+            except Exception as e:
+                # 发送异常时不回退子进程，避免消息实际已发出而重复下注
+                result.error = f"{type(e).__name__}: {e}"
+                result.code = type(e).__name__
+                log.error(f"账户[{self.alias}] 发送失败: {result.error}")
+        else:
+            result.via = "subprocess"
+            result.ok, result.error, result.code = await run_tg_signer_send(job.alias, job.chat_id, job.text)
+        return result
+
+
+class SendStats:
+    """单个别名的发送耗时统计。"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.last_latency = None
+        self.total_latency = 0.0
+        self.timed = 0  # 定时发送次数
+        self.last_skew = None
+        self.total_skew = 0.0
+
+    def as_dict(self) -> dict:
+        done = self.sent + self.failed
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "last_latency_ms": None if self.last_latency is None else round(self.last_latency * 1000, 1),
+            "avg_latency_ms": round(self.total_latency / done * 1000, 1) if done else None,
+            "last_skew_ms": None if self.last_skew is None else round(self.last_skew * 1000, 2),
+            "avg_skew_ms": round(self.total_skew / self.timed * 1000, 2) if self.timed else None,
+        }
+
+
+class AccountHealth:
+    """单个别名的健康状态（由 AccountScheduler 加锁访问）。"""
+
+    def __init__(self, window: int):
+        self.outcomes = deque(maxlen=window)  # 最近若干次发送是否成功
+        self.latency: Optional[float] = None  # 发送耗时的指数滑动平均（秒）
+        self.consecutive_failures = 0
+        self.quarantines = 0                  # 连续进入隔离的次数，成功发送后清零
+        self.until = 0.0                      # 冷却/隔离结束时刻（monotonic）
+        self.reason: Optional[str] = None     # flood / quarantine
+        self.last_code: Optional[str] = None
+
+    def success_rate(self) -> float:
+        # 先验 1 成 1 败，新账户与样本少的账户不会被极端估计
+        return (sum(self.outcomes) + 1) / (len(self.outcomes) + 2)
+
+
+class AccountScheduler:
+    """
+    为每注选择发送账户：
+    - 成功率取最近 window 次发送（平滑），延迟取指数滑动平均；权重 = 成功率² / max(延迟, latency_floor)
+    - 同一账户内串行发送，本轮已分配 n 注的账户按 (n+1) 倍延迟计权，整轮下注自然分散到多个快账户
+    - 连续失败 quarantine_after 次进入隔离，时长随连续隔离次数翻倍（上限 max_quarantine）；
+      隔离结束后再失败一次即重新隔离，成功一次恢复正常
+    - 限流（FloodWait 等）按错误信息中的秒数冷却；冷却/隔离中的账户不参与选择，
+      全部账户都被隔离时退回最早解除隔离的账户（限流中的账户始终跳过）
+    """
+
+    def __init__(self, window: int = 20, alpha: float = 0.3, quarantine_after: int = 3, quarantine: float = 60,
+                 max_quarantine: float = 1800, flood_default: float = 60, latency_floor: float = 0.05,
+                 default_latency: float = 1.0):
+        self.window = window
+        self.alpha = alpha
+        self.quarantine_after = quarantine_after
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+        self.flood_default = flood_default
+        self.latency_floor = latency_floor
+        self.default_latency = default_latency  # 尚无样本时假设的延迟
+        self._lock = threading.Lock()
+        self._accounts: Dict[str, AccountHealth] = {}
+
+    def _get(self, alias: str) -> AccountHealth:
+        health = self._accounts.get(alias)
+        if health is None:
+            health = self._accounts[alias] = AccountHealth(self.window)
+        return health
+
+    def observe(self, result: SendResult):
+        """记录一次发送结果；dropped（未轮到发送即截止）与账户无关，不计入。"""
+        if result.status == "dropped":
+            return
+        now = time.monotonic()
+        with self._lock:
+            health = self._get(result.alias)
+            if health.latency is None:
+                health.latency = result.latency
+            else:
+                health.latency += self.alpha * (result.latency - health.latency)
+            health.outcomes.append(result.ok)
+            if result.ok:
+                health.consecutive_failures = 0
+                health.quarantines = 0
+                if health.reason == "quarantine":
+                    health.until, health.reason = 0.0, None
+                return
+            health.consecutive_failures += 1
+            health.last_code = result.code
+            seconds = flood_wait_seconds(result, self.flood_default)
+            if seconds is not None:
+                health.until, health.reason = now + seconds, "flood"
+                log.warning(f"账户[{result.alias}] 被限流，冷却 {seconds:.0f} 秒", extra={"alias": result.alias})
+            elif health.consecutive_failures >= self.quarantine_after:
+                health.quarantines += 1
+                seconds = min(self.max_quarantine, self.quarantine * 2 ** (health.quarantines - 1))
+                health.until, health.reason = now + seconds, "quarantine"
+                # 解除隔离后再失败一次即重新隔离
+                health.consecutive_failures = self.quarantine_after - 1
+                log.warning(f"账户[{result.alias}] 连续发送失败，隔离 {seconds:.0f} 秒 (最近错误 {result.code})",
+                            extra={"alias": result.alias, "code": result.code})
+
+    def _weight(self, health: Optional[AccountHealth], assigned: int) -> float:
+        if health is None:
+            return 0.25 / self.default_latency
+        latency = self.default_latency if health.latency is None else health.latency
+        return health.success_rate() ** 2 / (max(latency, self.latency_floor) * (assigned + 1))
+
+    def choose(self, aliases: List[str], assigned: Optional[Dict[str, int]] = None,
+               exclude: Tuple[str, ...] = ()) -> Optional[str]:
+        """从候选别名中按权重随机选择一个；assigned 为本轮已分配给各别名的注数，exclude 为不可选的别名。"""
+        assigned = assigned or {}
+        now = time.monotonic()
+        with self._lock:
+            healthy, fallback = [], []
+            for alias in aliases:
+                if alias in exclude:
+                    continue
+                health = self._accounts.get(alias)
+                if health is None or health.until <= now:
+                    healthy.append((alias, self._weight(health, assigned.get(alias, 0))))
+                elif health.reason != "flood":
+                    fallback.append((health.until, alias))
+        if healthy:
+            names, weights = zip(*healthy)
+            return random.choices(names, weights=weights)[0]
+        if fallback:
+            alias = min(fallback)[1]
+            log.warning(f"所有账户均在隔离中，退回使用账户[{alias}]")
+            return alias
+        return None
+
+    def reset(self, alias: str):
+        """手动解除某个别名的隔离/冷却并清空统计。"""
+        with self._lock:
+            self._accounts.pop(alias, None)
+
+    def snapshot(self) -> Dict[str, dict]:
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for alias, health in self._accounts.items():
+                blocked = health.until > now
+                result[alias] = {
+                    "state": health.reason if blocked else "healthy",
+                    "score": round(self._weight(health, 0), 3),
+                    "success_rate": round(health.success_rate(), 3),
+                    "samples": len(health.outcomes),
+                    "latency_ms": None if health.latency is None else round(health.latency * 1000, 1),
+                    "consecutive_failures": health.consecutive_failures,
+                    "blocked_for_s": round(health.until - now, 1) if blocked else 0,
+                    "last_code": health.last_code,
+                }
+            return result
+
+
+class TokenBucket:
+    """
+    令牌桶（GCRA 形式）：平均每秒 rate 个令牌，最多积攒 burst 个。
+    只记录“理论到达时间” tat，可同时对多个桶计算最早可发送时刻并一起扣减。
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.tolerance = self.interval * max(0.0, burst - 1)
+        self.tat = 0.0  # monotonic
+
+    def earliest(self, now: float) -> float:
+        return max(now, self.tat - self.tolerance)
+
+    def take(self, at: float):
+        self.tat = max(self.tat, at) + self.interval
+
+    def block_until(self, until: float):
+        self.tat = max(self.tat, until + self.tolerance)
+
+
+class SendLimiter:
+    """
+    发送限速：每条消息需同时从 别名 / chat_id / 全局 三个令牌桶各取一个令牌。
+    只在发送层事件循环中使用；等待会越过本注截止时间时直接放弃（status=dropped, code=rate_limited）。
+    速率按“每分钟条数”配置（全局按每秒），burst 为允许的瞬时突发条数。
+    """
+
+    PARAMS = ("account_per_minute", "account_burst", "chat_per_minute", "chat_burst", "global_per_second",
+              "global_burst")
+
+    def __init__(self, account_per_minute: float = 30, account_burst: float = 3, chat_per_minute: float = 20,
+                 chat_burst: float = 5, global_per_second: float = 25, global_burst: float = 25):
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self.waits = 0
+        self.total_wait = 0.0
+        self.rejected = 0
+        self.configure(account_per_minute, account_burst, chat_per_minute, chat_burst, global_per_second, global_burst)
+
+    def configure(self, account_per_minute: float = 30, account_burst: float = 3, chat_per_minute: float = 20,
+                  chat_burst: float = 5, global_per_second: float = 25, global_burst: float = 25):
+        """调整速率（已有的桶保留各自的进度）。"""
+        self._params = {
+            "alias": (account_per_minute / 60.0, account_burst),
+            "chat": (chat_per_minute / 60.0, chat_burst),
+            "global": (global_per_second, global_burst),
+        }
+        for (kind, _), bucket in self._buckets.items():
+            rate, burst = self._params[kind]
+            bucket.interval = 1.0 / rate if rate > 0 else 0.0
+            bucket.tolerance = bucket.interval * max(0.0, burst - 1)
+
+    def _bucket(self, kind: str, key) -> TokenBucket:
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            bucket = self._buckets[(kind, key)] = TokenBucket(*self._params[kind])
+        return bucket
+
+    def _buckets_for(self, alias: str, chat_id: str) -> List[TokenBucket]:
+        return [self._bucket("alias", alias), self._bucket("chat", str(chat_id)), self._bucket("global", None)]
+
+    async def acquire(self, alias: str, chat_id: str, deadline: Optional[float] = None) -> Optional[float]:
+        """
+        等待到三个令牌桶都允许发送，返回等待的秒数；deadline（perf_counter 时间）之前拿不到令牌时返回 None。
+        令牌在计算出发送时刻时即扣减，并发的多注按到达顺序排在后面。
+        """
+        buckets = self._buckets_for(alias, chat_id)
+        now = time.monotonic()
+        at = max(b.earliest(now) for b in buckets)
+        wait_for = at - now
+        if deadline is not None and time.perf_counter() + wait_for > deadline:
+            self.rejected += 1
+            return None
+        for bucket in buckets:
+            bucket.take(at)
+        if wait_for > 0:
+            self.waits += 1
+            self.total_wait += wait_for
+            await asyncio.sleep(wait_for)
+        return max(0.0, wait_for)
+
+    def block(self, alias: str, seconds: float):
+        """Telegram 要求等待时，在此期间不再从该别名发送。"""
+        self._bucket("alias", alias).block_until(time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        return {
+            "waits": self.waits,
+            "total_wait_ms": round(self.total_wait * 1000, 1),
+            "rejected": self.rejected,
+        }
+
+
+class ArmedRound:
+    """已提交的一轮下注，fire_at / deadline 为 perf_counter 时间。"""
+
+    def __init__(self, bets: List[Tuple[str, str, str]], futures: List[Future], fire_at: Optional[float],
+                 deadline: float, record: Optional[Callable[[SendResult], None]] = None):
+        self.bets = bets
+        self.record = record  # 记录截止时撤回的注单（这些注单不会再经过发送层）
+        self.futures = futures
+        self.fire_at = fire_at
+        self.deadline = deadline
+        self.started_at = time.perf_counter() if fire_at is None else fire_at
+
+    def seconds_until_fire(self) -> float:
+        return 0.0 if self.fire_at is None else max(0.0, self.fire_at - time.perf_counter())
+
+    def cancel(self):
+        """取消尚未发出的注单（例如引擎停止）。"""
+        for future in self.futures:
+            future.cancel()
+
+    def collect(self) -> List[SendResult]:
+        """
+        等待全部注单完成，最多到本轮截止时间。按输入顺序返回每注结果；
+        截止时仍未确认的注单标记为 timeout（可能稍后才送达）。
+        """
+        wait(self.futures, timeout=max(0.0, self.deadline - time.perf_counter()))
+        return self._results()
+
+    async def collect_async(self) -> List[SendResult]:
+        """collect() 的协程版本：在调用方的事件循环中等待，不阻塞线程。"""
+        pending = [asyncio.wrap_future(f) for f in self.futures if not f.done()]
+        if pending:
+            # asyncio.wait 超时不会取消发送层中的任务，由 _results() 统一处理
+            await asyncio.wait(pending, timeout=max(0.0, self.deadline - time.perf_counter()))
+        return self._results()
+
+    def _results(self) -> List[SendResult]:
+        results = []
+        for (alias, chat_id, text), future in zip(self.bets, self.futures):
+            if future.done() and not future.cancelled():
+                results.append(future.result())
+            else:
+                result = SendResult(ok=False, alias=alias, chat_id=str(chat_id), text=text, status="timeout",
+                                    code="timeout", latency=max(0.0, time.perf_counter() - self.started_at),
+                                    error="截止时间前未确认发送结果")
+                # 尚未开始的任务直接取消并在此记录；已在发送中的无法撤回，完成时由发送层记录一次（late / failed）
+                if future.cancel() and self.record is not None:
+                    self.record(result)
+                results.append(result)
+        return results
+
+
+class SenderPool:
+    """
+    常驻发送层：后台线程运行一个事件循环，为每个别名维护一个已连接的客户端。
+    - submit(): 非阻塞提交，返回 concurrent.futures.Future[SendResult]
+    - send(): 阻塞等待发送结果
+    - arm(): 预先排队一轮下注，在指定时刻准时发出（返回 ArmedRound，稍后 collect()）
+    - warm(): 提前连接客户端（例如引擎启动时）
+    - release(): 断开某个别名的客户端（例如需要用 tg-signer 命令操作同一会话时）
+    - scheduler: 每注结果都会记入账户调度器，供引擎选择发送账户
+    """
+
+    def __init__(self, session_dir: Path, use_client: bool = True, max_concurrency: int = 8,
+                 on_result: Optional[Callable[[SendResult], None]] = None, timer: Optional[PreciseTimer] = None,
+                 scheduler: Optional[AccountScheduler] = None, limiter: Optional[SendLimiter] = None):
+        self.session_dir = Path(session_dir)
+        self.on_result = on_result  # 每注发送完成后的回调（在发送层线程中调用，需快速返回）
+        self.scheduler = scheduler or AccountScheduler()  # 账户健康度与选择
+        self.limiter = limiter or SendLimiter()  # 别名 / chat_id / 全局限速（只在事件循环中使用）
+        self.timer = timer or PreciseTimer()  # 定时发送的唤醒计时器
+        self.use_client = use_client
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._workers: Dict[str, _AliasWorker] = {}
+        self._stats: Dict[str, SendStats] = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="TelegramSenderPool", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def _worker(self, alias: str) -> _AliasWorker:
+        # 仅在事件循环线程中调用
+        worker = self._workers.get(alias)
+        if worker is None:
+            worker = self._workers[alias] = _AliasWorker(self, alias)
+        return worker
+
+    def _record(self, result: SendResult):
+        with self._lock:
+            stats = self._stats.setdefault(result.alias, SendStats())
+            if result.ok:
+                stats.sent += 1
+            else:
+                stats.failed += 1
+            stats.last_latency = result.latency
+            stats.total_latency += result.latency
+            if result.skew is not None:
+                stats.timed += 1
+                stats.last_skew = result.skew
+                stats.total_skew += result.skew
+        self.scheduler.observe(result)
+        seconds = flood_wait_seconds(result)
+        if seconds is not None:
+            self.limiter.block(result.alias, seconds)
+        if self.on_result is not None:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                log.exception(f"结果回调出错: {e}")
+
+    def submit(self, alias: str, chat_id: str, text: str, deadline: Optional[float] = None,
+               fire_at: Optional[float] = None, fire_ts: Optional[float] = None) -> Future:
+        """
+        提交一条发送任务到该别名的队列，立即返回 Future。
+        deadline 为 time.perf_counter() 时间，轮到发送时已超过则丢弃（status=dropped）。
+        fire_at 为 time.perf_counter() 时间，指定时先建立连接，到点才发送；
+        fire_ts 为同一时刻在计时器参考时间轴上的值，用于临近发出时纠正时钟调整。
+        """
+        loop = self._ensure_loop()
+        job = _SendJob(alias=alias, chat_id=str(chat_id), text=text, future=Future(), deadline=deadline,
+                       fire_at=fire_at, fire_ts=fire_ts)
+        loop.call_soon_threadsafe(lambda: self._worker(alias).queue.put_nowait(job))
+        return job.future
+
+    def send(self, alias: str, chat_id: str, text: str, timeout: float = 60) -> SendResult:
+        """发送并等待结果；超时则返回失败结果（任务仍可能在稍后完成）。"""
+        future = self.submit(alias, chat_id, text)
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            return SendResult(ok=False, alias=alias, chat_id=str(chat_id), text=text, status="timeout", code="timeout",
+                              error=f"等待发送结果失败: {e!r}")
+
+    def arm(self, bets: List[Tuple[str, str, str]], fire_at: float, cutoff: float) -> "ArmedRound":
+        """
+        预先提交一轮下注：立即连接相关客户端并排队，在 fire_at 时刻准时发出。
+        fire_at / cutoff 为计时器参考时间轴上的时刻（盘口开放 / 本轮封盘），内部换算为 perf_counter 计时。
+        """
+        fire, deadline = self.timer.to_local(fire_at), self.timer.to_local(cutoff)
+        futures = [self.submit(alias, chat_id, text, deadline=deadline, fire_at=fire, fire_ts=fire_at)
+                   for alias, chat_id, text in bets]
+        return ArmedRound(bets, futures, fire, deadline, record=self._record)
+
+    def configure_limits(self, limits: dict):
+        """按配置调整限速（在事件循环中执行，与 acquire() 不并发）。"""
+        params = {}
+        for key in SendLimiter.PARAMS:
+            try:
+                params[key] = float(limits[key])
+            except (KeyError, TypeError, ValueError):
+                continue
+        loop = self._ensure_loop()
+        loop.call_soon_threadsafe(lambda: self.limiter.configure(**params))
+
+    def warm(self, alias: str) -> Future:
+        """提前建立该别名的客户端连接，返回 Future[bool]。"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._warm(alias), loop)
+
+    async def _warm(self, alias: str) -> bool:
+        return await self._worker(alias).connect()
+
+    def release(self, alias: str, timeout: float = 10) -> None:
+        """断开别名的常驻客户端，下次发送时重新连接。"""
+        with self._lock:
+            loop = self._loop
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._release(alias), loop).result(timeout=timeout)
+        except Exception as e:
+            log.warning(f"释放账户[{alias}] 客户端失败: {e}")
+
+    async def _release(self, alias: str):
+        worker = self._workers.get(alias)
+        if worker is not None:
+            await worker.disconnect()
+            worker.client_failed = False
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            result = {alias: s.as_dict() for alias, s in self._stats.items()}
+        for alias, worker in list(self._workers.items()):
+            result.setdefault(alias, SendStats().as_dict())["connected"] = worker.client is not None
+        return result
+
+    def close(self, timeout: float = 10) -> None:
+        """断开所有客户端并停止事件循环。"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if loop is None:
+            return
+
+        async def shutdown():
+            for worker in list(self._workers.values()):
+                worker.task.cancel()
+                await worker.disconnect()
+            self._workers.clear()
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=timeout)
+        except Exception as e:
+            log.warning(f"关闭时出错: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        if thread:
+            thread.join(timeout=timeout)
@@ -0,0 +1,310 @@
+"""
+计时：
+- DrawClock: 根据历史开奖时间学习真实开奖节奏
+  - observe(): 记录每期的开奖时间与检测到结果的时间（API 发布延迟）
+  - estimate(): 预计下期开奖时刻及置信区间、预计结果可被查询到的时刻
+  - 每期开奖后计算上一次预测的误差，供面板展示
+- PreciseTimer: 按墙上时间定时唤醒，等待本身基于单调时钟，记录唤醒抖动
+- ClockSync: 根据 API 响应的 Date 头估计本机时钟与服务器时钟的偏差与往返时间
+"""
+import asyncio
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+
+def _quantile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))]
+
+
+def _issue_number(issue) -> Optional[int]:
+    try:
+        return int(issue)
+    except (TypeError, ValueError):
+        return None
+
+
+class DrawClock:
+    """
+    history 中每项为 (issue, award_ts, detected_ts)，时间均为 Unix 时间戳。
+    样本不足 min_samples 时按 nominal_interval 和 0 发布延迟估算。
+    """
+
+    def __init__(self, nominal_interval: float, size: int = 50, min_samples: int = 5):
+        self.nominal_interval = nominal_interval
+        self.min_samples = min_samples
+        self.history = deque(maxlen=size)
+        self.errors = deque(maxlen=size)  # 实际开奖时刻 - 预测时刻（秒）
+        self._prediction: Optional[dict] = None  # 针对下一期的预测
+
+    def observe(self, issue, award_ts: float, detected_ts: Optional[float] = None) -> Optional[dict]:
+        """
+        记录一期开奖；若此前对该期做过预测，则计算预测误差。
+        返回本次新增的 {issue, award_ts, detected_ts, error}（供状态日志增量记录），重复的期返回 None。
+        """
+        if self.history and self.history[-1][0] == issue:
+            return None
+        error = None
+        pred = self._prediction
+        if pred is not None and pred["after_issue"] != issue:
+            a, b = _issue_number(pred["after_issue"]), _issue_number(issue)
+            # 只对紧随其后的一期计算误差（中间漏期时预测不可比）
+            if a is None or b is None or b - a == 1:
+                error = award_ts - pred["next_award_ts"]
+                self.errors.append(error)
+        self.history.append((issue, award_ts, detected_ts))
+        self._prediction = None
+        return {"issue": issue, "award_ts": award_ts, "detected_ts": detected_ts, "error": error}
+
+    def interval(self) -> float:
+        """最近各期的开奖间隔中位数（跨多期时按期号差平均）。"""
+        intervals = []
+        items = list(self.history)
+        for (prev_issue, prev_ts, _), (issue, ts, _) in zip(items, items[1:]):
+            a, b = _issue_number(prev_issue), _issue_number(issue)
+            steps = (b - a) if (a is not None and b is not None) else 1
+            if steps <= 0:
+                continue
+            per_issue = (ts - prev_ts) / steps
+            # 过滤明显异常（停盘/跨日等）的间隔
+            if 0.5 * self.nominal_interval <= per_issue <= 1.5 * self.nominal_interval:
+                intervals.append(per_issue)
+        if len(intervals) < self.min_samples:
+            return self.nominal_interval
+        return statistics.median(intervals)
+
+    def publish_lags(self):
+        return [d - a for _, a, d in self.history if d is not None and d >= a]
+
+    def estimate(self, last_issue=None, last_award_ts: Optional[float] = None) -> Optional[dict]:
+        """
+        预计下一期开奖：返回 next_award_ts、置信区间 [lo_ts, hi_ts]（按历史预测误差的 10%/90% 分位）、
+        publish_lag（结果可被查询到的延迟中位数）与 expected_publish_ts。
+        未传 last_* 时以最近一次 observe 的期为基准。
+        """
+        if last_award_ts is None:
+            if not self.history:
+                return None
+            last_issue, last_award_ts, _ = self.history[-1]
+        interval = self.interval()
+        next_ts = last_award_ts + interval
+        if len(self.errors) >= self.min_samples:
+            lo_err, hi_err = _quantile(self.errors, 0.1), _quantile(self.errors, 0.9)
+        else:
+            lo_err, hi_err = 0.0, 0.0
+        lags = self.publish_lags()
+        lag = statistics.median(lags) if len(lags) >= self.min_samples else 0.0
+        lag_lo = _quantile(lags, 0.1) if len(lags) >= self.min_samples else 0.0
+        estimate = {
+            "after_issue": last_issue,
+            "interval": interval,
+            "next_award_ts": next_ts,
+            "lo_ts": next_ts + min(0.0, lo_err),
+            "hi_ts": next_ts + max(0.0, hi_err),
+            "publish_lag": lag,
+            "publish_lag_lo": lag_lo,
+            "expected_publish_ts": next_ts + lag,
+            "samples": len(self.history),
+        }
+        self._prediction = estimate
+        return estimate
+
+    def summary(self) -> dict:
+        """供面板展示的预测误差与节奏统计（毫秒）。"""
+        errors = list(self.errors)
+        lags = self.publish_lags()
+        pred = self._prediction
+
+        def ms(v):
+            return None if v is None else round(v * 1000)
+
+        return {
+            "samples": len(self.history),
+            "interval_s": round(self.interval(), 3),
+            "publish_lag_ms": ms(statistics.median(lags)) if lags else None,
+            "last_error_ms": ms(errors[-1]) if errors else None,
+            "mean_abs_error_ms": ms(sum(abs(e) for e in errors) / len(errors)) if errors else None,
+            "next_award_ts": pred["next_award_ts"] if pred else None,
+            "ci_ms": [ms(pred["lo_ts"] - pred["next_award_ts"]), ms(pred["hi_ts"] - pred["next_award_ts"])] if pred else None,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "history": [list(h) for h in self.history],
+            "errors": list(self.errors),
+            "size": self.history.maxlen,
+        }
+
+    def load(self, data: Optional[dict]):
+        if not data:
+            return
+        for item in data.get("history", []):
+            if len(item) == 3:
+                self.history.append(tuple(item))
+        self.errors.extend(data.get("errors", []))
+
+
+class ClockSync:
+    """
+    服务器时钟偏差估计（服务器时间 = 本机时间 + offset）。
+    每个样本为 (发出请求的本机时间 t0, 收到响应的本机时间 t1, 服务器时间 server_ts)，server_ts 的分辨率为
+    resolution 秒（HTTP Date 头为 1 秒，向下取整）。服务器在 [t0, t1] 之间的某一刻生成该时间，因此
+        server_ts - t1 <= offset < server_ts + resolution - t0
+    从最新样本向前求这些区间的交集（遇到矛盾的旧样本即停止，兼容本机或服务器时钟被调整），
+    往返时间短、跨越秒边界不同相位的样本会让区间迅速收窄。
+    offset() 取交集中最接近 0 的值：本机时钟与证据一致时不做修正，只在确有偏差时修正到最小必要量。
+    """
+
+    def __init__(self, size: int = 128, resolution: float = 1.0):
+        self.resolution = resolution
+        self._samples = deque(maxlen=size)  # (下界, 上界, 往返时间)
+        self._lock = threading.Lock()
+        self._bounds: Optional[tuple] = None  # (下界, 上界, 参与样本数)
+        self.observed = 0
+
+    def observe(self, t0: float, t1: float, server_ts: float):
+        if t1 < t0:
+            return
+        with self._lock:
+            self._samples.append((server_ts - t1, server_ts + self.resolution - t0, t1 - t0))
+            self.observed += 1
+            lo, hi, used = float("-inf"), float("inf"), 0
+            for s_lo, s_hi, _ in reversed(self._samples):
+                if max(lo, s_lo) > min(hi, s_hi):
+                    break
+                lo, hi, used = max(lo, s_lo), min(hi, s_hi), used + 1
+            self._bounds = (lo, hi, used)
+
+    def offset(self) -> float:
+        bounds = self._bounds
+        if bounds is None:
+            return 0.0
+        lo, hi, _ = bounds
+        return min(max(0.0, lo), hi)
+
+    def stats(self) -> dict:
+        with self._lock:
+            bounds = self._bounds
+            rtts = [rtt for _, _, rtt in self._samples]
+            observed = self.observed
+
+        def ms(v):
+            return None if v is None else round(v * 1000, 1)
+
+        result = {"samples": observed, "offset_ms": ms(self.offset()), "estimate_ms": None, "uncertainty_ms": None,
+                  "used_samples": 0, "rtt_min_ms": ms(min(rtts)) if rtts else None,
+                  "rtt_p50_ms": ms(_quantile(rtts, 0.5)) if rtts else None}
+        if bounds is not None:
+            lo, hi, used = bounds
+            result.update(estimate_ms=ms((lo + hi) / 2), uncertainty_ms=ms((hi - lo) / 2), used_samples=used)
+        return result
+
+
+class PreciseTimer:
+    """
+    在参考时间轴（本机墙上时间 + offset()，例如服务器时钟偏差）上的某一时刻准时唤醒：
+    - 等待全部基于 perf_counter（单调时钟）与事件循环定时器，墙上时间被 NTP 调整不会拉长或缩短等待
+    - to_local(ts) / from_local(perf): 参考时间轴与 perf_counter 之间换算（多次采样取间隔最短的一次，减少被抢占的误差）
+    - sleep_until(ts): 先用定时器粗等待到目标前 recheck 秒，再重新换算目标（纠正等待期间的时钟调整与偏差更新），
+      最后 spin 秒让出循环自旋；可被 asyncio.Event 提前唤醒
+    - 每次准时唤醒记录实际时刻与目标的偏差（抖动），stats() 给出分位数，on_wake(秒) 回调用于指标；
+      调用时已过目标时刻的记为 overdue，不计入抖动
+    """
+
+    def __init__(self, offset: Optional[Callable[[], float]] = None, spin: float = 0.002, recheck: float = 0.05,
+                 on_wake: Optional[Callable[[float], None]] = None, size: int = 200):
+        self.offset = offset or (lambda: 0.0)
+        self.spin = spin
+        self.recheck = recheck
+        self.on_wake = on_wake
+        self._jitter = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.wakeups = 0
+        self.overdue = 0
+
+    def now(self) -> float:
+        """参考时间轴上的当前时刻。"""
+        return time.time() + self.offset()
+
+    def _anchor(self) -> float:
+        """参考时间 - perf_counter。"""
+        best = None
+        for _ in range(3):
+            before = time.perf_counter()
+            wall = time.time()
+            after = time.perf_counter()
+            if best is None or after - before < best[0]:
+                best = (after - before, wall - (before + after) / 2)
+        return best[1] + self.offset()
+
+    def to_local(self, ts: float) -> float:
+        return ts - self._anchor()
+
+    def from_local(self, perf: float) -> float:
+        return perf + self._anchor()
+
+    async def sleep_until(self, ts: float, wake: Optional[asyncio.Event] = None) -> Optional[float]:
+        """
+        等待到参考时刻 ts，返回最终使用的 perf_counter 目标时刻；被 wake 提前唤醒时返回 None。
+        """
+        target = self.to_local(ts)
+        if target <= time.perf_counter():
+            # 调用时已过目标时刻：没有发生等待，不计入唤醒抖动
+            with self._lock:
+                self.overdue += 1
+            return target
+        rechecked = False
+        while True:
+            if wake is not None and wake.is_set():
+                return None
+            remaining = target - time.perf_counter()
+            if remaining <= 0:
+                break
+            if not rechecked and remaining <= self.recheck + self.spin:
+                # 临近目标时重新换算一次，纠正粗等待期间的时钟调整
+                target = self.to_local(ts)
+                rechecked = True
+            elif remaining > self.spin:
+                # 定时器粗等待：先到重新换算点，之后到自旋段起点
+                await self._wait(remaining - self.spin - (0.0 if rechecked else self.recheck), wake)
+            else:
+                await asyncio.sleep(0)
+        self._record(time.perf_counter() - target)
+        return target
+
+    @staticmethod
+    async def _wait(seconds: float, wake: Optional[asyncio.Event]):
+        if wake is None:
+            await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def _record(self, jitter: float):
+        with self._lock:
+            self._jitter.append(jitter)
+            self.wakeups += 1
+        if self.on_wake is not None:
+            self.on_wake(jitter)
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = list(self._jitter)
+            wakeups, overdue = self.wakeups, self.overdue
+
+        def ms(v):
+            return None if v is None else round(v * 1000, 3)
+
+        return {
+            "wakeups": wakeups,
+            "overdue": overdue,
+            "offset_ms": ms(self.offset()),
+            "jitter_p50_ms": ms(_quantile(samples, 0.5)) if samples else None,
+            "jitter_p95_ms": ms(_quantile(samples, 0.95)) if samples else None,
+            "jitter_max_ms": ms(max(samples)) if samples else None,
+        }
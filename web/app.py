@@ -1,38 +1,73 @@
+import asyncio
 import json
-import os
 import base64
-import subprocess
-import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta, timezone
 
-from fastapi import FastAPI, Depends, HTTPException, status, Path as FPath, Body
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, status, Path as FPath, Body, Query, Header, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 
 # 复用机器人核心与配置/路径
 from canada28_bot import (
-    ENGINE,
-    load_config,
-    atomic_write_json,
-    ensure_default_config,
-    CONFIG_FILE,
-    STATE_FILE,
+    CLOCK,
+    CONFIG,
+    DEFAULT_INSTANCE,
+    EVENTS,
+    MANAGER,
+    METRICS,
+    RESULT_FEED,
+    SENDER_POOL,
+    TIMER,
+    BotEngine,
     SIGNER_DIR,
+    LOG_DIR,
     AWARD_INTERVAL_SECONDS,
 )
+from bot_logging import get_logger, setup_logging
+from jobs import JobManager, JobQueueFull
+from signer_directory import ChatIndex, SignerDirectory
 
-app = FastAPI(title="Canada28 控制面板", version="0.4.0")
+setup_logging(LOG_DIR, CONFIG.snapshot().get("logging"))
+log = get_logger("web")
+
+# 本机 tg-signer 账户目录（按 mtime 增量更新的内存缓存）与对话索引（后台并发刷新，按 latest_chats.json 的 mtime 增量更新）
+SIGNERS = SignerDirectory(SIGNER_DIR)
+CHATS = ChatIndex(SIGNER_DIR, release=SENDER_POOL.release, directory=SIGNERS)
+# 耗时操作（停止引擎、批量刷新对话）作为后台任务运行在独立的有界线程池 / 事件循环上，不占用请求线程池
+JOBS = JobManager(max_workers=4)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # 引擎主循环作为任务运行在本应用的事件循环上；关闭时取消所有实例并断开发送层
+    MANAGER.attach(asyncio.get_running_loop())
+    yield
+    JOBS.shutdown(wait=False)
+    await MANAGER.shutdown()
+    await asyncio.get_running_loop().run_in_executor(None, SENDER_POOL.close)
+
+
+app = FastAPI(title="Canada28 控制面板", version="0.4.0", lifespan=lifespan)
 security = HTTPBasic()
 
 
-def get_current_config() -> Dict[str, Any]:
-    return load_config()
+def get_engine(instance: str = Query(DEFAULT_INSTANCE, description="引擎实例 ID")) -> BotEngine:
+    try:
+        return MANAGER.get(instance)
+    except KeyError:
+        raise HTTPException(404, f"实例不存在: {instance}")
+
+
+def get_current_config(engine: Optional[BotEngine] = None) -> Dict[str, Any]:
+    """配置副本（来自内存快照，config.json 变化时才重新读取）。"""
+    return (engine.config_store if engine else CONFIG).get()
 
 
 def verify_basic_auth(credentials: HTTPBasicCredentials = Depends(security)) -> None:
-    cfg = get_current_config()
+    cfg = CONFIG.snapshot()
     auth = cfg.get("web", {}).get("auth", {})
     username = auth.get("username")
     password = auth.get("password")
@@ -54,80 +89,74 @@ def mask_auth(cfg: Dict[str, Any]) -> Dict[str, Any]:
     return result
 
 
-def write_config(cfg: Dict[str, Any]) -> None:
-    cfg = ensure_default_config(cfg or {})
-    atomic_write_json(Path(CONFIG_FILE), cfg)
+def write_config(cfg: Dict[str, Any], engine: Optional[BotEngine] = None) -> None:
+    # 内容未变化时不写盘
+    (engine.config_store if engine else CONFIG).save(cfg)
 
 
-def read_state_summary() -> Dict[str, Any]:
-    p = Path(STATE_FILE)
-    summary = {"exists": False, "strategies": {}, "last_period_issue": None, "last_period_sum": None, "last_award_time_str": None, "next_award_time_str": None, "seconds_to_next_award": -1}
-    if not p.is_file():
+def summarize_state(data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    summary = {"exists": False, "strategies": {}, "last_period_issue": None, "last_period_sum": None, "last_award_time_str": None, "next_award_time_str": None, "next_award_ts": None, "seconds_to_next_award": -1, "last_detection": None, "avg_detection_latency_ms": None, "draw_clock": None}
+    if not data:
         return summary
     try:
-        data = json.loads(p.read_text(encoding="utf-8"))
         summary.update({
             "exists": True,
             "strategies": data.get("strategies", {}),
             "last_period_issue": data.get("last_period_issue"),
             "last_period_sum": data.get("last_period_sum"),
             "last_award_time_str": data.get("last_award_time_str"),
+            "last_detection": data.get("last_detection"),
+            "draw_clock": data.get("draw_clock_summary"),
         })
-        # 计算下次开奖时间
-        if summary["last_award_time_str"]:
-            API_TZ = timezone(timedelta(hours=8))
+        latencies = data.get("detection_latency_ms") or []
+        if latencies:
+            summary["avg_detection_latency_ms"] = round(sum(latencies) / len(latencies))
+        # 计算下次开奖时间（优先使用开奖时钟的预测）
+        API_TZ = timezone(timedelta(hours=8))
+        next_award_time = None
+        if summary["draw_clock"] and summary["draw_clock"].get("next_award_ts"):
+            next_award_time = datetime.fromtimestamp(summary["draw_clock"]["next_award_ts"], API_TZ)
+        elif summary["last_award_time_str"]:
             last_award_time = datetime.strptime(f"{datetime.now().year}-{summary['last_award_time_str']}", "%Y-%m-%d %H:%M:%S").replace(tzinfo=API_TZ)
             next_award_time = last_award_time + timedelta(seconds=AWARD_INTERVAL_SECONDS)
+        if next_award_time:
             summary["next_award_time_str"] = next_award_time.strftime('%H:%M:%S')
-            summary["seconds_to_next_award"] = max(0, (next_award_time - datetime.now(API_TZ)).total_seconds())
+            summary["next_award_ts"] = next_award_time.timestamp()
+            summary["seconds_to_next_award"] = max(0, next_award_time.timestamp() - TIMER.now())
         return summary
     except Exception as e:
         summary["error"] = str(e)
         return summary
 
 
-def list_signer_users() -> List[Dict[str, Any]]:
-    users_dir = Path(SIGNER_DIR) / "users"
-    result: List[Dict[str, Any]] = []
-    if not users_dir.is_dir():
-        return result
-    for d in users_dir.iterdir():
-        if not d.is_dir():
-            continue
-        me = d / "me.json"
-        item: Dict[str, Any] = {"user_id": d.name, "display_name": d.name, "username": None, "first_name": None, "last_name": None}
-        try:
-            if me.is_file():
-                j = json.loads(me.read_text(encoding="utf-8"))
-                first_name = j.get("first_name") or ""
-                last_name = j.get("last_name") or ""
-                username = j.get("username") or ""
-                display = (f"{first_name} {last_name}").strip() or username or d.name
-                item.update({
-                    "username": username,
-                    "first_name": first_name,
-                    "last_name": last_name,
-                    "display_name": display
-                })
-        except Exception:
-            pass
-        result.append(item)
-    return result
+def read_state_summary(engine: BotEngine) -> Dict[str, Any]:
+    # 引擎广播过状态快照时直接使用内存中的最新一份，不再读 state.json
+    latest = EVENTS.latest("state", engine.instance_id)
+    if latest is not None:
+        return summarize_state(latest["state"])
+    try:
+        return summarize_state(engine.journal.read())
+    except Exception as e:
+        return dict(summarize_state(None), error=str(e))
 
 
-def format_chats(chats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    norm = []
-    for c in chats or []:
-        title = c.get("title")
-        if not title:
-            fn = c.get("first_name", "") or ""
-            ln = c.get("last_name", "") or ""
-            title = (f"{fn} {ln}").strip() or f"未知对话(ID:{c.get('id')})"
-        norm.append({
-            "id": c.get("id"),
-            "title": title
-        })
-    return norm
+def format_sse(event: Dict[str, Any]) -> str:
+    if event.get("type") == "state":
+        event = dict(event, state=summarize_state(event["state"]))
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    prefix = f"id: {event['id']}\n" if "id" in event else ""
+    return f"{prefix}data: {data}\n\n"
+
+
+def signer_targets(aliases: Optional[List[str]] = None) -> List[tuple]:
+    """所有实例账户池中已填写别名的账户 [(alias, user_id)]，可按别名过滤。"""
+    targets = []
+    for engine in MANAGER.engines():
+        for acc in engine.config_store.get().get("accounts", []):
+            alias = (acc.get("alias") or "").strip()
+            if alias and (aliases is None or alias in aliases):
+                targets.append((alias, str(acc.get("user_id") or "") or None))
+    return targets
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -161,6 +190,11 @@ def dashboard(_: None = Depends(verify_basic_auth)):
 </head>
 <body>
   <h1>Canada28 控制面板 <span id="engine-badge" class="badge off">停止</span></h1>
+  <div style="display:flex; gap:8px; align-items:center;">
+    <label>实例:</label>
+    <select id="instance-select"></select>
+    <button id="btn-new-instance">新建实例</button>
+  </div>
   <div class="row">
     <div class="col card">
       <h3>运行控制</h3>
@@ -213,6 +247,8 @@ def dashboard(_: None = Depends(verify_basic_auth)):
     <div style="margin-bottom:8px;">
       <button id="btn-add-account">新增账户</button>
       <button id="btn-import-signers">从本机已登录账户导入</button>
+      <button id="btn-refresh-all-chats">刷新全部账户对话</button>
+      <span class="muted" id="chat-refresh-status"></span>
     </div>
     <table id="acct-table">
       <thead>
@@ -222,6 +258,7 @@ def dashboard(_: None = Depends(verify_basic_auth)):
           <th>显示名(昵称)</th>
           <th>User ID</th>
           <th>chat_id</th>
+          <th>健康度</th>
           <th>操作</th>
         </tr>
       </thead>
@@ -232,10 +269,19 @@ def dashboard(_: None = Depends(verify_basic_auth)):
     </div>
   </div>
 
+  <div class="card">
+    <h3>实时事件</h3>
+    <div id="event-log" class="muted" style="max-height:240px; overflow-y:auto; font-family:monospace; font-size:12px;">等待引擎事件...</div>
+  </div>
+
   <div class="overlay" id="overlay">
     <div class="modal">
       <h3>选择聊天</h3>
       <div class="muted" id="modal-subtitle">正在加载...</div>
+      <div style="margin-top:8px;">
+        <input type="text" id="modal-search" placeholder="按标题或 chat_id 筛选" />
+        <button id="modal-refresh">重新获取</button>
+      </div>
       <table id="modal-chats" style="margin-top:8px;">
         <thead>
           <tr><th>标题</th><th>chat_id</th><th>选择</th></tr>
@@ -252,9 +298,16 @@ def dashboard(_: None = Depends(verify_basic_auth)):
 let cfg = null;
 let stateSummary = null;
 let countdownTimer = null;
+let instance = new URLSearchParams(location.search).get("instance") || "default";
+let eventSource = null;
+
+function withInstance(path) {
+  if (path.startsWith("/api/instances")) return path;
+  return path + (path.includes("?") ? "&" : "?") + "instance=" + encodeURIComponent(instance);
+}
 
 async function api(path, opts) {
-  const res = await fetch(path, opts || {});
+  const res = await fetch(withInstance(path), opts || {});
   if (res.status === 401) {
     alert("认证失败或需要登录，请刷新页面并输入账号/密码");
     throw new Error("401");
@@ -332,6 +385,18 @@ function renderAccounts() {
     in4.onchange = () => acc.chat_id = in4.value.trim();
     td4.appendChild(in4);
 
+    const tdHealth = document.createElement("td");
+    tdHealth.className = "muted";
+    const health = ((stateSummary && stateSummary.account_health) || {})[acc.alias || ""];
+    if (health) {
+      const label = {healthy: "正常", flood: "限流", quarantine: "隔离"}[health.state] || health.state;
+      tdHealth.textContent = `${label} | 成功率 ${Math.round(health.success_rate * 100)}% | ${health.latency_ms !== null ? health.latency_ms : "-"}ms` +
+        (health.blocked_for_s ? ` | ${Math.ceil(health.blocked_for_s)}s 后恢复` : "");
+      tdHealth.title = `权重 ${health.score}，样本 ${health.samples}，连续失败 ${health.consecutive_failures}，最近错误 ${health.last_code || "-"}`;
+    } else {
+      tdHealth.textContent = "-";
+    }
+
     const td5 = document.createElement("td");
     const btnChat = document.createElement("button");
     btnChat.textContent = "选择聊天";
@@ -341,8 +406,17 @@ function renderAccounts() {
     btnDel.onclick = () => { cfg.accounts.splice(idx, 1); renderAccounts(); };
     td5.appendChild(btnChat);
     td5.appendChild(btnDel);
+    if (acc.alias && health && health.state !== "healthy") {
+      const btnReset = document.createElement("button");
+      btnReset.style.marginLeft = "8px"; btnReset.textContent = "解除隔离";
+      btnReset.onclick = async () => {
+        await api(`/api/accounts/${encodeURIComponent(acc.alias || "")}/reset_health`, {method:"POST"});
+        await refreshAll();
+      };
+      td5.appendChild(btnReset);
+    }
 
-    tr.appendChild(td0); tr.appendChild(td1); tr.appendChild(td2); tr.appendChild(td3); tr.appendChild(td4); tr.appendChild(td5);
+    tr.appendChild(td0); tr.appendChild(td1); tr.appendChild(td2); tr.appendChild(td3); tr.appendChild(td4); tr.appendChild(tdHealth); tr.appendChild(td5);
     tbody.appendChild(tr);
   });
 }
@@ -377,6 +451,10 @@ function renderState() {
         <div>上期和值:</div><div>${stateSummary.last_period_sum || '-'}</div>
         <div>开奖时间:</div><div>${stateSummary.last_award_time_str || '-'}</div>
         <div>预计下期开奖:</div><div>${stateSummary.next_award_time_str || '-'} <span id="countdown"></span></div>
+        <div>开奖预测误差:</div><div>${stateSummary.draw_clock && stateSummary.draw_clock.last_error_ms !== null ? `上期 ${stateSummary.draw_clock.last_error_ms}ms，平均 ±${stateSummary.draw_clock.mean_abs_error_ms}ms（间隔 ${stateSummary.draw_clock.interval_s}s）` : '-'}</div>
+        <div>时钟偏差:</div><div>${stateSummary.clock && stateSummary.clock.estimate_ms !== null ? `${stateSummary.clock.offset_ms}ms（估计 ${stateSummary.clock.estimate_ms}±${stateSummary.clock.uncertainty_ms}ms，RTT ${stateSummary.clock.rtt_min_ms}ms）` : '-'}</div>
+        <div>唤醒抖动:</div><div>${stateSummary.timer && stateSummary.timer.wakeups ? `p50 ${stateSummary.timer.jitter_p50_ms}ms / p95 ${stateSummary.timer.jitter_p95_ms}ms / 最大 ${stateSummary.timer.jitter_max_ms}ms（${stateSummary.timer.wakeups} 次）` : '-'}</div>
+        <div>检测延迟:</div><div>${stateSummary.last_detection ? `${stateSummary.last_detection.latency_ms}ms (${stateSummary.last_detection.via})，近期平均 ${stateSummary.avg_detection_latency_ms ?? '-'}ms` : '-'}</div>
     `;
     el.innerHTML = html;
     if (stateSummary.seconds_to_next_award > 0) {
@@ -411,12 +489,26 @@ async function startBot() {
     btn.textContent = "启动机器人";
   }
 }
+async function waitJob(job, onProgress) {
+  // 轮询后台任务直到结束
+  while (job.status === "pending" || job.status === "running") {
+    if (onProgress) onProgress(job);
+    await new Promise(r => setTimeout(r, 500));
+    job = await api(`/api/jobs/${encodeURIComponent(job.id)}`);
+  }
+  return job;
+}
+
 async function stopBot() {
   const btn = document.getElementById("btn-stop");
   btn.disabled = true;
   btn.textContent = "停止中...";
   try {
-    await api("/api/bot/stop", {method:"POST"});
+    const res = await api("/api/bot/stop", {method:"POST"});
+    if (res.job) {
+      const job = await waitJob(res.job);
+      if (job.status === "failed") throw new Error(job.error || "停止任务失败");
+    }
     await refreshAll();
   } catch (e) {
     alert("停止失败: " + e.message);
@@ -510,6 +602,58 @@ async function importSigners() {
   }
 }
 
+let pickerChats = [];
+
+function renderPickerChats(idx) {
+  const tbody = document.querySelector("#modal-chats tbody");
+  const q = document.getElementById("modal-search").value.trim().toLowerCase();
+  tbody.innerHTML = "";
+  pickerChats
+    .filter(c => !q || String(c.title).toLowerCase().includes(q) || String(c.id).includes(q))
+    .forEach(c => {
+      const tr = document.createElement("tr");
+      const tdTitle = document.createElement("td"); tdTitle.textContent = c.title;
+      const tdId = document.createElement("td"); tdId.textContent = c.id;
+      const tdBtn = document.createElement("td");
+      const btn = document.createElement("button");
+      btn.textContent = "选择";
+      btn.onclick = () => {
+        cfg.accounts[idx].chat_id = c.id;
+        renderAccounts();
+        hideOverlay();
+      };
+      tdBtn.appendChild(btn);
+      tr.appendChild(tdTitle); tr.appendChild(tdId); tr.appendChild(tdBtn);
+      tbody.appendChild(tr);
+    });
+}
+
+async function loadPickerChats(idx, alias, userId, refresh) {
+  const modalSubtitle = document.getElementById("modal-subtitle");
+  try {
+    if (refresh) {
+      modalSubtitle.textContent = `正在为别名 [${alias}] 获取最近对话...`;
+      const res = await api(`/api/refresh_chats`, {
+          method: "POST",
+          headers: { "content-type": "application/json" },
+          body: JSON.stringify({ alias: alias, user_id: userId })
+      });
+      const job = await waitJob(res.job);
+      if (job.status !== "succeeded") throw new Error(job.error || job.status);
+    }
+    pickerChats = await api(`/api/chats?user_id=${encodeURIComponent(userId)}&limit=5000`);
+    if (!pickerChats || pickerChats.length === 0) {
+      if (!refresh) return loadPickerChats(idx, alias, userId, true);
+      modalSubtitle.textContent = `别名 [${alias}] 未获取到最近对话。请确认该账户已登录并与机器人有过对话。`;
+    } else {
+      modalSubtitle.textContent = `请为别名 [${alias}] 选择一个对话${refresh ? "" : "（已缓存，可点“重新获取”）"}：`;
+    }
+    renderPickerChats(idx);
+  } catch (e) {
+    modalSubtitle.textContent = `获取对话失败: ${e.message}`;
+  }
+}
+
 async function openChatPicker(idx) {
   const row = document.querySelector(`#acct-table tr[data-idx='${idx}']`);
   const aliasInput = row.querySelector('.alias-input');
@@ -526,45 +670,118 @@ async function openChatPicker(idx) {
     return;
   }
 
-  const modalSubtitle = document.getElementById("modal-subtitle");
-  const tbody = document.querySelector("#modal-chats tbody");
-  tbody.innerHTML = "";
-  modalSubtitle.textContent = `正在为别名 [${alias}] 获取最近对话...`;
+  pickerChats = [];
+  document.getElementById("modal-search").value = "";
+  document.getElementById("modal-search").oninput = () => renderPickerChats(idx);
+  document.getElementById("modal-refresh").onclick = () => loadPickerChats(idx, alias, userId, true);
+  document.querySelector("#modal-chats tbody").innerHTML = "";
+  document.getElementById("modal-subtitle").textContent = `正在加载别名 [${alias}] 的对话...`;
   showOverlay();
+  await loadPickerChats(idx, alias, userId, false);
+}
 
+async function refreshAllChats() {
+  const el = document.getElementById("chat-refresh-status");
   try {
-    const chats = await api(`/api/refresh_chats`, {
-        method: "POST",
-        headers: { "content-type": "application/json" },
-        body: JSON.stringify({ alias: alias, user_id: userId })
+    const res = await api("/api/chats/refresh", {
+      method: "POST",
+      headers: { "content-type": "application/json" },
+      body: JSON.stringify({})
     });
-
-    if (!chats || chats.length === 0) {
-      modalSubtitle.textContent = `别名 [${alias}] 未获取到最近对话。请确认该账户已登录并与机器人有过对话。`;
-      return;
-    }
-    modalSubtitle.textContent = `请为别名 [${alias}] 选择一个对话：`;
-    chats.forEach(c => {
-      const tr = document.createElement("tr");
-      const tdTitle = document.createElement("td"); tdTitle.textContent = c.title;
-      const tdId = document.createElement("td"); tdId.textContent = c.id;
-      const tdBtn = document.createElement("td");
-      const btn = document.createElement("button");
-      btn.textContent = "选择";
-      btn.onclick = () => {
-        cfg.accounts[idx].chat_id = c.id;
-        renderAccounts();
-        hideOverlay();
-      };
-      tdBtn.appendChild(btn);
-      tr.appendChild(tdTitle); tr.appendChild(tdId); tr.appendChild(tdBtn);
-      tbody.appendChild(tr);
+    const job = await waitJob(res.job, j => {
+      const c = j.progress || {};
+      el.textContent = `刷新中: 完成 ${(c.ok || 0) + (c.skipped || 0)} / 失败 ${c.failed || 0} / 进行中 ${(c.running || 0) + (c.pending || 0)}`;
     });
+    if (job.status !== "succeeded") throw new Error(job.error || job.status);
+    const c = job.result || {};
+    el.textContent = `对话已刷新: 成功 ${(c.ok || 0) + (c.skipped || 0)}，失败 ${c.failed || 0}`;
   } catch (e) {
-    modalSubtitle.textContent = `获取对话失败: ${e.message}`;
+    el.textContent = "刷新失败: " + e.message;
   }
 }
 
+function describeEvent(ev) {
+  switch (ev.type) {
+    case "round_started": return `第 ${ev.issue ?? '-'} 期准备下注: ${(ev.bets || []).map(b => `${b.text}@${b.alias || '无账户'}`).join(", ")}`;
+    case "bet_sent": return `下注 ${ev.text} [${ev.status}] 账户 ${ev.alias} 耗时 ${ev.latency_ms}ms${ev.skew_ms !== null && ev.skew_ms !== undefined ? `，开盘偏差 ${ev.skew_ms}ms` : ''}${ev.error ? `，${ev.error}` : ''}`;
+    case "result_detected": return `开奖 第 ${ev.issue} 期 和值 ${ev.sum}（${ev.via}，开奖后 ${ev.latency_ms ?? '-'}ms 检测到）`;
+    case "settlement": return `结算 ${ev.strategy} ${ev.text}: ${ev.won ? '胜利' : '失败'}${ev.placed === false ? '（未下注）' : ''}`;
+    case "engine": return ev.running ? "引擎已启动" : "引擎已停止";
+    case "error": return `错误: ${ev.message}`;
+    default: return null;
+  }
+}
+
+function appendEvent(ev) {
+  const text = describeEvent(ev);
+  if (!text) return;
+  const log = document.getElementById("event-log");
+  if (log.dataset.started !== "1") { log.innerHTML = ""; log.dataset.started = "1"; }
+  const line = document.createElement("div");
+  line.textContent = `${new Date(ev.ts * 1000).toLocaleTimeString()} ${text}`;
+  log.prepend(line);
+  while (log.childNodes.length > 100) log.removeChild(log.lastChild);
+}
+
+async function loadInstances() {
+  const list = await api("/api/instances");
+  const sel = document.getElementById("instance-select");
+  sel.innerHTML = "";
+  list.forEach(item => {
+    const opt = document.createElement("option");
+    opt.value = item.id;
+    opt.textContent = item.id + (item.running ? " (运行中)" : "");
+    sel.appendChild(opt);
+  });
+  if (!list.some(item => item.id === instance)) instance = "default";
+  sel.value = instance;
+}
+
+async function switchInstance(id) {
+  instance = id;
+  history.replaceState(null, "", "?instance=" + encodeURIComponent(id));
+  const log = document.getElementById("event-log");
+  log.dataset.started = "0";
+  log.textContent = "等待引擎事件...";
+  await refreshAll();
+  connectEvents();
+}
+
+async function createInstance() {
+  const id = prompt("新实例 ID（字母、数字、下划线或短横线）:");
+  if (!id) return;
+  try {
+    await api("/api/instances", {method:"POST", headers:{"Content-Type":"application/json"}, body: JSON.stringify({id})});
+    instance = id;
+    await loadInstances();
+    await switchInstance(id);
+  } catch (e) {
+    alert("创建失败: " + e.message);
+  }
+}
+
+function connectEvents() {
+  if (!window.EventSource) return;
+  if (eventSource) eventSource.close();
+  const es = eventSource = new EventSource(withInstance("/api/events"));
+  es.onmessage = (msg) => {
+    const ev = JSON.parse(msg.data);
+    // 共享事件流中只展示当前实例的事件
+    if (ev.instance && ev.instance !== instance) return;
+    if (ev.type === "snapshot") {
+      stateSummary = Object.assign(stateSummary || {}, ev.state, {running: ev.running});
+      setEngineBadge(!!ev.running);
+      renderState();
+    } else if (ev.type === "state") {
+      stateSummary = Object.assign(stateSummary || {}, ev.state);
+      renderState();
+    } else if (ev.type === "engine") {
+      setEngineBadge(!!ev.running);
+    }
+    appendEvent(ev);
+  };
+}
+
 function showOverlay() { document.getElementById("overlay").style.display = "flex"; }
 function hideOverlay() { document.getElementById("overlay").style.display = "none"; }
 
@@ -575,8 +792,11 @@ document.getElementById("btn-save-config").onclick = saveConfig;
 document.getElementById("btn-clear-state").onclick = clearState;
 document.getElementById("btn-add-account").onclick = () => addAccountRow({enabled:true, alias:"", display_name:"", user_id:"", chat_id:""});
 document.getElementById("btn-import-signers").onclick = importSigners;
+document.getElementById("btn-refresh-all-chats").onclick = refreshAllChats;
+document.getElementById("btn-new-instance").onclick = createInstance;
+document.getElementById("instance-select").onchange = (e) => switchInstance(e.target.value);
 
-refreshAll();
+loadInstances().catch(console.error).finally(() => { refreshAll(); connectEvents(); });
 </script>
 </body>
 </html>
@@ -585,17 +805,18 @@ refreshAll();
 
 
 @app.get("/api/config")
-def api_get_config(_: None = Depends(verify_basic_auth)):
-    cfg = get_current_config()
+def api_get_config(_: None = Depends(verify_basic_auth), engine: BotEngine = Depends(get_engine)):
+    cfg = get_current_config(engine)
     return JSONResponse(mask_auth(cfg))
 
 
 @app.put("/api/config")
 def api_put_config(
     _: None = Depends(verify_basic_auth),
-    body: Dict[str, Any] = Body(...)
+    body: Dict[str, Any] = Body(...),
+    engine: BotEngine = Depends(get_engine),
 ):
-    cfg = get_current_config()
+    cfg = get_current_config(engine)
     strategies = body.get("strategies")
     accounts = body.get("accounts")
 
@@ -617,92 +838,247 @@ def api_put_config(
             })
         cfg["accounts"] = cleaned
 
-    write_config(cfg)
+    write_config(cfg, engine)
     return {"ok": True}
 
 
+@app.get("/api/instances")
+def api_instances(_: None = Depends(verify_basic_auth)):
+    return MANAGER.summary()
+
+
+@app.post("/api/instances")
+def api_create_instance(body: Dict[str, str] = Body(...), _: None = Depends(verify_basic_auth)):
+    try:
+        engine = MANAGER.create(str(body.get("id", "")).strip())
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    log.info(f"已创建实例 [{engine.instance_id}]: {engine.home}")
+    return {"ok": True, "id": engine.instance_id}
+
+
 @app.get("/api/state")
-def api_state(_: None = Depends(verify_basic_auth)):
-    s = read_state_summary()
+def api_state(_: None = Depends(verify_basic_auth), engine: BotEngine = Depends(get_engine)):
+    s = read_state_summary(engine)
     return {
-        "running": ENGINE.is_running,
+        "instance": engine.instance_id,
+        "running": engine.is_running,
+        "result_api": RESULT_FEED.source.stats(),
+        "result_feed": dict(RESULT_FEED.stats(), broker=MANAGER.broker.stats() if MANAGER.broker else None),
+        "sender": SENDER_POOL.stats(),
+        "account_health": SENDER_POOL.scheduler.snapshot(),
+        "rate_limit": SENDER_POOL.limiter.stats(),
+        "timer": TIMER.stats(),
+        "clock": CLOCK.stats(),
+        "config_io": CONFIG.stats(),
+        "events": EVENTS.stats(),
+        "journal": engine.journal.stats(),
+        "jobs": JOBS.stats(),
         **s
     }
 
 
+@app.get("/api/accounts/health")
+def api_account_health(_: None = Depends(verify_basic_auth)):
+    """各账户别名的健康度：状态（healthy / flood / quarantine）、选择权重、成功率、延迟与剩余冷却时间。"""
+    return SENDER_POOL.scheduler.snapshot()
+
+
+@app.post("/api/accounts/{alias}/reset_health")
+def api_reset_account_health(alias: str = FPath(...), _: None = Depends(verify_basic_auth)):
+    """手动解除账户的隔离/限流冷却并清空统计。"""
+    SENDER_POOL.scheduler.reset(alias)
+    return {"ok": True}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(_: None = Depends(verify_basic_auth)):
+    """Prometheus 抓取端点（与面板使用相同的 Basic 认证）。"""
+    return PlainTextResponse(METRICS.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/events")
+async def api_events(
+    request: Request,
+    _: None = Depends(verify_basic_auth),
+    last_event_id: Optional[str] = Header(None),
+    engine: BotEngine = Depends(get_engine),
+):
+    """
+    引擎事件流（SSE）：连接时先发送所选实例的状态快照，之后实时推送内存事件，不读写文件。
+    事件带 instance 字段，面板只展示所选实例的事件。
+    """
+    sub = EVENTS.subscribe()
+
+    async def stream():
+        try:
+            yield format_sse({"type": "snapshot", "instance": engine.instance_id, "running": engine.is_running,
+                              "state": read_state_summary(engine)})
+            if last_event_id and last_event_id.isdigit():
+                for event in EVENTS.recent(int(last_event_id)):
+                    yield format_sse(event)
+            while not await request.is_disconnected():
+                event = await sub.get(timeout=15)
+                # 定期发送注释行保持连接，并检测客户端断开
+                yield format_sse(event) if event else ": keepalive\n\n"
+        except asyncio.CancelledError:
+            pass
+        finally:
+            sub.close()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.post("/api/bot/start")
-def api_start(_: None = Depends(verify_basic_auth)):
-    if ENGINE.is_running:
+def api_start(_: None = Depends(verify_basic_auth), engine: BotEngine = Depends(get_engine)):
+    if engine.is_running:
         return {"ok": True, "message": "已在运行"}
-    ENGINE.start()
+    engine.start()
     return {"ok": True}
 
 
+def submit_job(kind: str, fn, *args, **kwargs) -> Dict[str, Any]:
+    try:
+        return JOBS.submit(kind, fn, *args, **kwargs).to_dict()
+    except JobQueueFull as e:
+        raise HTTPException(429, str(e))
+
+
 @app.post("/api/bot/stop")
-def api_stop(_: None = Depends(verify_basic_auth)):
-    if not ENGINE.is_running:
+def api_stop(_: None = Depends(verify_basic_auth), engine: BotEngine = Depends(get_engine)):
+    """停止引擎（最多等待数秒）作为后台任务执行，立即返回任务；用 /api/jobs/{id} 查询是否完成。"""
+    if not engine.is_running:
         return {"ok": True, "message": "已停止"}
-    ENGINE.stop()
-    return {"ok": True}
+    return {"ok": True, "job": submit_job("engine_stop", engine.stop, key=f"engine_stop:{engine.instance_id}")}
+
+
+@app.get("/api/jobs")
+def api_jobs(kind: Optional[str] = None, active: bool = False, _: None = Depends(verify_basic_auth)):
+    return [job.to_dict() for job in JOBS.list(kind, active_only=active)]
+
+
+@app.get("/api/jobs/{job_id}")
+def api_job(job_id: str = FPath(...), _: None = Depends(verify_basic_auth)):
+    try:
+        return JOBS.get(job_id).to_dict()
+    except KeyError:
+        raise HTTPException(404, f"任务不存在: {job_id}")
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+def api_cancel_job(job_id: str = FPath(...), _: None = Depends(verify_basic_auth)):
+    try:
+        return {"ok": JOBS.cancel(job_id)}
+    except KeyError:
+        raise HTTPException(404, f"任务不存在: {job_id}")
 
 
 @app.post("/api/clear_state")
-def api_clear_state(_: None = Depends(verify_basic_auth)):
+def api_clear_state(_: None = Depends(verify_basic_auth), engine: BotEngine = Depends(get_engine)):
     try:
-        if os.path.exists(STATE_FILE):
-            os.remove(STATE_FILE)
+        engine.journal.clear()
+        EVENTS.publish("state", instance=engine.instance_id, state=None)
         return {"ok": True, "message": "状态缓存已清空"}
     except OSError as e:
         raise HTTPException(500, f"清空缓存失败: {e}")
 
 
+@app.get("/api/history/draws")
+def api_history_draws(
+    since: Optional[float] = Query(None, description="开奖时间下限（Unix 时间戳）"),
+    until: Optional[float] = Query(None, description="开奖时间上限（Unix 时间戳）"),
+    from_issue: Optional[int] = None,
+    to_issue: Optional[int] = None,
+    limit: int = Query(200, ge=1, le=5000),
+    _: None = Depends(verify_basic_auth),
+    engine: BotEngine = Depends(get_engine),
+):
+    return engine.history.draws(since_ts=since, until_ts=until, from_issue=from_issue, to_issue=to_issue, limit=limit)
+
+
+@app.get("/api/history/bets")
+def api_history_bets(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    issue: Optional[int] = None,
+    limit: int = Query(200, ge=1, le=5000),
+    _: None = Depends(verify_basic_auth),
+    engine: BotEngine = Depends(get_engine),
+):
+    return engine.history.bets(since_ts=since, until_ts=until, issue=issue, limit=limit)
+
+
+@app.get("/api/history/stats")
+def api_history_stats(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    _: None = Depends(verify_basic_auth),
+    engine: BotEngine = Depends(get_engine),
+):
+    return engine.history.stats(since_ts=since, until_ts=until)
+
+
 @app.get("/api/signers")
-def api_signers(_: None = Depends(verify_basic_auth)):
-    return list_signer_users()
+def api_signers(refresh: bool = Query(False, description="忽略缓存重新扫描目录"),
+                _: None = Depends(verify_basic_auth)):
+    return SIGNERS.users(force=refresh)
 
 
 @app.post("/api/refresh_chats")
-def api_refresh_chats(
+async def api_refresh_chats(
     body: Dict[str, str] = Body(...),
     _: None = Depends(verify_basic_auth)
 ):
+    """刷新单个账户的最近对话作为后台任务执行，立即返回任务；完成后用 /api/chats?user_id= 读取对话。"""
     alias = body.get("alias")
     user_id = body.get("user_id")
     if not alias or not user_id:
         raise HTTPException(400, "需要提供 alias 和 user_id")
 
-    command = ['tg-signer', '-a', alias, 'login', '-n', '20']
+    chats_file = Path(SIGNER_DIR) / "users" / user_id / 'latest_chats.json'
+
+    async def refresh():
+        await CHATS.refresh_one(alias, user_id)
+        if not chats_file.is_file():
+            error = CHATS.status()["accounts"].get(alias, {}).get("error")
+            raise RuntimeError(error or f"未找到 latest_chats.json (路径: {chats_file})。请确认命令执行成功且账户已登录。")
+        return {"user_id": user_id, "chats": len(CHATS.chats(user_id))}
+
     try:
-        print(f"执行命令: {' '.join(command)}")
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8',
-            input='\n',
-            timeout=30
-        )
-        print(f"命令输出: {result.stdout}")
-    except FileNotFoundError:
-        raise HTTPException(500, "'tg-signer' 命令未找到。")
-    except subprocess.TimeoutExpired:
-        raise HTTPException(500, "执行 tg-signer login 超时，请检查网络或手动执行。")
-    except subprocess.CalledProcessError as e:
-        print(f"错误: 执行 tg-signer login 失败。")
-        print(f"返回码: {e.returncode}")
-        print(f"输出: {e.stdout}")
-        print(f"错误输出: {e.stderr}")
-        pass
+        job = JOBS.submit_async("chat_refresh", refresh, key=f"chat_refresh:{alias}")
+    except JobQueueFull as e:
+        raise HTTPException(429, str(e))
+    return {"job": job.to_dict()}
+
+
+@app.post("/api/chats/refresh")
+async def api_chats_refresh(body: Dict[str, Any] = Body(default={}), _: None = Depends(verify_basic_auth)):
+    """后台并发刷新所有（或指定别名的）账户的最近对话，立即返回刷新状态。"""
+    aliases = body.get("aliases")
+    targets = signer_targets(aliases if isinstance(aliases, list) else None)
+    if not targets:
+        raise HTTPException(400, "账户池中没有填写别名的账户")
+    force = bool(body.get("force"))
+    try:
+        job = JOBS.submit_async("chat_refresh", lambda: CHATS.refresh_all(targets, force), key="chat_refresh",
+                                progress=lambda: CHATS.status()["counts"])
+    except JobQueueFull as e:
+        raise HTTPException(429, str(e))
+    return {"job": job.to_dict(), **CHATS.status()}
 
-    time.sleep(1)
 
-    chats_file = Path(SIGNER_DIR) / "users" / user_id / 'latest_chats.json'
-    if not chats_file.is_file():
-        raise HTTPException(404, f"未找到 latest_chats.json (路径: {chats_file})。请确认命令执行成功且账户已登录。")
+@app.get("/api/chats/refresh")
+def api_chats_refresh_status(_: None = Depends(verify_basic_auth)):
+    return CHATS.status()
 
-    try:
-        chats_data = json.loads(chats_file.read_text(encoding='utf-8'))
-        return format_chats(chats_data)
-    except Exception as e:
-        raise HTTPException(500, f"读取或解析 latest_chats.json 失败: {str(e)}")
+
+@app.get("/api/chats")
+def api_chats(
+    q: str = Query("", description="按标题或 chat_id 查找"),
+    user_id: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=5000),
+    _: None = Depends(verify_basic_auth),
+):
+    """从对话索引中查找（不调用 tg-signer）。"""
+    return CHATS.search(q, user_id, limit)